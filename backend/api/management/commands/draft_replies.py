@@ -0,0 +1,33 @@
+"""
+Author: Akshay NS
+Contains: Management command that runs the background reply drafter
+
+"""
+
+# backend/api/management/commands/draft_replies.py
+from django.core.management.base import BaseCommand
+
+from api.services import metrics
+from api.services.reply_drafter import ReplyDrafter
+
+
+class Command(BaseCommand):
+    help = "Pre-generate reply drafts for emails that need a reply, while inference is idle"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Draft one batch and exit')
+        parser.add_argument('--limit', type=int, default=10, help='Drafts per batch')
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help='Seconds to sleep when there is nothing to draft')
+        parser.add_argument('--metrics-port', type=int, default=None,
+                            help='Serve Prometheus metrics for this worker on this port')
+
+    def handle(self, *args, **options):
+        drafter = ReplyDrafter()
+        if options['once']:
+            drafts = drafter.run_once(limit=options['limit'])
+            self.stdout.write(f"Drafted {len(drafts)} replies")
+            return
+        if options['metrics_port']:
+            metrics.serve_worker_metrics(options['metrics_port'])
+        drafter.run_forever(interval=options['interval'], limit=options['limit'])
@@ -0,0 +1,32 @@
+"""
+Author: Akshay NS
+Contains: Management command that runs the prioritised AI processing worker
+
+"""
+
+# backend/api/management/commands/process_emails.py
+from django.core.management.base import BaseCommand
+
+from api.services import metrics
+from api.services.email_pipeline import classify_pending, process_forever
+
+
+class Command(BaseCommand):
+    help = "Classify pending emails, most urgent first (lanes, aging and per-account fairness)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Process one batch and exit')
+        parser.add_argument('--limit', type=int, default=50, help='Emails per batch with --once')
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help='Seconds to sleep when nothing is pending')
+        parser.add_argument('--metrics-port', type=int, default=None,
+                            help='Serve Prometheus metrics for this worker on this port')
+
+    def handle(self, *args, **options):
+        if options['once']:
+            emails = classify_pending(limit=options['limit'])
+            self.stdout.write(f"Processed {len(emails)} emails")
+            return
+        if options['metrics_port']:
+            metrics.serve_worker_metrics(options['metrics_port'])
+        process_forever(interval=options['interval'])
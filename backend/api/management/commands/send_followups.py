@@ -0,0 +1,38 @@
+"""
+Author: Akshay NS
+Contains: Management command that delivers queued follow-up emails over pooled SMTP connections
+
+"""
+
+# backend/api/management/commands/send_followups.py
+from django.core.management.base import BaseCommand
+
+from api.services import metrics
+from api.services.smtp_sender import FollowUpSender
+
+
+class Command(BaseCommand):
+    help = "Send queued follow-up emails, batching per account and respecting provider rate limits"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Send one batch and exit')
+        parser.add_argument('--limit', type=int, default=100, help='Follow-ups per batch')
+        parser.add_argument('--interval', type=float, default=10.0,
+                            help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--metrics-port', type=int, default=None,
+                            help='Serve Prometheus metrics for this worker on this port')
+
+    def handle(self, *args, **options):
+        sender = FollowUpSender()
+        if options['once']:
+            try:
+                report = sender.send_queued(limit=options['limit'])
+            finally:
+                sender.close()
+            self.stdout.write(
+                f"Sent {report.sent}, failed {report.failed}, retried {report.retried}"
+            )
+            return
+        if options['metrics_port']:
+            metrics.serve_worker_metrics(options['metrics_port'])
+        sender.run_forever(interval=options['interval'], limit=options['limit'])
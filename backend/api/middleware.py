@@ -0,0 +1,38 @@
+"""
+Author: Akshay NS
+Contains: Middleware that reports per-request LLM and IMAP time in a Server-Timing header
+
+"""
+
+# backend/api/middleware.py
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .services import metrics
+
+
+class RequestTimingMiddleware:
+    """Adds a Server-Timing header, e.g. ``total;dur=812.4, llm;dur=790.1``.
+
+    Enabled with the ``EMAILAI_TIMING_HEADER`` setting so production
+    responses do not leak backend timings unless asked to.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'EMAILAI_TIMING_HEADER', False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        with metrics.request_timing_scope() as timings:
+            response = self.get_response(request)
+        total = (time.perf_counter() - start) * 1000
+
+        entries = [f"total;dur={total:.1f}"]
+        for subsystem, seconds in sorted(timings.items()):
+            entries.append(f"{subsystem};dur={seconds * 1000:.1f}")
+        response['Server-Timing'] = ', '.join(entries)
+        return response
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_followupemail_processedemail_cleaned_body_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processedemail',
+            name='message_id',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='processedemail',
+            name='thread_key',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='processedemail',
+            index=models.Index(fields=['account', 'thread_key'], name='api_process_account_1af0a9_idx'),
+        ),
+    ]
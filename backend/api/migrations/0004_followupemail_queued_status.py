@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_processedemail_thread_fields'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='followupemail',
+            name='status',
+            field=models.CharField(choices=[('draft', 'Draft'), ('queued', 'Queued'), ('sent', 'Sent'), ('error', 'Error')], default='draft', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='followupemail',
+            index=models.Index(fields=['status'], name='api_followu_status_4cf81a_idx'),
+        ),
+    ]
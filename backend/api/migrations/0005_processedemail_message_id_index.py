@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_followupemail_queued_status'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='processedemail',
+            index=models.Index(fields=['account', 'message_id'], name='api_process_account_58e215_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_processedemail_message_id_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='followupemail',
+            name='status',
+            field=models.CharField(choices=[('draft', 'Draft'), ('queued', 'Queued'), ('sending', 'Sending'), ('sent', 'Sent'), ('error', 'Error')], default='draft', max_length=20),
+        ),
+    ]
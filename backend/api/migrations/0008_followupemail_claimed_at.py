@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_inferenceactivity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='followupemail',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -46,6 +46,8 @@ class ProcessedEmail(models.Model):
 
     account = models.ForeignKey(EmailAccount, on_delete=models.CASCADE, related_name='emails')
     uid = models.CharField(max_length=255)  # IMAP UID (unique per account)
+    message_id = models.CharField(max_length=255, blank=True, default='')  # RFC 5322 Message-ID
+    thread_key = models.CharField(max_length=255, blank=True, default='')  # Root Message-ID of the thread
     subject = models.TextField()
     from_address = models.EmailField()
     from_name = models.CharField(max_length=255, blank=True, null=True)
@@ -75,6 +77,8 @@ class ProcessedEmail(models.Model):
             models.Index(fields=['priority']),
             models.Index(fields=['needs_reply']),
             models.Index(fields=['category']),
+            models.Index(fields=['account', 'thread_key']),
+            models.Index(fields=['account', 'message_id']),
         ]
 
     def __str__(self):
@@ -95,12 +99,30 @@ class FollowUpEmail(models.Model):
         max_length=20,
         choices=[
             ('draft', 'Draft'),
+            ('queued', 'Queued'),  # Approved by the user, waiting for the SMTP sender
+            ('sending', 'Sending'),  # Claimed by a sender process
             ('sent', 'Sent'),
             ('error', 'Error')
         ],
         default='draft'
     )
     error_message = models.TextField(blank=True, null=True)
+    claimed_at = models.DateTimeField(blank=True, null=True)  # When a sender moved it to 'sending'
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status']),
+        ]
 
     def __str__(self):
         return f"Follow-up ({self.status}) for: {self.original_email.subject[:50]}"
+
+
+class InferenceActivity(models.Model):
+    """Foreground Ollama calls in flight per host, shared by web and worker processes."""
+    host = models.CharField(max_length=255, unique=True)
+    foreground_in_flight = models.IntegerField(default=0)
+    updated_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.host}: {self.foreground_in_flight} in flight"
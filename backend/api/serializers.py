@@ -0,0 +1,36 @@
+"""
+Author: Akshay NS
+Contains: DRF serializers for processed emails and their follow-up drafts
+
+"""
+
+# backend/api/serializers.py
+from rest_framework import serializers
+
+from .models import FollowUpEmail, ProcessedEmail
+
+
+class FollowUpEmailSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = FollowUpEmail
+        fields = ['id', 'content', 'status', 'created_at', 'sent_at', 'error_message']
+
+
+class ProcessedEmailSerializer(serializers.ModelSerializer):
+    draft = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ProcessedEmail
+        fields = [
+            'id', 'uid', 'subject', 'from_address', 'from_name', 'to_address',
+            'received_at', 'raw_body', 'cleaned_body', 'summary', 'category',
+            'priority', 'needs_reply', 'suggested_reply', 'status', 'processed_at',
+            'draft',
+        ]
+
+    def get_draft(self, obj):
+        """Newest pre-generated draft, if the drafter has produced one"""
+        drafts = [f for f in obj.followups.all() if f.status == 'draft']
+        if not drafts:
+            return None
+        return FollowUpEmailSerializer(max(drafts, key=lambda f: f.created_at)).data
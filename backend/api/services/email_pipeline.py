@@ -0,0 +1,285 @@
+"""
+Author: Akshay NS
+Contains: Persistence and AI classification stages for fetched emails
+
+"""
+
+# backend/api/services/email_pipeline.py
+from typing import Dict, Iterable, List, Optional, Tuple
+from datetime import timezone as dt_timezone
+import json
+import logging
+import time
+
+from django.utils import timezone
+
+from ..models import EmailAccount, ProcessedEmail
+from ..tools.email_fetcher import EmailMessage
+from ..tools.header_parser import split_address
+from .ollama_service import OllamaService, OllamaUnavailable, is_transient_error
+from .reply_drafter import invalidate_thread_drafts
+from .scheduler import EmailScheduler, assign_lane, seed_priority
+
+logger = logging.getLogger(__name__)
+
+CLASSIFY_PROMPT = """You are triaging a job seeker's inbox.
+Classify the email below and answer with JSON only, using the keys:
+  "category": one of {categories}
+  "priority": integer 0 (ignore) to 10 (act today)
+  "needs_reply": true or false
+  "summary": one or two sentences
+
+Subject: {subject}
+From: {sender}
+
+{body}"""
+
+# Long bodies mostly add quoted history and signatures; the first few
+# thousand characters are enough to classify and keep prompt eval cheap.
+MAX_PROMPT_BODY_CHARS = 4000
+
+# ProcessedEmail.message_id / thread_key column width
+MAX_ID_LENGTH = 255
+
+CLASSIFY_FIELDS = [
+    'category', 'priority', 'needs_reply', 'summary', 'status', 'processed_at'
+]
+
+
+def persist_emails(account: EmailAccount, messages: Iterable[EmailMessage],
+                   batch_size: int = 500) -> int:
+    """Store fetched messages as pending ProcessedEmail rows.
+
+    Messages already stored for the account (same UID or Message-ID) are
+    skipped, and reply drafts for threads that received new mail are invalidated.
+    Returns the number of new rows.
+    """
+    messages = list(messages)
+    identities = [thread_identity(message.headers) for message in messages]
+    existing = set(ProcessedEmail.objects.filter(
+        account=account, uid__in=[message.uid for message in messages]
+    ).values_list('uid', flat=True))
+    # The same mail filed in several folders arrives under different UIDs
+    existing_ids = set(ProcessedEmail.objects.filter(
+        account=account, message_id__in=[message_id for message_id, _ in identities if message_id]
+    ).values_list('message_id', flat=True))
+
+    rows = []
+    for message, (message_id, thread_key) in zip(messages, identities):
+        if message.uid in existing or (message_id and message_id in existing_ids):
+            continue
+        existing.add(message.uid)
+        if message_id:
+            existing_ids.add(message_id)
+        from_name, from_address = message.from_name, message.from_address
+        if not from_address:
+            from_name, from_address = split_address(message.sender)
+        rows.append(ProcessedEmail(
+            account=account,
+            uid=message.uid,
+            message_id=message_id,
+            thread_key=thread_key or f"uid:{message.uid}",
+            subject=message.subject,
+            from_address=from_address,
+            from_name=from_name or None,
+            received_at=_aware(message.date),
+            raw_body=message.text,
+            priority=seed_priority(message.subject, from_address, message.headers),
+        ))
+
+    ProcessedEmail.objects.bulk_create(rows, batch_size=batch_size, ignore_conflicts=True)
+    invalidate_thread_drafts(account, [row.thread_key for row in rows])
+    return len(rows)
+
+
+def thread_identity(headers: Dict[str, str]) -> Tuple[str, str]:
+    """Return (message_id, thread_key) from raw headers.
+
+    The thread key is the root Message-ID: the first entry of References,
+    else In-Reply-To, else the message's own Message-ID.
+    """
+    headers = {name.lower(): str(value) for name, value in headers.items()}
+    message_id = headers.get('message-id', '').strip()
+    references = headers.get('references', '').split()
+    in_reply_to = headers.get('in-reply-to', '').split()
+    root = (references or in_reply_to or [message_id])[0]
+    return message_id[:MAX_ID_LENGTH], root[:MAX_ID_LENGTH]
+
+
+def classify_email(processed_email: ProcessedEmail,
+                   ollama: Optional[OllamaService] = None,
+                   save: bool = True) -> ProcessedEmail:
+    """Ask the LLM for category, priority, reply need and summary.
+
+    Only a bad or unparseable answer marks the row ERROR. If Ollama is
+    unreachable, times out or is overloaded the row is left PENDING and
+    OllamaUnavailable is raised so the caller can back off and retry.
+    """
+    ollama = ollama or OllamaService()
+    prompt = CLASSIFY_PROMPT.format(
+        categories=', '.join(ProcessedEmail.Category.values),
+        subject=processed_email.subject,
+        sender=processed_email.from_address,
+        body=(processed_email.cleaned_body or processed_email.raw_body)[:MAX_PROMPT_BODY_CHARS],
+    )
+    try:
+        response = ollama.generate(
+            prompt=prompt,
+            call_site='pipeline.classify',
+            format='json',
+            options={'temperature': 0.1}
+        )
+        result = json.loads(response)
+        category = result.get('category')
+        processed_email.category = (
+            category if category in ProcessedEmail.Category.values
+            else ProcessedEmail.Category.OTHER
+        )
+        processed_email.priority = int(result.get('priority', 0))
+        processed_email.needs_reply = bool(result.get('needs_reply', False))
+        processed_email.summary = result.get('summary')
+        processed_email.status = ProcessedEmail.Status.PROCESSED
+    except Exception as e:
+        if is_transient_error(e):
+            raise OllamaUnavailable(str(e)) from e
+        logger.warning(f"Error classifying email {processed_email.pk}: {str(e)}")
+        processed_email.status = ProcessedEmail.Status.ERROR
+    processed_email.processed_at = timezone.now()
+
+    if save:
+        processed_email.save(update_fields=CLASSIFY_FIELDS)
+    return processed_email
+
+
+def enqueue_pending(scheduler: EmailScheduler, account: Optional[EmailAccount] = None,
+                    after_id: int = 0) -> Tuple[int, int]:
+    """Queue pending emails with ``id > after_id`` that the scheduler has not seen yet.
+
+    Returns (newly queued, highest id read) so a long-running caller can
+    pass the latter back in and only read rows persisted since.
+    """
+    pending = ProcessedEmail.objects.filter(
+        status=ProcessedEmail.Status.PENDING, id__gt=after_id
+    ).order_by('id')
+    if account is not None:
+        pending = pending.filter(account=account)
+
+    now = timezone.now()
+    queued = 0
+    last_id = after_id
+    for email_id, account_id, priority, received_at in pending.values_list(
+        'id', 'account_id', 'priority', 'received_at'
+    ).iterator():
+        lane = assign_lane(priority, received_at, now)
+        queued += scheduler.push(email_id, account_id, lane, priority)
+        last_id = email_id
+    return queued, last_id
+
+
+def classify_pending(account: Optional[EmailAccount] = None, limit: int = 50,
+                     ollama: Optional[OllamaService] = None,
+                     scheduler: Optional[EmailScheduler] = None) -> List[ProcessedEmail]:
+    """Classify up to ``limit`` pending emails in scheduler order and write results in one batch.
+
+    Without a ``scheduler`` this is a one-shot batch: pending rows are
+    ordered by lane and priority, and whatever is not picked is dropped
+    again afterwards (aging and account fairness need the long-lived
+    scheduler of ``process_forever``).
+    """
+    ollama = ollama or OllamaService()
+    one_shot = scheduler is None
+    scheduler = scheduler or EmailScheduler()
+    try:
+        enqueue_pending(scheduler, account)
+        items = list(scheduler.drain(limit))
+    finally:
+        if one_shot:
+            scheduler.clear()
+
+    rows = ProcessedEmail.objects.in_bulk([item.email_id for item in items])
+    emails = []
+    for index, item in enumerate(items):
+        processed_email = rows.get(item.email_id)
+        if processed_email is None or processed_email.status != ProcessedEmail.Status.PENDING:
+            continue
+        try:
+            emails.append(classify_email(processed_email, ollama, save=False))
+        except OllamaUnavailable as e:
+            # The rest would fail the same way; they stay pending for the next run
+            logger.warning(f"Ollama unavailable, stopping batch after {len(emails)} emails: {str(e)}")
+            if not one_shot:
+                for remaining in items[index:]:
+                    scheduler.requeue(remaining)
+            break
+        scheduler.complete(item)
+    ProcessedEmail.objects.bulk_update(emails, CLASSIFY_FIELDS)
+    return emails
+
+
+# process_forever re-reads every pending row this often (and whenever its
+# queue runs dry) to pick up rows that became pending again; in between it
+# only reads rows newer than the last one it saw.
+FULL_RESCAN_SECONDS = 5 * 60
+
+# Longest pause between retries while Ollama is unreachable
+MAX_RETRY_SECONDS = 5 * 60
+
+
+def process_forever(scheduler: Optional[EmailScheduler] = None,
+                    ollama: Optional[OllamaService] = None,
+                    interval: float = 5.0, sleep=time.sleep,
+                    clock=time.monotonic):
+    """Worker loop: classify one email at a time in scheduler order.
+
+    Rows persisted since the previous pick are queued before every pick,
+    so newly fetched urgent mail overtakes a running backfill immediately,
+    without re-reading the whole backlog each time. While Ollama is
+    unavailable the email is put back and the loop waits ``interval``,
+    doubling up to MAX_RETRY_SECONDS, instead of failing the backlog.
+    """
+    ollama = ollama or OllamaService()
+    owns_scheduler = scheduler is None
+    scheduler = scheduler or EmailScheduler()
+    try:
+        last_id = 0
+        last_full_scan = clock()
+        failures = 0
+        while True:
+            if not len(scheduler) or clock() - last_full_scan >= FULL_RESCAN_SECONDS:
+                _, newest = enqueue_pending(scheduler)
+                last_id = max(last_id, newest)
+                last_full_scan = clock()
+            else:
+                _, last_id = enqueue_pending(scheduler, after_id=last_id)
+            item = scheduler.pop()
+            if item is None:
+                sleep(interval)
+                continue
+            processed_email = ProcessedEmail.objects.filter(
+                pk=item.email_id, status=ProcessedEmail.Status.PENDING
+            ).first()
+            if processed_email is None:
+                continue
+            try:
+                classify_email(processed_email, ollama)
+            except OllamaUnavailable as e:
+                scheduler.requeue(item)
+                delay = min(interval * 2 ** failures, MAX_RETRY_SECONDS)
+                failures += 1
+                logger.warning(f"Ollama unavailable, retrying in {delay:.0f}s: {str(e)}")
+                sleep(delay)
+                continue
+            failures = 0
+            scheduler.complete(item)
+    finally:
+        if owns_scheduler:
+            scheduler.clear()
+
+
+def _aware(value):
+    """Rows need an aware received_at; fall back to now for undated mail"""
+    if value is None:
+        return timezone.now()
+    if timezone.is_naive(value):
+        return timezone.make_aware(value, dt_timezone.utc)
+    return value
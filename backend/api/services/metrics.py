@@ -0,0 +1,273 @@
+"""
+Author: Akshay NS
+Contains: Prometheus metrics for LLM calls and IMAP/SMTP operations, plus per-request timing accumulation
+
+"""
+
+# backend/api/services/metrics.py
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+import logging
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    start_http_server,
+)
+
+logger = logging.getLogger(__name__)
+
+# Dedicated registry so the endpoint only exposes EmailAI metrics
+REGISTRY = CollectorRegistry(auto_describe=True)
+
+# Local models take anywhere from tens of milliseconds (cached embeddings)
+# to minutes (cold load of a large model), so the buckets are wide.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+TOKEN_BUCKETS = (8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+QUEUE_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, 7200, 21600, 86400)
+IMAP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+LLM_REQUEST_SECONDS = Histogram(
+    'emailai_llm_request_duration_seconds',
+    'Wall-clock latency of Ollama calls as seen by the client',
+    ['model', 'operation', 'call_site'],
+    buckets=LATENCY_BUCKETS,
+    registry=REGISTRY,
+)
+LLM_LOAD_SECONDS = Histogram(
+    'emailai_llm_load_duration_seconds',
+    'Time Ollama spent loading the model (load_duration)',
+    ['model', 'operation', 'call_site'],
+    buckets=LATENCY_BUCKETS,
+    registry=REGISTRY,
+)
+LLM_PROMPT_EVAL_SECONDS = Histogram(
+    'emailai_llm_prompt_eval_duration_seconds',
+    'Time Ollama spent evaluating the prompt (prompt_eval_duration)',
+    ['model', 'operation', 'call_site'],
+    buckets=LATENCY_BUCKETS,
+    registry=REGISTRY,
+)
+LLM_EVAL_SECONDS = Histogram(
+    'emailai_llm_eval_duration_seconds',
+    'Time Ollama spent generating the response (eval_duration)',
+    ['model', 'operation', 'call_site'],
+    buckets=LATENCY_BUCKETS,
+    registry=REGISTRY,
+)
+LLM_PROMPT_TOKENS = Histogram(
+    'emailai_llm_prompt_tokens',
+    'Prompt tokens evaluated per call (prompt_eval_count)',
+    ['model', 'operation', 'call_site'],
+    buckets=TOKEN_BUCKETS,
+    registry=REGISTRY,
+)
+LLM_COMPLETION_TOKENS = Histogram(
+    'emailai_llm_completion_tokens',
+    'Tokens generated per call (eval_count)',
+    ['model', 'operation', 'call_site'],
+    buckets=TOKEN_BUCKETS,
+    registry=REGISTRY,
+)
+LLM_ERRORS = Counter(
+    'emailai_llm_errors_total',
+    'Ollama calls that raised an exception',
+    ['model', 'operation', 'call_site'],
+    registry=REGISTRY,
+)
+
+IMAP_OPERATION_SECONDS = Histogram(
+    'emailai_imap_operation_duration_seconds',
+    'Latency of IMAP commands issued by EmailFetchTool',
+    ['server', 'operation'],
+    buckets=IMAP_BUCKETS,
+    registry=REGISTRY,
+)
+IMAP_ERRORS = Counter(
+    'emailai_imap_errors_total',
+    'IMAP commands that raised an exception',
+    ['server', 'operation'],
+    registry=REGISTRY,
+)
+IMAP_MESSAGES_FETCHED = Counter(
+    'emailai_imap_messages_fetched_total',
+    'Messages downloaded over IMAP',
+    ['server'],
+    registry=REGISTRY,
+)
+IMAP_BYTES_FETCHED = Counter(
+    'emailai_imap_bytes_fetched_total',
+    'Raw message bytes downloaded over IMAP',
+    ['server'],
+    registry=REGISTRY,
+)
+
+SMTP_OPERATION_SECONDS = Histogram(
+    'emailai_smtp_operation_duration_seconds',
+    'Latency of SMTP connects and sends for follow-up emails',
+    ['server', 'operation'],
+    buckets=IMAP_BUCKETS,
+    registry=REGISTRY,
+)
+SMTP_ERRORS = Counter(
+    'emailai_smtp_errors_total',
+    'SMTP connects and sends that raised an exception',
+    ['server', 'operation'],
+    registry=REGISTRY,
+)
+
+SCHEDULER_QUEUE_DEPTH = Gauge(
+    'emailai_scheduler_queue_depth',
+    'Emails waiting for AI processing, per scheduler lane',
+    ['lane'],
+    registry=REGISTRY,
+)
+SCHEDULER_QUEUE_WAIT = Histogram(
+    'emailai_scheduler_queue_wait_seconds',
+    'Time from enqueue until a worker picked the email up',
+    ['lane'],
+    buckets=QUEUE_BUCKETS,
+    registry=REGISTRY,
+)
+SCHEDULER_LATENCY = Histogram(
+    'emailai_scheduler_latency_seconds',
+    'Time from enqueue until processing finished',
+    ['lane'],
+    buckets=QUEUE_BUCKETS,
+    registry=REGISTRY,
+)
+SCHEDULER_SLO_MISSES = Counter(
+    'emailai_scheduler_slo_misses_total',
+    'Emails whose processing latency exceeded their lane SLO',
+    ['lane'],
+    registry=REGISTRY,
+)
+
+DRAFTS_GENERATED = Counter(
+    'emailai_reply_drafts_generated_total',
+    'Speculative reply drafts stored as FollowUpEmail rows',
+    registry=REGISTRY,
+)
+DRAFTS_INVALIDATED = Counter(
+    'emailai_reply_drafts_invalidated_total',
+    'Reply drafts discarded because their thread received new mail',
+    registry=REGISTRY,
+)
+
+# Time spent per subsystem during the current HTTP request, in seconds.
+# Populated only while RequestTimingMiddleware has opened a scope.
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar(
+    'emailai_request_timings', default=None
+)
+
+NANOSECONDS = 1_000_000_000
+
+
+@contextmanager
+def request_timing_scope():
+    """Collect subsystem timings for the duration of a request"""
+    token = _request_timings.set({})
+    try:
+        yield _request_timings.get()
+    finally:
+        _request_timings.reset(token)
+
+
+def _add_request_timing(subsystem: str, seconds: float):
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[subsystem] = timings.get(subsystem, 0.0) + seconds
+
+
+def _response_stat(response: Any, key: str) -> Optional[Any]:
+    """Read a stat from an ollama response object or plain dict"""
+    try:
+        return response[key]
+    except (KeyError, TypeError):
+        return None
+
+
+def record_llm_response(model: str, operation: str, call_site: str,
+                        elapsed: float, response: Any):
+    """Record client latency and the server-side stats Ollama returns"""
+    labels = (model, operation, call_site)
+    LLM_REQUEST_SECONDS.labels(*labels).observe(elapsed)
+    _add_request_timing('llm', elapsed)
+
+    for key, histogram in (
+        ('load_duration', LLM_LOAD_SECONDS),
+        ('prompt_eval_duration', LLM_PROMPT_EVAL_SECONDS),
+        ('eval_duration', LLM_EVAL_SECONDS),
+    ):
+        value = _response_stat(response, key)
+        if value is not None:
+            histogram.labels(*labels).observe(value / NANOSECONDS)
+
+    for key, histogram in (
+        ('prompt_eval_count', LLM_PROMPT_TOKENS),
+        ('eval_count', LLM_COMPLETION_TOKENS),
+    ):
+        value = _response_stat(response, key)
+        if value is not None:
+            histogram.labels(*labels).observe(value)
+
+
+def record_llm_error(model: str, operation: str, call_site: str, elapsed: float):
+    LLM_ERRORS.labels(model, operation, call_site).inc()
+    _add_request_timing('llm', elapsed)
+
+
+@contextmanager
+def track_imap(server: str, operation: str):
+    """Time an IMAP command and count failures"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        IMAP_ERRORS.labels(server, operation).inc()
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        IMAP_OPERATION_SECONDS.labels(server, operation).observe(elapsed)
+        _add_request_timing('imap', elapsed)
+
+
+@contextmanager
+def track_smtp(server: str, operation: str):
+    """Time an SMTP operation and count failures"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        SMTP_ERRORS.labels(server, operation).inc()
+        raise
+    finally:
+        SMTP_OPERATION_SECONDS.labels(server, operation).observe(time.perf_counter() - start)
+
+
+def record_imap_message(server: str, size: int):
+    IMAP_MESSAGES_FETCHED.labels(server).inc()
+    IMAP_BYTES_FETCHED.labels(server).inc(size)
+
+
+def render_latest() -> tuple:
+    """Return (body, content_type) in the Prometheus text exposition format"""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def serve_worker_metrics(port: int, addr: str = '0.0.0.0'):
+    """Expose this process's metrics on ``port`` from a background thread.
+
+    Worker commands (process_emails, draft_replies, send_followups) run in
+    their own processes, so their scheduler, draft and SMTP metrics never
+    reach the web server's /api/metrics; Prometheus scrapes each worker
+    on its own port instead.
+    """
+    start_http_server(port, addr=addr, registry=REGISTRY)
+    logger.info(f"Serving worker metrics on {addr}:{port}")
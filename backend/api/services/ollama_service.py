@@ -4,30 +4,140 @@ Contains: Ollama service for executing tools and generating responses with AI
 
 """
 
-import ollama
 from typing import Optional, Dict, Any
+from datetime import timedelta
 from django.conf import settings
+from django.db import DatabaseError
+from django.db.models import F
+from django.utils import timezone
 import logging
 from functools import wraps
 import os
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
+import threading
+import time
 
+from ..models import InferenceActivity
+from . import metrics
 
 logger = logging.getLogger(__name__)
 
+# A shared in-flight count not touched for this long was left behind by a
+# process that died mid-call and is ignored
+FOREGROUND_LEASE_SECONDS = 300
+
+
+class OllamaUnavailable(ConnectionError):
+    """Ollama could not be reached or was overloaded; the call may succeed later"""
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """Connection failures, timeouts and 429/5xx replies, as opposed to bad output.
+
+    httpx errors are recognised by module so ollama (and httpx) stay
+    unimported until a call is actually made.
+    """
+    if isinstance(error, (OSError, TimeoutError)):
+        return True
+    if any(cls.__module__.startswith(('httpx', 'httpcore')) for cls in type(error).__mro__):
+        return True
+    status = getattr(error, 'status_code', None)
+    return isinstance(status, int) and (status == 429 or status >= 500)
+
+
 class OllamaService:
-    def __init__(self):
-        self.client = ollama.Client(host=os.getenv('OLLAMA_HOST'))
+    # Foreground calls currently running in this process. They are also
+    # counted per host in InferenceActivity so background work (e.g.
+    # speculative reply drafts) in other processes backs off too.
+    _foreground_in_flight = 0
+    _in_flight_lock = threading.Lock()
+
+    def __init__(self, background: bool = False):
+        self.host = os.getenv('OLLAMA_HOST')
         self.default_model = os.getenv('OLLAMA_DEFAULT_MODEL', 'deepseek-r1:1.5b')
+        self.background = background
+        self._client = None
+
+    @property
+    def client(self):
+        """ollama.Client, created on first use.
+
+        Importing ollama (httpx, pydantic) takes longer than the rest of the
+        app's imports together, so only processes that call the model pay it.
+        """
+        if self._client is None:
+            import ollama
+            self._client = ollama.Client(host=self.host)
+        return self._client
+
+    @classmethod
+    def foreground_busy(cls, host: Optional[str] = None) -> bool:
+        """True while a foreground call to ``host`` is waiting on Ollama in any process"""
+        if cls._foreground_in_flight > 0:
+            return True
+        cutoff = timezone.now() - timedelta(seconds=FOREGROUND_LEASE_SECONDS)
+        try:
+            return InferenceActivity.objects.filter(
+                host=cls._activity_key(host), foreground_in_flight__gt=0, updated_at__gte=cutoff
+            ).exists()
+        except DatabaseError as e:
+            logger.debug(f"Could not read inference activity: {str(e)}")
+            return False
+
+    @staticmethod
+    def _activity_key(host: Optional[str]) -> str:
+        return (host or settings.OLLAMA_HOST).rstrip('/')
+
+    def _track_foreground(self, delta: int):
+        with self._in_flight_lock:
+            type(self)._foreground_in_flight += delta
+        key = self._activity_key(self.host)
+        now = timezone.now()
+        try:
+            rows = InferenceActivity.objects.filter(host=key)
+            if delta > 0:
+                rows.filter(
+                    updated_at__lt=now - timedelta(seconds=FOREGROUND_LEASE_SECONDS)
+                ).update(foreground_in_flight=0)
+                increment = {'foreground_in_flight': F('foreground_in_flight') + delta, 'updated_at': now}
+                if not rows.update(**increment):
+                    _, created = InferenceActivity.objects.get_or_create(
+                        host=key, defaults={'foreground_in_flight': delta, 'updated_at': now}
+                    )
+                    if not created:
+                        rows.update(**increment)
+            else:
+                rows.filter(foreground_in_flight__gt=0).update(
+                    foreground_in_flight=F('foreground_in_flight') + delta, updated_at=now
+                )
+        except DatabaseError as e:
+            # Coordination is best effort; never fail the model call over it
+            logger.debug(f"Could not record inference activity: {str(e)}")
+
+    def _call(self, operation: str, model: str, call_site: str, func, **kwargs):
+        """Invoke an ollama client method and record its timing stats"""
+        if not self.background:
+            self._track_foreground(1)
+        start = time.perf_counter()
+        try:
+            response = func(model=model, **kwargs)
+        except Exception:
+            metrics.record_llm_error(model, operation, call_site, time.perf_counter() - start)
+            raise
+        finally:
+            if not self.background:
+                self._track_foreground(-1)
+        metrics.record_llm_response(
+            model, operation, call_site, time.perf_counter() - start, response
+        )
+        return response
 
-    def generate(self, prompt: str, model: Optional[str] = None, **kwargs) -> str:
+    def generate(self, prompt: str, model: Optional[str] = None,
+                 call_site: str = 'default', **kwargs) -> str:
         """Generic method to get response from Ollama"""
         try:
-            response = self.client.generate(
-                model=model or self.default_model,
+            response = self._call(
+                'generate', model or self.default_model, call_site,
+                self.client.generate,
                 prompt=prompt,
                 **kwargs
             )
@@ -36,11 +146,13 @@ class OllamaService:
             logger.error(f"Error generating response from Ollama: {str(e)}")
             raise
 
-    def chat(self, messages: list, model: Optional[str] = None, **kwargs) -> str:
+    def chat(self, messages: list, model: Optional[str] = None,
+             call_site: str = 'default', **kwargs) -> str:
         """Chat completion style interaction"""
         try:
-            response = self.client.chat(
-                model=model or self.default_model,
+            response = self._call(
+                'chat', model or self.default_model, call_site,
+                self.client.chat,
                 messages=messages,
                 **kwargs
             )
@@ -49,11 +161,13 @@ class OllamaService:
             logger.error(f"Error in Ollama chat: {str(e)}")
             raise
 
-    def get_embedding(self, text: str, model: Optional[str] = None) -> list:
+    def get_embedding(self, text: str, model: Optional[str] = None,
+                      call_site: str = 'default') -> list:
         """Get embeddings for text"""
         try:
-            response = self.client.embeddings(
-                model=model or self.default_model,
+            response = self._call(
+                'embeddings', model or self.default_model, call_site,
+                self.client.embeddings,
                 prompt=text
             )
             return response['embedding']
@@ -84,11 +198,13 @@ class OllamaTools:
             """Processes email content and returns analysis"""
             summary = self.ollama.generate(
                 prompt=f"Summarize this email: {email_text}",
+                call_site='process_email.summary',
                 options={'temperature': 0.1}
             )
             
             classification = self.ollama.generate(
                 prompt=f"Classify this email: {email_text}",
+                call_site='process_email.classification',
                 options={'temperature': 0.1}
             )
             
@@ -0,0 +1,112 @@
+"""
+Author: Akshay NS
+Contains: Process-pool stage that parses raw RFC822 bytes off the IMAP thread with bounded in-flight work
+
+"""
+
+# backend/api/services/parse_pool.py
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Iterable, Iterator, List, Optional, Tuple
+import logging
+import os
+import threading
+
+from ..tools.email_fetcher import EmailMessage, parse_email, parse_emails
+
+logger = logging.getLogger(__name__)
+
+# Messages per task; big enough to amortise pickling and IPC per message
+DEFAULT_CHUNK_SIZE = 16
+
+
+def _parse_chunk(chunk: List[Tuple[bytes, str]]) -> List[Optional[EmailMessage]]:
+    """Worker entry point: one result per input, None where parsing failed"""
+    try:
+        return parse_emails(chunk)
+    except Exception:
+        # Fall back to one at a time so a single bad message costs only itself
+        results = []
+        for raw, uid in chunk:
+            try:
+                results.append(parse_email(raw, uid))
+            except Exception as e:
+                logger.warning(f"Error parsing email {uid}: {str(e)}")
+                results.append(None)
+        return results
+
+
+class ParsePool:
+    """Parses raw messages in worker processes so parsing uses every core.
+
+    MIME parsing, charset decoding and HTML-to-text are pure CPU work; in
+    the fetch thread they serialise behind IMAP I/O on one core. Raw bytes
+    are shipped in chunks of ``chunk_size`` and come back as
+    EmailMessage records.
+
+    At most ``max_in_flight`` chunks are queued or running at once:
+    ``submit`` blocks beyond that, so a fast fetcher cannot buffer a whole
+    mailbox of raw bytes in memory ahead of the workers. ``workers=0``
+    parses inline, which is cheaper for small batches than starting
+    processes.
+    """
+
+    def __init__(self, workers: Optional[int] = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 max_in_flight: Optional[int] = None):
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.chunk_size = max(1, chunk_size)
+        self.max_in_flight = max_in_flight or 2 * max(1, self.workers)
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+        self._executor = ProcessPoolExecutor(max_workers=self.workers) if self.workers else None
+
+    def submit(self, chunk: List[Tuple[bytes, str]]) -> Future:
+        """Queue one chunk; blocks while ``max_in_flight`` chunks are outstanding"""
+        if self._executor is None:
+            future = Future()
+            future.set_result(_parse_chunk(chunk))
+            return future
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(_parse_chunk, chunk)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def map(self, raw_emails: Iterable[Tuple[bytes, str]]) -> Iterator[EmailMessage]:
+        """Parse (raw bytes, uid) pairs, yielding messages in input order.
+
+        Results are yielded as soon as the oldest chunk is done, which is
+        what frees a slot for the next one.
+        """
+        pending = deque()
+        chunk = []
+        for item in raw_emails:
+            chunk.append(item)
+            if len(chunk) >= self.chunk_size:
+                while pending and len(pending) >= self.max_in_flight:
+                    yield from self._results(pending.popleft())
+                pending.append(self.submit(chunk))
+                chunk = []
+        if chunk:
+            pending.append(self.submit(chunk))
+        while pending:
+            yield from self._results(pending.popleft())
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @staticmethod
+    def _results(future: Future) -> Iterator[EmailMessage]:
+        for message in future.result():
+            if message is not None:
+                yield message
@@ -0,0 +1,159 @@
+"""
+Author: Akshay NS
+Contains: Background reply drafting that pre-generates FollowUpEmail drafts for mail that needs a reply
+
+"""
+
+# backend/api/services/reply_drafter.py
+from typing import Iterable, List, Optional
+import logging
+import time
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from ..models import EmailAccount, FollowUpEmail, ProcessedEmail
+from . import metrics
+from .ollama_service import OllamaService
+
+logger = logging.getLogger(__name__)
+
+DRAFT_PROMPT = """You are helping a job seeker reply to their email.
+Write a short, polite, professional reply to the most recent message in
+the thread below. Reply with the email body only, no subject line.
+
+{thread}"""
+
+# How much of the thread to show the model, newest messages last
+MAX_THREAD_MESSAGES = 5
+MAX_MESSAGE_CHARS = 1500
+
+
+def invalidate_thread_drafts(account: EmailAccount, thread_keys: Iterable[str]) -> int:
+    """Discard drafts for threads that just received new mail.
+
+    A draft answers the thread as it looked when it was generated; once a
+    new message lands it may answer the wrong question, so it is dropped
+    and the drafter regenerates it with the new context.
+    """
+    thread_keys = [key for key in set(thread_keys) if key]
+    if not thread_keys:
+        return 0
+
+    with transaction.atomic():
+        deleted, _ = FollowUpEmail.objects.filter(
+            status='draft',
+            original_email__account=account,
+            original_email__thread_key__in=thread_keys,
+        ).delete()
+        ProcessedEmail.objects.filter(
+            account=account, thread_key__in=thread_keys, suggested_reply__isnull=False
+        ).update(suggested_reply=None)
+
+    if deleted:
+        metrics.DRAFTS_INVALIDATED.inc(deleted)
+    return deleted
+
+
+class ReplyDrafter:
+    """Pre-generates replies so opening an email shows a draft instantly.
+
+    Rows with ``needs_reply=True`` and no follow-up are handled highest
+    ``priority`` first. Drafting only runs while inference is idle: no
+    pending classification work and no foreground Ollama call in flight
+    in any process (see OllamaService.foreground_busy).
+    """
+
+    def __init__(self, ollama: Optional[OllamaService] = None,
+                 account: Optional[EmailAccount] = None):
+        self.ollama = ollama or OllamaService(background=True)
+        self.account = account
+
+    def candidates(self):
+        """Latest message of each thread that needs a reply and has no follow-up yet.
+
+        Any follow-up counts, not just drafts: once a reply is queued, sent
+        or failed the user has dealt with the email.
+        """
+        has_followup = FollowUpEmail.objects.filter(original_email=OuterRef('pk'))
+        has_newer = ProcessedEmail.objects.filter(
+            account=OuterRef('account'),
+            thread_key=OuterRef('thread_key'),
+            received_at__gt=OuterRef('received_at'),
+        ).exclude(thread_key='')
+        queryset = ProcessedEmail.objects.filter(
+            needs_reply=True, status=ProcessedEmail.Status.PROCESSED
+        ).exclude(Exists(has_followup)).exclude(Exists(has_newer))
+        if self.account is not None:
+            queryset = queryset.filter(account=self.account)
+        return queryset.order_by('-priority', '-received_at')
+
+    def inference_idle(self) -> bool:
+        """Classification and interactive calls, in any process, take precedence over drafts"""
+        if OllamaService.foreground_busy(self.ollama.host):
+            return False
+        pending = ProcessedEmail.objects.filter(status=ProcessedEmail.Status.PENDING)
+        if self.account is not None:
+            pending = pending.filter(account=self.account)
+        return not pending.exists()
+
+    def draft(self, processed_email: ProcessedEmail) -> Optional[FollowUpEmail]:
+        """Generate and store a draft reply for one email"""
+        messages = self._thread_messages(processed_email)
+        try:
+            content = self.ollama.generate(
+                prompt=DRAFT_PROMPT.format(thread=self._thread_context(messages)),
+                call_site='drafter.reply',
+                options={'temperature': 0.4}
+            ).strip()
+        except Exception as e:
+            logger.warning(f"Error drafting reply for email {processed_email.pk}: {str(e)}")
+            return None
+
+        with transaction.atomic():
+            # The thread may have moved on while the model was generating;
+            # a newer message means this draft is already stale.
+            if self._thread_messages(processed_email) != messages:
+                logger.debug(f"Thread changed while drafting email {processed_email.pk}")
+                return None
+            followup = FollowUpEmail.objects.create(
+                original_email=processed_email, content=content, status='draft'
+            )
+            ProcessedEmail.objects.filter(pk=processed_email.pk).update(suggested_reply=content)
+
+        metrics.DRAFTS_GENERATED.inc()
+        return followup
+
+    def run_once(self, limit: int = 10) -> List[FollowUpEmail]:
+        """Draft up to ``limit`` replies, stopping as soon as inference gets busy"""
+        drafts = []
+        for processed_email in self.candidates()[:limit]:
+            if not self.inference_idle():
+                break
+            followup = self.draft(processed_email)
+            if followup:
+                drafts.append(followup)
+        return drafts
+
+    def run_forever(self, interval: float = 5.0, limit: int = 10):
+        """Poll for drafting work; sleeps whenever there is none or inference is busy"""
+        while True:
+            drafts = self.run_once(limit=limit)
+            if not drafts:
+                time.sleep(interval)
+
+    def _thread_messages(self, processed_email: ProcessedEmail):
+        if not processed_email.thread_key:
+            return [processed_email]
+        return list(ProcessedEmail.objects.filter(
+            account_id=processed_email.account_id,
+            thread_key=processed_email.thread_key,
+        ).order_by('-received_at')[:MAX_THREAD_MESSAGES])[::-1]
+
+    def _thread_context(self, messages: List[ProcessedEmail]) -> str:
+        parts = []
+        for message in messages:
+            body = (message.cleaned_body or message.raw_body or '')[:MAX_MESSAGE_CHARS]
+            sender = message.from_name or message.from_address
+            parts.append(f"From: {sender}\nSubject: {message.subject}\n\n{body}")
+        return '\n\n---\n\n'.join(parts)
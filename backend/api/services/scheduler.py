@@ -0,0 +1,261 @@
+"""
+Author: Akshay NS
+Contains: Priority scheduler that orders AI processing by lane, priority, age and account fairness
+
+"""
+
+# backend/api/services/scheduler.py
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from enum import IntEnum
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple
+import heapq
+import itertools
+import re
+import threading
+import time
+
+from django.utils import timezone
+
+from . import metrics
+
+
+class Lane(IntEnum):
+    """Lower value = served first"""
+    URGENT = 0  # offers, interviews, recruiter replies
+    LIVE = 1  # newly arrived mail
+    BACKFILL = 2  # historical mail pulled in by a first sync or re-scan
+    BULK = 3  # newsletters, notifications, marketing
+
+
+# Target time from enqueue to processed, per lane
+LANE_SLO_SECONDS = {
+    Lane.URGENT: 60,
+    Lane.LIVE: 5 * 60,
+    Lane.BACKFILL: 60 * 60,
+    Lane.BULK: 6 * 60 * 60,
+}
+
+# Every AGING_SECONDS an item has waited promotes it one lane, so bulk
+# mail reaches URGENT rank after 3 * AGING_SECONDS and never starves.
+AGING_SECONDS = 15 * 60
+
+# Mail older than this when first queued is treated as backfill
+LIVE_WINDOW = timedelta(hours=24)
+
+# Seed priorities written at persist time, before the LLM has seen the mail
+SEED_BULK = 0
+SEED_NORMAL = 3
+SEED_HIGH = 7
+
+_HIGH_SUBJECT = re.compile(
+    r'\b(offer|interview|next steps|assessment|recruit\w*|schedul\w*|'
+    r'your application|application (status|update)|hiring manager)\b',
+    re.IGNORECASE,
+)
+_BULK_SUBJECT = re.compile(
+    r'\b(newsletter|digest|unsubscribe|% off|sale|deals?|webinar|promo\w*)\b',
+    re.IGNORECASE,
+)
+_BULK_SENDER = re.compile(r'^(no-?reply|noreply|newsletter|marketing|news|notifications?)@', re.IGNORECASE)
+_BULK_HEADERS = ('list-unsubscribe', 'list-id')
+
+
+def seed_priority(subject: str, from_address: str, headers: Dict[str, str]) -> int:
+    """Cheap header heuristics used until the LLM assigns a real priority"""
+    lowered = {name.lower(): str(value) for name, value in headers.items()}
+    if _HIGH_SUBJECT.search(subject or ''):
+        return SEED_HIGH
+    if (any(name in lowered for name in _BULK_HEADERS)
+            or lowered.get('precedence', '').lower() in ('bulk', 'list', 'junk')
+            or _BULK_SENDER.match(from_address or '')
+            or _BULK_SUBJECT.search(subject or '')):
+        return SEED_BULK
+    return SEED_NORMAL
+
+
+def assign_lane(priority: int, received_at: Optional[datetime],
+                now: Optional[datetime] = None) -> Lane:
+    """Lane for a queued email from its (seeded or LLM) priority and age"""
+    if priority >= SEED_HIGH:
+        return Lane.URGENT
+    if priority <= SEED_BULK:
+        return Lane.BULK
+    now = now or timezone.now()
+    if received_at is not None and now - received_at > LIVE_WINDOW:
+        return Lane.BACKFILL
+    return Lane.LIVE
+
+
+@dataclass
+class WorkItem:
+    email_id: int
+    account_id: int
+    lane: Lane
+    priority: int
+    enqueued_at: float
+    seq: int = 0
+    started_at: Optional[float] = None
+
+
+@dataclass
+class _LaneQueue:
+    """Items of one (account, lane), reachable by priority and by age"""
+    by_priority: List[Tuple[int, float, int, WorkItem]] = field(default_factory=list)
+    by_age: Deque[WorkItem] = field(default_factory=deque)
+
+    def push(self, item: WorkItem):
+        heapq.heappush(self.by_priority, (-item.priority, item.enqueued_at, item.seq, item))
+        self.by_age.append(item)
+
+    def prune(self):
+        """Drop entries already handed out through the other index"""
+        while self.by_priority and self.by_priority[0][3].started_at is not None:
+            heapq.heappop(self.by_priority)
+        while self.by_age and self.by_age[0].started_at is not None:
+            self.by_age.popleft()
+
+    def __bool__(self):
+        return bool(self.by_age)
+
+
+class EmailScheduler:
+    """In-process scheduler for the AI processing queue.
+
+    Selection order on each ``pop``:
+
+    1. Every item has an effective lane: its lane minus one per
+       ``aging_seconds`` waited (never below URGENT).
+    2. The lowest effective lane with work is served first, so urgent and
+       live mail overtake backfill, while old backfill/bulk work is
+       eventually promoted and cannot starve.
+    3. Among accounts with work at that level, the account served least
+       so far goes first, so one account's backfill cannot monopolise it.
+    4. Within the account, the higher ``priority`` wins, then the older item.
+
+    ``complete`` records per-lane latency and SLO misses in /api/metrics.
+    """
+
+    def __init__(self, aging_seconds: float = AGING_SECONDS,
+                 slo_seconds: Optional[Dict[Lane, float]] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.aging_seconds = aging_seconds
+        self.slo_seconds = dict(LANE_SLO_SECONDS if slo_seconds is None else slo_seconds)
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._queues: Dict[Tuple[int, Lane], _LaneQueue] = {}
+        self._served: Dict[int, int] = {}
+        self._pending: Dict[int, int] = {}  # account_id -> queued items
+        self._queued_ids: Set[int] = set()
+        self._seq = itertools.count()
+
+    def __len__(self):
+        return len(self._queued_ids)
+
+    def push(self, email_id: int, account_id: int, lane: Lane, priority: int = 0) -> bool:
+        """Queue an email; returns False if it is already queued"""
+        with self._lock:
+            if email_id in self._queued_ids:
+                return False
+            self._add(WorkItem(
+                email_id=email_id, account_id=account_id, lane=Lane(lane),
+                priority=priority, enqueued_at=self.clock(), seq=next(self._seq),
+            ))
+            return True
+
+    def requeue(self, item: WorkItem) -> bool:
+        """Put back a popped item that could not be processed, keeping its original wait"""
+        with self._lock:
+            if item.email_id in self._queued_ids:
+                return False
+            self._add(WorkItem(
+                email_id=item.email_id, account_id=item.account_id, lane=item.lane,
+                priority=item.priority, enqueued_at=item.enqueued_at, seq=next(self._seq),
+            ))
+            return True
+
+    def _add(self, item: WorkItem):
+        self._queues.setdefault((item.account_id, item.lane), _LaneQueue()).push(item)
+        self._queued_ids.add(item.email_id)
+        # New accounts start level with the least-served active account
+        if item.account_id not in self._served:
+            self._served[item.account_id] = min(self._served.values(), default=0)
+        self._pending[item.account_id] = self._pending.get(item.account_id, 0) + 1
+        metrics.SCHEDULER_QUEUE_DEPTH.labels(item.lane.name.lower()).inc()
+
+    def effective_lane(self, item: WorkItem, now: float) -> int:
+        if not self.aging_seconds:
+            return item.lane
+        return max(Lane.URGENT, item.lane - int((now - item.enqueued_at) // self.aging_seconds))
+
+    def pop(self) -> Optional[WorkItem]:
+        """Take the next item to process, or None when the queue is empty"""
+        with self._lock:
+            now = self.clock()
+            best = None
+            best_key = None
+            for (account_id, lane), queue in self._queues.items():
+                # The oldest item has aged the most; the priority head is
+                # the best among items of equal effective lane.
+                oldest = queue.by_age[0]
+                head = queue.by_priority[0][3]
+                candidate = oldest if self.effective_lane(oldest, now) < self.effective_lane(head, now) else head
+                key = (
+                    self.effective_lane(candidate, now),
+                    self._served[account_id],
+                    -candidate.priority,
+                    candidate.enqueued_at,
+                    candidate.seq,
+                )
+                if best_key is None or key < best_key:
+                    best, best_key = candidate, key
+
+            if best is None:
+                return None
+            best.started_at = now
+            self._queued_ids.discard(best.email_id)
+            self._served[best.account_id] += 1
+            key = (best.account_id, best.lane)
+            self._queues[key].prune()
+            if not self._queues[key]:
+                del self._queues[key]
+            self._pending[best.account_id] -= 1
+            if not self._pending[best.account_id]:
+                del self._pending[best.account_id]
+                del self._served[best.account_id]
+
+            lane = best.lane.name.lower()
+            metrics.SCHEDULER_QUEUE_DEPTH.labels(lane).dec()
+            metrics.SCHEDULER_QUEUE_WAIT.labels(lane).observe(now - best.enqueued_at)
+            return best
+
+    def complete(self, item: WorkItem) -> float:
+        """Record end-to-end latency for a finished item; returns it in seconds"""
+        latency = self.clock() - item.enqueued_at
+        lane = item.lane.name.lower()
+        metrics.SCHEDULER_LATENCY.labels(lane).observe(latency)
+        if latency > self.slo_seconds.get(item.lane, float('inf')):
+            metrics.SCHEDULER_SLO_MISSES.labels(lane).inc()
+        return latency
+
+    def clear(self) -> int:
+        """Drop every queued item and take it out of the depth gauge; returns how many"""
+        with self._lock:
+            dropped = 0
+            for (_, lane), queue in self._queues.items():
+                waiting = sum(1 for item in queue.by_age if item.started_at is None)
+                metrics.SCHEDULER_QUEUE_DEPTH.labels(lane.name.lower()).dec(waiting)
+                dropped += waiting
+            self._queues.clear()
+            self._served.clear()
+            self._pending.clear()
+            self._queued_ids.clear()
+            return dropped
+
+    def drain(self, limit: int) -> Iterable[WorkItem]:
+        for _ in range(limit):
+            item = self.pop()
+            if item is None:
+                return
+            yield item
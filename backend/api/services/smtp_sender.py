@@ -0,0 +1,367 @@
+"""
+Author: Akshay NS
+Contains: Pooled SMTP sender that delivers queued FollowUpEmail rows in batches with per-provider rate limits
+
+"""
+
+# backend/api/services/smtp_sender.py
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import timedelta
+from email.message import EmailMessage
+from email.utils import formatdate, make_msgid
+from typing import Callable, Dict, List, Optional
+import logging
+import smtplib
+import ssl
+import threading
+import time
+
+from django.db.models import Q
+from django.utils import timezone
+
+from ..models import EmailAccount, FollowUpEmail
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ProviderLimit:
+    messages_per_minute: float  # 0 disables throttling
+    # Messages sent over one connection before it is recycled; providers
+    # start rejecting or throttling long-lived sessions past this.
+    messages_per_connection: int
+
+
+# Conservative defaults well under the published per-user limits
+PROVIDER_LIMITS: Dict[str, ProviderLimit] = {
+    'smtp.gmail.com': ProviderLimit(messages_per_minute=20, messages_per_connection=100),
+    'smtp.office365.com': ProviderLimit(messages_per_minute=30, messages_per_connection=30),
+    'smtp-mail.outlook.com': ProviderLimit(messages_per_minute=30, messages_per_connection=30),
+    'smtp.mail.yahoo.com': ProviderLimit(messages_per_minute=10, messages_per_connection=20),
+}
+DEFAULT_LIMIT = ProviderLimit(messages_per_minute=10, messages_per_connection=20)
+
+# Idle connections older than this get a NOOP before reuse
+CONNECTION_CHECK_AFTER = 30.0
+
+# Sent/error results are written back at least this often during a batch
+PERSIST_EVERY = 10
+
+# A row still 'sending' this long after it was claimed belongs to a sender
+# that died mid-batch (a claimed row is sent within a few retries)
+SENDING_LEASE_SECONDS = 10 * 60
+
+
+class RateLimiter:
+    """Token bucket per SMTP host, shared by every account on that host"""
+
+    def __init__(self, limits: Dict[str, ProviderLimit], clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.limits = limits
+        self.clock = clock
+        self.sleep = sleep
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, List[float]] = {}  # host -> [tokens, last_refill]
+
+    def limit_for(self, host: str) -> ProviderLimit:
+        return self.limits.get(host.lower(), DEFAULT_LIMIT)
+
+    def acquire(self, host: str):
+        """Block until one message may be sent to ``host``"""
+        rate = self.limit_for(host).messages_per_minute / 60.0
+        if rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = self.clock()
+                # Start with a single token so a burst cannot exceed the rate
+                tokens, last = self._buckets.get(host, [1.0, now])
+                tokens = min(1.0, tokens + (now - last) * rate)
+                if tokens >= 1.0:
+                    self._buckets[host] = [tokens - 1.0, now]
+                    return
+                self._buckets[host] = [tokens, now]
+                wait = (1.0 - tokens) / rate
+            self.sleep(wait)
+
+
+@dataclass
+class _PooledConnection:
+    smtp: smtplib.SMTP
+    last_used: float
+    sent: int = 0
+
+
+class SMTPConnectionPool:
+    """Keeps one authenticated SMTP session per EmailAccount"""
+
+    def __init__(self, limiter: RateLimiter, timeout: float = 30.0):
+        self.limiter = limiter
+        self.timeout = timeout
+        self._connections: Dict[int, _PooledConnection] = {}
+
+    def get(self, account: EmailAccount) -> smtplib.SMTP:
+        pooled = self._connections.get(account.pk)
+        limit = self.limiter.limit_for(account.smtp_server)
+        if pooled is not None:
+            if pooled.sent >= limit.messages_per_connection or not self._alive(pooled):
+                self.discard(account)
+                pooled = None
+        if pooled is None:
+            pooled = _PooledConnection(self._connect(account), time.monotonic())
+            self._connections[account.pk] = pooled
+        return pooled.smtp
+
+    def mark_sent(self, account: EmailAccount):
+        pooled = self._connections.get(account.pk)
+        if pooled is not None:
+            pooled.sent += 1
+            pooled.last_used = time.monotonic()
+
+    def discard(self, account: EmailAccount):
+        pooled = self._connections.pop(account.pk, None)
+        if pooled is not None:
+            try:
+                pooled.smtp.quit()
+            except Exception:
+                pooled.smtp.close()
+
+    def close_all(self):
+        for account_id in list(self._connections):
+            pooled = self._connections.pop(account_id)
+            try:
+                pooled.smtp.quit()
+            except Exception:
+                pooled.smtp.close()
+
+    def _alive(self, pooled: _PooledConnection) -> bool:
+        if time.monotonic() - pooled.last_used < CONNECTION_CHECK_AFTER:
+            return True
+        try:
+            return pooled.smtp.noop()[0] == 250
+        except OSError:
+            return False
+
+    def _connect(self, account: EmailAccount) -> smtplib.SMTP:
+        with metrics.track_smtp(account.smtp_server, 'connect'):
+            if account.smtp_port == 465:
+                smtp = smtplib.SMTP_SSL(
+                    account.smtp_server, account.smtp_port,
+                    timeout=self.timeout, context=ssl.create_default_context()
+                )
+            else:
+                smtp = smtplib.SMTP(account.smtp_server, account.smtp_port, timeout=self.timeout)
+            smtp.ehlo()
+            if smtp.has_extn('starttls'):
+                smtp.starttls(context=ssl.create_default_context())
+                smtp.ehlo()
+            # Local relays and test servers may not offer AUTH at all
+            if smtp.has_extn('auth'):
+                smtp.login(account.email, account.password)
+        return smtp
+
+
+@dataclass
+class SendReport:
+    sent: int = 0
+    failed: int = 0
+    retried: int = 0
+    errors: Dict[int, str] = field(default_factory=dict)
+
+
+def describe_error(error: Exception) -> str:
+    """Readable message for error_message, e.g. '550 5.1.1 No such user'"""
+    def reply(code, text) -> str:
+        if isinstance(text, bytes):
+            text = text.decode('utf-8', 'replace')
+        return f"{code} {' '.join(str(text).split())}".strip()
+
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return '; '.join(
+            f"{recipient}: {reply(code, text)}" for recipient, (code, text) in error.recipients.items()
+        )
+    if isinstance(error, smtplib.SMTPResponseException):
+        return reply(error.smtp_code, error.smtp_error)
+    return str(error) or error.__class__.__name__
+
+
+def stale_sending(now=None):
+    """Follow-ups claimed longer than SENDING_LEASE_SECONDS ago and never finished"""
+    cutoff = (now or timezone.now()) - timedelta(seconds=SENDING_LEASE_SECONDS)
+    return FollowUpEmail.objects.filter(status='sending').filter(
+        Q(claimed_at__lt=cutoff) | Q(claimed_at__isnull=True)
+    )
+
+
+def is_transient(error: Exception) -> bool:
+    """4xx replies and dropped connections are worth another attempt"""
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in error.recipients.values())
+    code = getattr(error, 'smtp_code', None)
+    return code is not None and 400 <= code < 500
+
+
+class FollowUpSender:
+    """Sends queued follow-ups, grouped per account over a pooled connection.
+
+    Each follow-up is claimed (``queued`` -> ``sending`` with a conditional
+    update) immediately before it is sent, so several sender processes
+    never deliver the same row. Results are written back with
+    ``bulk_update`` every ``PERSIST_EVERY`` messages and when a batch ends,
+    including by an exception. A row still ``sending`` after a crash is
+    put back in the queue once its claim is SENDING_LEASE_SECONDS old, so
+    delivery is at-least-once: a message sent just before the crash may
+    go out twice. Connections stay open across calls to ``send_queued``;
+    call ``close`` when done.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, ProviderLimit]] = None,
+                 max_retries: int = 3, backoff: float = 2.0,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.limiter = RateLimiter(PROVIDER_LIMITS if limits is None else limits, sleep=sleep)
+        self.pool = SMTPConnectionPool(self.limiter)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.sleep = sleep
+
+    def queued(self, limit: int):
+        return FollowUpEmail.objects.filter(status='queued').select_related(
+            'original_email__account'
+        ).order_by('-original_email__priority', 'created_at')[:limit]
+
+    def send_queued(self, limit: int = 100) -> SendReport:
+        """Send up to ``limit`` queued follow-ups"""
+        self.recover_stale()
+        report = SendReport()
+        by_account: Dict[int, List[FollowUpEmail]] = defaultdict(list)
+        for followup in self.queued(limit):
+            by_account[followup.original_email.account_id].append(followup)
+
+        for followups in by_account.values():
+            self._send_batch(followups, report)
+        return report
+
+    @staticmethod
+    def recover_stale() -> int:
+        """Requeue follow-ups left 'sending' by a sender that crashed or was killed"""
+        recovered = stale_sending().update(status='queued', claimed_at=None)
+        if recovered:
+            logger.warning(f"Requeued {recovered} follow-ups left sending past their lease")
+        return recovered
+
+    def run_forever(self, interval: float = 10.0, limit: int = 100):
+        """Poll the queue, keeping SMTP sessions open between batches"""
+        try:
+            while True:
+                report = self.send_queued(limit=limit)
+                if not report.sent and not report.failed:
+                    self.sleep(interval)
+        finally:
+            self.close()
+
+    def close(self):
+        self.pool.close_all()
+
+    def _send_batch(self, followups: List[FollowUpEmail], report: SendReport):
+        account = followups[0].original_email.account
+        done: List[FollowUpEmail] = []
+        try:
+            for followup in followups:
+                if not self._claim(followup):
+                    continue
+                try:
+                    error = self._send_with_retry(account, followup, report)
+                except Exception as e:
+                    logger.exception(f"Unexpected error sending follow-up {followup.pk}")
+                    error = describe_error(e)
+                if error is None:
+                    followup.status = 'sent'
+                    followup.sent_at = timezone.now()
+                    followup.error_message = None
+                    report.sent += 1
+                else:
+                    followup.status = 'error'
+                    followup.error_message = error
+                    report.failed += 1
+                    report.errors[followup.pk] = error
+                done.append(followup)
+                if len(done) >= PERSIST_EVERY:
+                    self._persist(done)
+                    done = []
+        finally:
+            self._persist(done)
+
+    @staticmethod
+    def _claim(followup: FollowUpEmail) -> bool:
+        """Move a row from queued to sending; False if another sender got it first"""
+        now = timezone.now()
+        claimed = FollowUpEmail.objects.filter(pk=followup.pk, status='queued').update(
+            status='sending', claimed_at=now
+        )
+        if claimed:
+            followup.status = 'sending'
+            followup.claimed_at = now
+        return bool(claimed)
+
+    @staticmethod
+    def _persist(followups: List[FollowUpEmail]):
+        if followups:
+            FollowUpEmail.objects.bulk_update(followups, ['status', 'sent_at', 'error_message'])
+
+    def _send_with_retry(self, account: EmailAccount, followup: FollowUpEmail,
+                         report: SendReport) -> Optional[str]:
+        """Return None on success, or the final error message"""
+        try:
+            message = build_reply(account, followup)
+        except Exception as e:
+            logger.warning(f"Could not build follow-up {followup.pk}: {str(e)}")
+            return str(e)
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire(account.smtp_server)
+            try:
+                smtp = self.pool.get(account)
+                with metrics.track_smtp(account.smtp_server, 'send'):
+                    smtp.send_message(message)
+                self.pool.mark_sent(account)
+                return None
+            except OSError as e:
+                # SMTPException subclasses OSError; anything else is a
+                # socket-level failure, which is always worth a retry.
+                smtp_error = isinstance(e, smtplib.SMTPException)
+                if (not smtp_error or isinstance(e, smtplib.SMTPServerDisconnected)
+                        or getattr(e, 'smtp_code', None) == 421):
+                    self.pool.discard(account)
+                if smtp_error and not is_transient(e):
+                    logger.warning(f"Permanent SMTP failure for follow-up {followup.pk}: {describe_error(e)}")
+                    return describe_error(e)
+                if attempt == self.max_retries:
+                    logger.warning(f"Giving up on follow-up {followup.pk}: {describe_error(e)}")
+                    return describe_error(e)
+                report.retried += 1
+                self.sleep(self.backoff * 2 ** attempt)
+        return None
+
+
+def build_reply(account: EmailAccount, followup: FollowUpEmail) -> EmailMessage:
+    """Build the outgoing reply, threaded onto the original message"""
+    original = followup.original_email
+    # Collapse folding whitespace left over from the original header
+    subject = ' '.join((original.subject or '').split())
+    if not subject.lower().startswith('re:'):
+        subject = f"Re: {subject}"
+
+    message = EmailMessage()
+    message['From'] = account.email
+    message['To'] = original.from_address
+    message['Subject'] = subject
+    message['Date'] = formatdate(localtime=True)
+    message['Message-ID'] = make_msgid(domain=account.email.rpartition('@')[2] or None)
+    if original.message_id:
+        message['In-Reply-To'] = original.message_id
+        message['References'] = original.message_id
+    message.set_content(followup.content)
+    return message
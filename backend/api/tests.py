@@ -1,3 +1,876 @@
-from django.test import TestCase
+"""
+Author: Akshay NS
+Contains: Tests for the API services, tools and views
 
-# Create your tests here.
+"""
+
+# backend/api/tests.py
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from datetime import datetime, timedelta, timezone
+from email import policy as email_policy
+from email.message import EmailMessage as PyEmailMessage
+from typing import List, Optional
+from unittest import mock
+import asyncio
+import smtplib
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.models import Count
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone as dj_timezone
+from prometheus_client.parser import text_string_to_metric_families
+from rest_framework.test import APIClient, APITestCase
+
+from benchmarks.fake_imap import FakeIMAPServer
+from benchmarks.fake_smtp import FakeSMTPServer
+from benchmarks.mailbox import MailboxSpec, generate_mailbox
+from .middleware import RequestTimingMiddleware
+from .models import EmailAccount, FollowUpEmail, InferenceActivity, ProcessedEmail
+from .services import metrics
+from .services.email_pipeline import persist_emails
+from .services.ollama_service import FOREGROUND_LEASE_SECONDS, OllamaService
+from .services.reply_drafter import ReplyDrafter
+from .services.scheduler import EmailScheduler, Lane
+from .services.smtp_sender import (
+    SENDING_LEASE_SECONDS, FollowUpSender, ProviderLimit, RateLimiter, describe_error
+)
+from .tools.account_fetcher import AccountFetcher
+from .tools.email_fetcher import EmailFetchInputs, EmailFetchTool, EmailMessage
+from .tools.header_parser import parse_date, split_address
+from .tools.html_text import html_to_text
+from .tools.search_filters import compile_gmail_raw, compile_imap_search, compile_search, split_literals
+from .tools.tool_registry import ToolInputError, ToolRegistry
+from .tools.tool_runtime import ToolRuntime
+
+class HeaderParserTests(SimpleTestCase):
+    def test_parse_date_normalises_to_utc(self):
+        cases = {
+            'Mon, 10 Feb 2025 09:30:00 +0100': datetime(2025, 2, 10, 8, 30, tzinfo=timezone.utc),
+            '10 Feb 2025 09:30 -0500': datetime(2025, 2, 10, 14, 30, tzinfo=timezone.utc),
+            'Mon, 10 Feb 2025 09:30:00 GMT': datetime(2025, 2, 10, 9, 30, tzinfo=timezone.utc),
+            'Mon, 10 Feb 2025 09:30:00 +0000 (UTC)': datetime(2025, 2, 10, 9, 30, tzinfo=timezone.utc),
+            'Mon,  3 Mar 2025 9:05:07 PST': datetime(2025, 3, 3, 17, 5, 7, tzinfo=timezone.utc),
+            'Mon, 10 Feb 25 09:30:00 +0000': datetime(2025, 2, 10, 9, 30, tzinfo=timezone.utc),
+        }
+        for value, expected in cases.items():
+            with self.subTest(value=value):
+                self.assertEqual(parse_date(value), expected)
+
+    def test_parse_date_rejects_unparseable_values(self):
+        for value in ('garbage', '', None, 'Mon, 31 Feb 2025 09:30:00 +0000'):
+            with self.subTest(value=value):
+                self.assertIsNone(parse_date(value))
+
+    def test_split_address(self):
+        cases = {
+            'Jane Doe <jane@x.com>': ('Jane Doe', 'jane@x.com'),
+            '"Doe, Jane" <jane@x.com>': ('Doe, Jane', 'jane@x.com'),
+            'jane@x.com': ('', 'jane@x.com'),
+            '<jane@x.com>': ('', 'jane@x.com'),
+            '=?utf-8?q?J=C3=BCrgen?= <j@x.de>': ('Jürgen', 'j@x.de'),
+            '': ('', ''),
+            'undisclosed-recipients:;': ('', ''),
+        }
+        for value, expected in cases.items():
+            with self.subTest(value=value):
+                self.assertEqual(split_address(value), expected)
+
+
+class SearchFilterTests(SimpleTestCase):
+    def setUp(self):
+        self.inputs = EmailFetchInputs(
+            from_date='01-Jan-2025',
+            to_date='01-Feb-2025',
+            from_domains=['@Greenhouse.io', 'lever.co'],
+            subject_keywords=['interview', 'next steps'],
+            exclude_from_domains=['spam.com'],
+            exclude_subject_keywords=['newsletter'],
+            unseen_only=True,
+            min_size=100,
+            max_size=1000,
+        )
+
+    def test_no_filters(self):
+        self.assertEqual(compile_imap_search(EmailFetchInputs()), 'ALL')
+        self.assertEqual(compile_search(EmailFetchInputs(), ['IMAP4rev1', 'X-GM-EXT-1']), 'ALL')
+
+    def test_imap_search(self):
+        self.assertEqual(
+            compile_imap_search(self.inputs),
+            'SINCE "01-Jan-2025" BEFORE "01-Feb-2025" UNSEEN '
+            'OR FROM "@greenhouse.io" OR FROM "@lever.co" OR SUBJECT "interview" SUBJECT "next steps" '
+            'NOT FROM "@spam.com" NOT SUBJECT "newsletter" LARGER 99 SMALLER 1001',
+        )
+
+    def test_imap_search_quotes_values(self):
+        inputs = EmailFetchInputs(subject_keywords=['say "hi"'])
+        self.assertEqual(compile_imap_search(inputs), 'SUBJECT "say \\"hi\\""')
+
+    def test_gmail_raw(self):
+        self.assertEqual(
+            compile_gmail_raw(self.inputs),
+            'after:2025/01/01 before:2025/02/01 is:unread '
+            '{from:greenhouse.io from:lever.co subject:interview subject:"next steps"} '
+            '-from:spam.com -subject:newsletter larger:99 smaller:1001',
+        )
+
+    def test_compile_search_uses_gmail_raw_when_supported(self):
+        inputs = EmailFetchInputs(from_domains=['lever.co'])
+        self.assertEqual(compile_search(inputs, ['IMAP4rev1']), 'FROM "@lever.co"')
+        self.assertEqual(compile_search(inputs, ['IMAP4rev1', 'X-GM-EXT-1']), 'X-GM-RAW "from:lever.co"')
+
+    def test_zero_sizes(self):
+        self.assertEqual(compile_imap_search(EmailFetchInputs(max_size=0)), 'SMALLER 1')
+        self.assertEqual(compile_gmail_raw(EmailFetchInputs(max_size=0)), 'smaller:1')
+        # Every message is at least 0 bytes, so min_size=0 adds nothing
+        self.assertEqual(compile_imap_search(EmailFetchInputs(min_size=0)), 'ALL')
+
+    def test_split_literals(self):
+        criteria = compile_imap_search(EmailFetchInputs(
+            subject_keywords=['Café', 'offer'], exclude_subject_keywords=['say "naïve"'],
+        ))
+        self.assertEqual(
+            split_literals(criteria),
+            (['OR SUBJECT ', ' SUBJECT "offer" NOT SUBJECT ', ''],
+             ['Café'.encode(), 'say "naïve"'.encode()]),
+        )
+        self.assertEqual(split_literals('SUBJECT "offer"'), (['SUBJECT "offer"'], []))
+
+
+class NonAsciiSearchTests(SimpleTestCase):
+    @staticmethod
+    def message(uid: int, subject: str) -> bytes:
+        message = PyEmailMessage(policy=email_policy.SMTP)
+        message['From'] = 'Recruiter <jobs@example.com>'
+        message['Subject'] = subject
+        message['Message-ID'] = f"<{uid}@example.com>"
+        message['Date'] = 'Mon, 10 Feb 2025 09:30:00 +0000'
+        message.set_content('Hello')
+        return message.as_bytes()
+
+    def subjects(self, gmail: bool, **inputs) -> List[str]:
+        mailbox = [
+            self.message(1, 'Entretien au Café'),
+            self.message(2, 'Naïve question about the offer'),
+            self.message(3, 'Café über alles'),
+            self.message(4, 'Weekly newsletter'),
+        ]
+        with FakeIMAPServer(mailbox, gmail=gmail) as imap:
+            tool = EmailFetchTool(imap.config())
+            try:
+                messages = asyncio.run(tool.fetch_emails(EmailFetchInputs(**inputs)))
+            finally:
+                asyncio.run(tool.disconnect())
+        return [message.subject for message in messages]
+
+    def test_non_ascii_terms_are_sent_as_literals(self):
+        for gmail in (False, True):
+            with self.subTest(gmail=gmail):
+                self.assertEqual(
+                    self.subjects(gmail, subject_keywords=['café', 'naïve'], exclude_subject_keywords=['über']),
+                    ['Entretien au Café', 'Naïve question about the offer'],
+                )
+
+    def test_ascii_terms_are_sent_quoted(self):
+        self.assertEqual(self.subjects(False, subject_keywords=['newsletter']), ['Weekly newsletter'])
+
+
+class ToolRegistryTests(SimpleTestCase):
+    def setUp(self):
+        info = ToolRegistry().get_tool('email_fetcher')
+        self.config_schema = info['config_schema']
+        self.input_schema = info['input_schema']
+
+    def test_map_type_unwraps_optional(self):
+        self.assertEqual(ToolRegistry._map_type(Optional[int]), 'integer')
+        self.assertEqual(ToolRegistry._map_type(Optional[str]), 'string')
+        self.assertEqual(ToolRegistry._map_type(List[str]), 'array')
+        self.assertEqual(ToolRegistry._map_type(Optional[List[str]]), 'array')
+
+    def test_optional_fields_are_nullable(self):
+        self.assertEqual(
+            self.input_schema['properties']['min_size'],
+            {'type': 'integer', 'nullable': True, 'default': None},
+        )
+        self.assertNotIn('nullable', self.input_schema['properties']['max_emails'])
+        self.assertEqual(
+            ToolRegistry._field_schema(Optional[List[str]]),
+            {'type': 'array', 'nullable': True, 'items': {'type': 'string'}},
+        )
+
+    def test_validate_accepts_null_only_for_optional_fields(self):
+        values = ToolRegistry.validate(self.input_schema, {'min_size': None, 'from_date': None})
+        self.assertIsNone(values['min_size'])
+        with self.assertRaises(ToolInputError) as raised:
+            ToolRegistry.validate(self.input_schema, {'max_emails': None})
+        self.assertEqual(raised.exception.errors, {'max_emails': 'may not be null'})
+
+    def test_validate_fills_defaults_with_fresh_lists(self):
+        first = ToolRegistry.validate(self.input_schema, {})
+        self.assertEqual(first['max_emails'], 10)
+        self.assertEqual(first['from_domains'], [])
+        first['from_domains'].append('example.com')
+        self.assertEqual(ToolRegistry.validate(self.input_schema, {})['from_domains'], [])
+
+    def test_validate_reports_every_bad_field(self):
+        with self.assertRaises(ToolInputError) as raised:
+            ToolRegistry.validate(self.input_schema, {
+                'max_emails': '10',
+                'unseen_only': 1,
+                'from_domains': ['a.com', 3],
+                'folder': 'INBOX',
+            })
+        self.assertEqual(raised.exception.errors, {
+            'max_emails': 'expected integer',
+            'unseen_only': 'expected boolean',
+            'from_domains': 'expected array of string',
+            'folder': 'unknown field',
+        })
+
+    def test_validate_requires_config_fields(self):
+        with self.assertRaises(ToolInputError) as raised:
+            ToolRegistry.validate(self.config_schema, {'imap_server': 'imap.example.com'})
+        self.assertEqual(raised.exception.errors, {
+            'username': 'this field is required',
+            'password': 'this field is required',
+        })
+
+    def test_validate_rejects_non_objects(self):
+        with self.assertRaises(ToolInputError) as raised:
+            ToolRegistry.validate(self.input_schema, ['max_emails'])
+        self.assertEqual(raised.exception.errors, {'__all__': 'expected an object'})
+
+
+class ToolInvokeViewTests(APITestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.imap = FakeIMAPServer(generate_mailbox(MailboxSpec(size=20, seed=7))).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.imap.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('tester', password='tester')
+        self.client.force_authenticate(self.user)
+        # A fresh runtime per test so pooled sessions and jobs do not leak between tests
+        self.runtime = ToolRuntime()
+        patcher = mock.patch.object(ToolRuntime, '_instance', self.runtime)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.runtime.close)
+
+    def config(self):
+        config = self.imap.config()
+        return {
+            'imap_server': config.imap_server,
+            'username': config.username,
+            'password': config.password,
+            'port': config.port,
+            'ssl': False,
+        }
+
+    def invoke(self, payload, name='email_fetcher'):
+        return self.client.post(reverse('tool-invoke', args=[name]), payload, format='json')
+
+    def test_requires_authentication(self):
+        self.client.force_authenticate(None)
+        response = self.invoke({'config': self.config()})
+        self.assertIn(response.status_code, (401, 403))
+
+    def test_unknown_tool_is_404(self):
+        response = self.invoke({'config': self.config()}, name='no_such_tool')
+        self.assertEqual(response.status_code, 404)
+
+    def test_schema_errors_are_400(self):
+        response = self.invoke({'config': {'imap_server': 'localhost'}, 'inputs': {'max_emails': 'all'}})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['errors'], {
+            'config.username': 'this field is required',
+            'config.password': 'this field is required',
+            'inputs.max_emails': 'expected integer',
+        })
+
+    def test_field_errors_are_400_before_connecting(self):
+        logins = self.imap.commands.get('LOGIN', 0)
+        response = self.invoke({
+            'config': self.config(),
+            'inputs': {'from_date': '2025-01-10', 'max_emails': 0},
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.data['errors']), {'inputs.from_date', 'inputs.max_emails'})
+        self.assertEqual(self.imap.commands.get('LOGIN', 0), logins)
+
+    def test_success_is_200(self):
+        response = self.invoke({'config': self.config(), 'inputs': {'max_emails': 5}})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'success')
+        self.assertEqual(len(response.data['result']), 5)
+        self.assertIn('subject', response.data['result'][0])
+
+    def test_async_is_202_with_pollable_job(self):
+        response = self.invoke({'config': self.config(), 'inputs': {'max_emails': 3}, 'async': True})
+        self.assertEqual(response.status_code, 202)
+        job_url = reverse('tool-job', args=[response.data['job_id']])
+        self.assertTrue(response.data['status_url'].endswith(job_url))
+
+        job = self.runtime.get_job(response.data['job_id'])
+        for _ in range(200):
+            if job.done:
+                break
+            time.sleep(0.05)
+        polled = self.client.get(job_url)
+        self.assertEqual(polled.status_code, 200)
+        self.assertEqual(polled.data['status'], 'succeeded')
+        self.assertEqual(len(polled.data['result']), 3)
+
+    def test_concurrent_calls_share_pooled_sessions(self):
+        logins = self.imap.commands.get('LOGIN', 0)
+        config = self.config()
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(
+                lambda _: self.runtime.call('email_fetcher', config, {'max_emails': 2}), range(8)
+            ))
+        self.assertEqual([len(result) for result in results], [2] * 8)
+        # At most max_concurrency sessions are opened, then reused
+        self.assertLessEqual(self.imap.commands.get('LOGIN', 0) - logins, 4)
+
+    def test_jobs_are_private_to_their_owner(self):
+        response = self.invoke({'config': self.config(), 'inputs': {'max_emails': 1}, 'async': True})
+        other = get_user_model().objects.create_user('other', password='other')
+        self.client.force_authenticate(other)
+        polled = self.client.get(reverse('tool-job', args=[response.data['job_id']]))
+        self.assertEqual(polled.status_code, 404)
+
+    def test_timeout_is_504(self):
+        with mock.patch.object(ToolRuntime, 'call', side_effect=TimeoutError):
+            response = self.invoke({'config': self.config()})
+        self.assertEqual(response.status_code, 504)
+
+    def test_tool_failure_is_502(self):
+        config = dict(self.config(), password='wrong')
+        response = self.invoke({'config': config})
+        self.assertEqual(response.status_code, 502)
+        self.assertEqual(response.data['status'], 'error')
+
+
+class AccountFetcherTests(SimpleTestCase):
+    def setUp(self):
+        self.inbox = generate_mailbox(MailboxSpec(size=6, seed=1))
+        self.applications = generate_mailbox(MailboxSpec(size=4, seed=2))
+
+    def fetch(self, imap, fetcher=None):
+        fetcher = fetcher or AccountFetcher(imap.config(), max_connections=3)
+        return fetcher, asyncio.run(fetcher.fetch(EmailFetchInputs(max_emails=50)))
+
+    def test_refused_extra_connections_share_the_open_ones(self):
+        mailboxes = {'INBOX': self.inbox, 'Applications': self.applications, 'Archive': self.applications[:2]}
+        with FakeIMAPServer(mailboxes, max_connections=2) as imap:
+            fetcher, messages = self.fetch(imap)
+        self.assertEqual(fetcher.failed, {})
+        # Archive only holds copies of Applications mail
+        self.assertEqual(len(messages), 10)
+        self.assertEqual(fetcher.duplicates, 2)
+
+    def test_connection_dropped_mid_mailbox_is_reported(self):
+        mailboxes = {'INBOX': self.inbox, 'Applications': self.applications}
+        with FakeIMAPServer(mailboxes, drop_mailboxes=['Applications']) as imap:
+            fetcher, messages = self.fetch(imap)
+        self.assertEqual(list(fetcher.failed), ['Applications'])
+        self.assertEqual(len(messages), 6)
+
+    def test_login_failure_reports_every_mailbox(self):
+        mailboxes = {'INBOX': self.inbox, 'Applications': self.applications}
+        with FakeIMAPServer(mailboxes) as imap:
+            config = imap.config()
+            fetcher = AccountFetcher(replace(config, password='wrong'))
+            messages = asyncio.run(fetcher.fetch(EmailFetchInputs(), mailboxes=list(mailboxes)))
+        self.assertEqual(messages, [])
+        self.assertEqual(set(fetcher.failed), {'INBOX', 'Applications'})
+
+    def test_counts_are_per_fetch(self):
+        mailboxes = {'INBOX': self.inbox, 'Archive': self.inbox[:3]}
+        with FakeIMAPServer(mailboxes) as imap:
+            fetcher, _ = self.fetch(imap)
+            _, _ = self.fetch(imap, fetcher)
+        self.assertEqual(fetcher.duplicates, 3)
+
+
+class FakeClock:
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class EmailSchedulerTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.scheduler = EmailScheduler(aging_seconds=100, clock=self.clock)
+        self.addCleanup(self.scheduler.clear)
+
+    def pop_ids(self) -> List[int]:
+        return [item.email_id for item in self.scheduler.drain(len(self.scheduler))]
+
+    def depth(self, lane: Lane) -> float:
+        return metrics.REGISTRY.get_sample_value(
+            'emailai_scheduler_queue_depth', {'lane': lane.name.lower()}
+        ) or 0.0
+
+    def test_urgent_beats_bulk(self):
+        self.scheduler.push(1, account_id=1, lane=Lane.BULK, priority=9)
+        self.scheduler.push(2, account_id=1, lane=Lane.LIVE, priority=5)
+        self.scheduler.push(3, account_id=1, lane=Lane.URGENT, priority=0)
+        self.assertEqual(self.pop_ids(), [3, 2, 1])
+
+    def test_higher_priority_then_older_within_a_lane(self):
+        self.scheduler.push(1, account_id=1, lane=Lane.LIVE, priority=3)
+        self.clock.now = 1
+        self.scheduler.push(2, account_id=1, lane=Lane.LIVE, priority=5)
+        self.scheduler.push(3, account_id=1, lane=Lane.LIVE, priority=3)
+        self.assertEqual(self.pop_ids(), [2, 1, 3])
+
+    def test_bulk_is_promoted_after_its_aging_window(self):
+        self.scheduler.push(1, account_id=1, lane=Lane.BULK)
+        self.clock.now = 199
+        self.scheduler.push(2, account_id=1, lane=Lane.LIVE)
+        # One window short of LIVE rank: still waits
+        self.assertEqual(self.scheduler.pop().email_id, 2)
+
+        self.scheduler.push(2, account_id=1, lane=Lane.LIVE)
+        self.clock.now = 200
+        # Two windows promote BULK to LIVE, where the older item wins
+        self.assertEqual(self.pop_ids(), [1, 2])
+
+    def test_aged_bulk_never_ranks_above_urgent(self):
+        self.scheduler.push(1, account_id=1, lane=Lane.BULK)
+        self.clock.now = 10_000
+        item = self.scheduler.pop()
+        self.assertEqual(self.scheduler.effective_lane(item, self.clock.now), Lane.URGENT)
+
+    def test_accounts_take_turns_within_a_lane(self):
+        for email_id in (1, 2, 3, 4):
+            self.scheduler.push(email_id, account_id=1, lane=Lane.BACKFILL)
+        for email_id in (5, 6):
+            self.scheduler.push(email_id, account_id=2, lane=Lane.BACKFILL)
+        self.assertEqual(self.pop_ids(), [1, 5, 2, 6, 3, 4])
+
+    def test_new_account_does_not_jump_ahead_of_served_ones(self):
+        for email_id in (1, 2, 3):
+            self.scheduler.push(email_id, account_id=1, lane=Lane.LIVE)
+        self.scheduler.pop()
+        self.scheduler.pop()
+        self.scheduler.push(4, account_id=2, lane=Lane.LIVE)
+        self.scheduler.push(5, account_id=2, lane=Lane.LIVE)
+        # Account 2 starts level with account 1, not at zero
+        self.assertEqual(self.pop_ids(), [3, 4, 5])
+
+    def test_requeue_keeps_the_original_enqueue_time(self):
+        self.scheduler.push(1, account_id=1, lane=Lane.BULK)
+        self.clock.now = 50
+        item = self.scheduler.pop()
+        self.assertTrue(self.scheduler.requeue(item))
+        self.assertFalse(self.scheduler.requeue(item))
+        self.clock.now = 120
+        self.scheduler.push(2, account_id=1, lane=Lane.BACKFILL)
+
+        # Aged one window counted from t=0 (not from the requeue at t=50),
+        # the item is level with BACKFILL and older
+        again = self.scheduler.pop()
+        self.assertEqual((again.email_id, again.enqueued_at), (1, 0))
+        self.assertEqual(self.scheduler.complete(again), 120)
+
+    def test_push_ignores_queued_duplicates(self):
+        self.assertTrue(self.scheduler.push(1, account_id=1, lane=Lane.LIVE))
+        self.assertFalse(self.scheduler.push(1, account_id=1, lane=Lane.URGENT))
+        self.assertEqual(len(self.scheduler), 1)
+
+    def test_clear_empties_the_queue_and_the_depth_gauge(self):
+        before = self.depth(Lane.LIVE), self.depth(Lane.BULK)
+        self.scheduler.push(1, account_id=1, lane=Lane.LIVE)
+        self.scheduler.push(2, account_id=1, lane=Lane.LIVE)
+        self.scheduler.push(3, account_id=2, lane=Lane.BULK)
+        self.scheduler.pop()
+        self.assertEqual(self.scheduler.clear(), 2)
+        self.assertEqual(len(self.scheduler), 0)
+        self.assertIsNone(self.scheduler.pop())
+        self.assertEqual((self.depth(Lane.LIVE), self.depth(Lane.BULK)), before)
+
+
+class FollowUpSenderTests(TestCase):
+    def setUp(self):
+        self.smtp = FakeSMTPServer().start()
+        self.addCleanup(self.smtp.stop)
+        user = get_user_model().objects.create_user('candidate', password='candidate')
+        self.account = EmailAccount.objects.create(
+            user=user, email=self.smtp.username, password=self.smtp.password
+        )
+        self.smtp.configure(self.account)
+        self.email = ProcessedEmail.objects.create(
+            account=self.account, uid='1', message_id='<1@example.com>', subject='Interview',
+            from_address='recruiter@example.com', received_at=dj_timezone.now(), raw_body='Hi',
+        )
+        self.sleeps = []
+        self.sender = FollowUpSender(limits={'127.0.0.1': ProviderLimit(0, 100)},
+                                     backoff=1.0, sleep=self.sleeps.append)
+        self.addCleanup(self.sender.close)
+
+    def queue(self, count: int, status: str = 'queued') -> List[FollowUpEmail]:
+        return FollowUpEmail.objects.bulk_create([
+            FollowUpEmail(original_email=self.email, content=f"Thanks ({index})", status=status)
+            for index in range(count)
+        ])
+
+    def statuses(self):
+        return dict(FollowUpEmail.objects.values_list('status').annotate(count=Count('pk')))
+
+    def test_sends_queued_followups_over_one_session(self):
+        self.queue(3)
+        report = self.sender.send_queued()
+        self.assertEqual((report.sent, report.failed, report.retried), (3, 0, 0))
+        self.assertEqual(self.statuses(), {'sent': 3})
+        self.assertEqual((len(self.smtp.messages), self.smtp.sessions), (3, 1))
+        self.assertIn(b'In-Reply-To: <1@example.com>', self.smtp.messages[0])
+
+    def test_rows_claimed_by_another_sender_are_skipped(self):
+        followups = self.queue(3)
+        with mock.patch.object(FollowUpSender, 'queued', return_value=followups):
+            # Another sender claims one after this one read the queue
+            FollowUpEmail.objects.filter(pk=followups[1].pk).update(
+                status='sending', claimed_at=dj_timezone.now()
+            )
+            report = self.sender.send_queued()
+        self.assertEqual(report.sent, 2)
+        self.assertEqual(len(self.smtp.messages), 2)
+        self.assertEqual(FollowUpEmail.objects.get(pk=followups[1].pk).status, 'sending')
+
+    def test_4xx_is_retried(self):
+        self.smtp.fail_every = 2
+        self.queue(3)
+        report = self.sender.send_queued()
+        self.assertEqual((report.sent, report.failed, report.retried), (3, 0, 2))
+        self.assertEqual(self.sleeps, [1.0, 1.0])
+        self.assertEqual(self.statuses(), {'sent': 3})
+
+    def test_4xx_gives_up_after_max_retries(self):
+        self.smtp.fail_every = 1
+        self.queue(1)
+        report = self.sender.send_queued()
+        self.assertEqual((report.sent, report.failed, report.retried), (0, 1, 3))
+        self.assertEqual(self.sleeps, [1.0, 2.0, 4.0])
+        self.assertEqual(FollowUpEmail.objects.get().error_message, '451 4.3.0 Try again later')
+
+    def test_5xx_is_an_error_without_retry(self):
+        self.smtp.fail_every = 1
+        self.smtp.fail_reply = '550 5.1.1 Mailbox unavailable'
+        self.queue(2)
+        report = self.sender.send_queued()
+        self.assertEqual((report.sent, report.failed, report.retried), (0, 2, 0))
+        self.assertEqual(self.statuses(), {'error': 2})
+        self.assertEqual(
+            set(FollowUpEmail.objects.values_list('error_message', flat=True)),
+            {'550 5.1.1 Mailbox unavailable'},
+        )
+
+    def test_sends_are_rate_limited_per_host(self):
+        clock = FakeClock()
+
+        def sleep(seconds):
+            self.sleeps.append(seconds)
+            clock.now += seconds
+
+        self.sender.limiter = RateLimiter({'127.0.0.1': ProviderLimit(30, 100)}, clock=clock, sleep=sleep)
+        self.queue(3)
+        self.assertEqual(self.sender.send_queued().sent, 3)
+        # 30/minute: the first goes at once, then one every two seconds
+        self.assertEqual(self.sleeps, [2.0, 2.0])
+
+    def test_results_are_persisted_periodically(self):
+        self.queue(25)
+        with mock.patch.object(FollowUpSender, '_persist', wraps=FollowUpSender._persist) as persist:
+            self.sender.send_queued()
+        self.assertEqual([len(call.args[0]) for call in persist.call_args_list], [10, 10, 5])
+
+    def test_progress_survives_a_crash(self):
+        self.queue(15)
+        send = FollowUpSender._send_with_retry
+        calls = []
+
+        def crash_on_13th(*args):
+            calls.append(1)
+            if len(calls) == 13:
+                raise KeyboardInterrupt
+            return send(self.sender, *args)
+
+        with mock.patch.object(self.sender, '_send_with_retry', side_effect=crash_on_13th):
+            with self.assertRaises(KeyboardInterrupt):
+                self.sender.send_queued()
+        self.assertEqual(self.statuses(), {'sent': 12, 'sending': 1, 'queued': 2})
+
+    def test_stale_sending_rows_are_requeued(self):
+        stale, fresh = self.queue(2, status='sending')
+        FollowUpEmail.objects.filter(pk=stale.pk).update(
+            claimed_at=dj_timezone.now() - timedelta(seconds=SENDING_LEASE_SECONDS + 1)
+        )
+        FollowUpEmail.objects.filter(pk=fresh.pk).update(claimed_at=dj_timezone.now())
+        report = self.sender.send_queued()
+        self.assertEqual(report.sent, 1)
+        self.assertEqual(FollowUpEmail.objects.get(pk=stale.pk).status, 'sent')
+        self.assertEqual(FollowUpEmail.objects.get(pk=fresh.pk).status, 'sending')
+
+    def test_send_view_requeues_only_stale_sending_rows(self):
+        stale, fresh = self.queue(2, status='sending')
+        FollowUpEmail.objects.filter(pk=stale.pk).update(
+            claimed_at=dj_timezone.now() - timedelta(seconds=SENDING_LEASE_SECONDS + 1)
+        )
+        FollowUpEmail.objects.filter(pk=fresh.pk).update(claimed_at=dj_timezone.now())
+        client = APIClient()
+        client.force_authenticate(self.account.user)
+        response = client.post(reverse('followup-send', args=[stale.pk]))
+        self.assertEqual((response.status_code, response.data['status']), (202, 'queued'))
+        response = client.post(reverse('followup-send', args=[fresh.pk]))
+        self.assertEqual(response.status_code, 409)
+
+    def test_describe_error(self):
+        self.assertEqual(
+            describe_error(smtplib.SMTPDataError(550, b'5.7.1 Message\r\n rejected')),
+            '550 5.7.1 Message rejected',
+        )
+        refused = smtplib.SMTPRecipientsRefused({'a@example.com': (550, b'5.1.1 No such user')})
+        self.assertEqual(describe_error(refused), 'a@example.com: 550 5.1.1 No such user')
+        self.assertEqual(describe_error(smtplib.SMTPServerDisconnected()), 'SMTPServerDisconnected')
+
+
+class HtmlToTextTests(SimpleTestCase):
+    def test_converts_common_markup(self):
+        markup = (
+            '<html><head><title>x</title><style>p {}</style></head><body>'
+            '<p>Hi&nbsp;Jane,</p><!-- tracking --><script>alert(1)</script>'
+            '<ul><li>Role: <b>Engineer</b></li><li>Date: 10 Feb</li></ul>'
+            '<p><a href="https://jobs.example.com/apply">Apply</a> or '
+            '<a href="mailto:hr@example.com">email us</a></p></body></html>'
+        )
+        self.assertEqual(
+            html_to_text(markup),
+            'Hi Jane,\n\n- Role: Engineer\n- Date: 10 Feb\n\n'
+            'Apply (https://jobs.example.com/apply) or email us',
+        )
+
+    def test_bare_angle_brackets_in_text_are_kept(self):
+        self.assertEqual(html_to_text('<p>a < b and c > d</p>'), 'a < b and c > d')
+        self.assertEqual(html_to_text('<p>salary <100k or >120k</p>'), 'salary <100k or >120k')
+        self.assertEqual(html_to_text('<p>1 &lt; 2</p>'), '1 < 2')
+
+    def test_unclosed_markup_takes_linear_time(self):
+        # Each of these took seconds (quadratic) at this size before the
+        # patterns were bounded by the next "<"
+        for markup in ('<' * 100_000, '<a' * 50_000, '<p ' * 40_000,
+                       '<a href="x">' * 10_000, '<script>' * 15_000, '<!--' * 25_000):
+            with self.subTest(markup=markup[:12]):
+                start = time.perf_counter()
+                html_to_text(markup)
+                self.assertLess(time.perf_counter() - start, 1.0)
+
+
+class FakeOllama:
+    """Stands in for OllamaService; ``on_generate`` runs while the 'model' is busy"""
+
+    def __init__(self, host: str = 'http://ollama.test:11434', reply: str = 'Thanks, Tuesday works.'):
+        self.host = host
+        self.reply = reply
+        self.prompts = []
+        self.on_generate = None
+
+    def generate(self, prompt: str, **kwargs) -> str:
+        self.prompts.append(prompt)
+        if self.on_generate:
+            self.on_generate()
+        return self.reply
+
+
+class ReplyDrafterTests(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user('candidate', password='candidate')
+        self.account = EmailAccount.objects.create(user=user, email='me@example.com', password='x')
+        self.ollama = FakeOllama()
+        self.drafter = ReplyDrafter(ollama=self.ollama, account=self.account)
+        self.now = dj_timezone.now()
+
+    def email(self, uid: str, thread: str = 'thread-1', minutes_ago: int = 60, **fields) -> ProcessedEmail:
+        values = {
+            'subject': 'Interview', 'from_address': 'recruiter@example.com', 'raw_body': 'Are you free?',
+            'status': ProcessedEmail.Status.PROCESSED, 'needs_reply': True, 'priority': 5,
+        }
+        values.update(fields)
+        return ProcessedEmail.objects.create(
+            account=self.account, uid=uid, message_id=f"<{uid}@example.com>", thread_key=thread,
+            received_at=self.now - timedelta(minutes=minutes_ago), **values
+        )
+
+    def test_candidates_are_the_latest_unanswered_message_per_thread(self):
+        self.email('old', minutes_ago=90)
+        latest = self.email('latest', minutes_ago=30)
+        urgent = self.email('urgent', thread='thread-2', priority=9)
+        self.email('no-reply', thread='thread-3', needs_reply=False)
+        self.email('pending', thread='thread-4', status=ProcessedEmail.Status.PENDING)
+        for status in ('queued', 'sent', 'error'):
+            answered = self.email(f"answered-{status}", thread=f"answered-{status}")
+            FollowUpEmail.objects.create(original_email=answered, content='Done', status=status)
+        self.assertEqual(list(self.drafter.candidates()), [urgent, latest])
+
+    def test_draft_is_stored_on_the_email(self):
+        email = self.email('1')
+        followup = self.drafter.draft(email)
+        self.assertEqual((followup.status, followup.content), ('draft', 'Thanks, Tuesday works.'))
+        email.refresh_from_db()
+        self.assertEqual(email.suggested_reply, 'Thanks, Tuesday works.')
+        self.assertNotIn(email, self.drafter.candidates())
+
+    def test_draft_is_dropped_when_the_thread_moves_on_while_generating(self):
+        email = self.email('1')
+        self.ollama.on_generate = lambda: self.email('2', minutes_ago=0)
+        self.assertIsNone(self.drafter.draft(email))
+        self.assertFalse(FollowUpEmail.objects.exists())
+
+    def test_new_mail_in_a_thread_invalidates_its_draft(self):
+        email = self.email('1', thread='<root@example.com>')
+        self.drafter.draft(email)
+        other = self.email('2', thread='<other@example.com>')
+        self.drafter.draft(other)
+
+        reply = EmailMessage(
+            subject='Re: Interview', date=self.now, sender='Recruiter <recruiter@example.com>',
+            text='Or Wednesday?', uid='3',
+            headers={'Message-ID': '<3@example.com>', 'In-Reply-To': '<root@example.com>',
+                     'References': '<root@example.com>'},
+        )
+        self.assertEqual(persist_emails(self.account, [reply]), 1)
+
+        self.assertEqual(
+            list(FollowUpEmail.objects.values_list('original_email__uid', flat=True)), ['2']
+        )
+        email.refresh_from_db()
+        self.assertIsNone(email.suggested_reply)
+        # The new message is the thread's candidate once it is classified
+        ProcessedEmail.objects.filter(uid='3').update(
+            status=ProcessedEmail.Status.PROCESSED, needs_reply=True
+        )
+        self.assertEqual([e.uid for e in self.drafter.candidates()], ['3'])
+
+    def test_foreground_work_in_another_process_blocks_drafting(self):
+        self.email('1')
+        activity = InferenceActivity.objects.create(
+            host=OllamaService._activity_key(self.ollama.host), foreground_in_flight=1,
+            updated_at=dj_timezone.now(),
+        )
+        self.assertFalse(self.drafter.inference_idle())
+        self.assertEqual(self.drafter.run_once(), [])
+        self.assertEqual(self.ollama.prompts, [])
+
+        # A count left behind by a process that died is ignored after the lease
+        activity.updated_at = dj_timezone.now() - timedelta(seconds=FOREGROUND_LEASE_SECONDS + 1)
+        activity.save()
+        self.assertTrue(self.drafter.inference_idle())
+        self.assertEqual(len(self.drafter.run_once()), 1)
+
+    def test_pending_classification_blocks_drafting(self):
+        self.email('1')
+        self.email('2', thread='thread-2', status=ProcessedEmail.Status.PENDING)
+        self.assertFalse(self.drafter.inference_idle())
+        self.assertEqual(self.drafter.run_once(), [])
+
+    def test_foreground_calls_are_shared_through_the_database(self):
+        service = OllamaService()
+        service.host = self.ollama.host
+        service._track_foreground(1)
+        try:
+            with mock.patch.object(OllamaService, '_foreground_in_flight', 0):
+                # As seen from a process with no call of its own in flight
+                self.assertTrue(OllamaService.foreground_busy(self.ollama.host))
+                self.assertFalse(OllamaService.foreground_busy('http://other-host:11434'))
+        finally:
+            service._track_foreground(-1)
+        self.assertFalse(OllamaService.foreground_busy(self.ollama.host))
+
+
+class RequestTimingMiddlewareTests(SimpleTestCase):
+    def view(self, request):
+        with metrics.track_imap('imap.test', 'search'):
+            pass
+        metrics.record_llm_response('m', 'generate', 'test', 0.25, {'eval_count': 3})
+        return HttpResponse('ok')
+
+    @override_settings(EMAILAI_TIMING_HEADER=True)
+    def test_header_reports_total_and_subsystem_time(self):
+        response = RequestTimingMiddleware(self.view)(RequestFactory().get('/'))
+        entries = dict(entry.split(';dur=') for entry in response['Server-Timing'].split(', '))
+        self.assertEqual(set(entries), {'total', 'imap', 'llm'})
+        self.assertEqual(entries['llm'], '250.0')
+
+    @override_settings(EMAILAI_TIMING_HEADER=False)
+    def test_disabled_by_default(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            RequestTimingMiddleware(self.view)
+        self.assertNotIn('Server-Timing', Client().get(reverse('metrics')))
+
+    @override_settings(EMAILAI_TIMING_HEADER=True)
+    def test_enabled_in_the_middleware_stack(self):
+        response = Client().get(reverse('metrics'))
+        self.assertRegex(response['Server-Timing'], r'^total;dur=\d+\.\d$')
+
+    def test_timings_outside_a_request_are_not_collected(self):
+        with metrics.request_timing_scope() as timings:
+            pass
+        with metrics.track_imap('imap.test', 'noop'):
+            pass
+        self.assertEqual(timings, {})
+
+
+class MetricsViewTests(SimpleTestCase):
+    def sample(self, families, name: str, **labels) -> Optional[float]:
+        for family in families:
+            for sample in family.samples:
+                if sample.name == name and all(sample.labels.get(k) == v for k, v in labels.items()):
+                    return sample.value
+        return None
+
+    def scrape(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        return list(text_string_to_metric_families(response.content.decode()))
+
+    def test_exposes_imap_smtp_and_llm_series(self):
+        before = self.scrape()
+        with metrics.track_imap('imap.metrics.test', 'fetch'):
+            pass
+        with metrics.track_smtp('smtp.metrics.test', 'send'):
+            pass
+        with self.assertRaises(smtplib.SMTPServerDisconnected):
+            with metrics.track_smtp('smtp.metrics.test', 'connect'):
+                raise smtplib.SMTPServerDisconnected()
+        metrics.record_llm_response('m', 'generate', 'metrics_test', 0.5, {
+            'eval_count': 12, 'prompt_eval_count': 30, 'eval_duration': 400_000_000,
+        })
+        after = self.scrape()
+
+        def delta(name, **labels):
+            return (self.sample(after, name, **labels) or 0) - (self.sample(before, name, **labels) or 0)
+
+        self.assertEqual(delta('emailai_imap_operation_duration_seconds_count',
+                               server='imap.metrics.test', operation='fetch'), 1)
+        self.assertEqual(delta('emailai_smtp_operation_duration_seconds_count',
+                               server='smtp.metrics.test', operation='send'), 1)
+        self.assertEqual(delta('emailai_smtp_errors_total',
+                               server='smtp.metrics.test', operation='connect'), 1)
+        self.assertEqual(delta('emailai_llm_completion_tokens_sum', call_site='metrics_test'), 12)
+        self.assertAlmostEqual(delta('emailai_llm_eval_duration_seconds_sum', call_site='metrics_test'), 0.4)
+        self.assertIn('emailai_scheduler_queue_depth', {family.name for family in after})
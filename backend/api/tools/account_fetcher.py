@@ -0,0 +1,260 @@
+"""
+Author: Akshay NS
+Contains: Account-level fetcher that lists mailboxes, fetches them in parallel over pooled IMAP connections and dedupes the result
+
+"""
+
+# backend/api/tools/account_fetcher.py
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import asyncio
+import logging
+import re
+import threading
+
+from ..services import metrics
+from .email_fetcher import EmailFetchConfig, EmailFetchInputs, EmailFetchTool, EmailMessage
+
+logger = logging.getLogger(__name__)
+
+# * LIST (\HasNoChildren \Trash) "/" "[Gmail]/Trash"
+_LIST_LINE = re.compile(rb'\((?P<flags>[^)]*)\) (?P<delimiter>"[^"]*"|NIL) (?P<name>.+)$')
+
+# Folders that cannot be selected at all
+UNSELECTABLE_FLAGS = {'\\noselect', '\\nonexistent'}
+
+# Special-use (RFC 6154) flags skipped by default. \All, \Flagged and
+# Gmail's \Important only hold copies of mail filed elsewhere; matching the
+# flag rather than the name also covers "[Google Mail]/..." and localized
+# folder names.
+DEFAULT_EXCLUDED_FLAGS = ('\\trash', '\\junk', '\\drafts', '\\all', '\\flagged', '\\important')
+
+# Name patterns for servers that do not advertise special-use flags
+DEFAULT_EXCLUDE = ('[Gmail]/All Mail', '[Gmail]/Important', '[Gmail]/Starred')
+
+# Gmail allows 15 simultaneous IMAP connections per account; stay well under
+DEFAULT_MAX_CONNECTIONS = 4
+
+
+def parse_list_response(lines: Iterable[bytes]) -> List[Tuple[str, List[str]]]:
+    """(name, flags) for each LIST response line"""
+    mailboxes = []
+    for line in lines:
+        if isinstance(line, tuple):
+            # Name sent as a literal: (b'(flags) "/" {12}', b'Applications')
+            line = line[0].rsplit(b' ', 1)[0] + b' "' + line[1] + b'"'
+        match = _LIST_LINE.match(line or b'')
+        if match is None:
+            continue
+        name = match.group('name').decode('utf-8', 'replace').strip()
+        if name.startswith('"') and name.endswith('"'):
+            name = re.sub(r'\\(.)', r'\1', name[1:-1])
+        flags = match.group('flags').decode('ascii', 'replace').lower().split()
+        mailboxes.append((name, flags))
+    return mailboxes
+
+
+@lru_cache(maxsize=128)
+def _pattern(pattern: str) -> 're.Pattern':
+    """LIST-style wildcards: * matches anything, % stops at a hierarchy level.
+
+    Everything else is literal, so "[Gmail]/All Mail" means what it says.
+    Matching is case-insensitive; users rarely mean otherwise.
+    """
+    regex = re.escape(pattern).replace('\\*', '.*').replace('%', '[^/.]*')
+    return re.compile(regex, re.IGNORECASE)
+
+
+def _matches(name: str, patterns: Sequence[str]) -> bool:
+    return any(_pattern(pattern).fullmatch(name) for pattern in patterns)
+
+
+class IMAPConnectionPool:
+    """Up to ``size`` logged-in EmailFetchTools for one account, reused across mailboxes.
+
+    If the server refuses an extra connection (e.g. "Too many simultaneous
+    connections") while others are open, the pool shrinks to the ones it
+    has and callers wait for those instead of failing.
+    """
+
+    def __init__(self, config: EmailFetchConfig, size: int):
+        self.config = config
+        self.size = size
+        self._idle: List[EmailFetchTool] = []
+        self._created = 0
+        self._available = threading.Condition()
+
+    def acquire(self) -> EmailFetchTool:
+        with self._available:
+            while not self._idle and self._created >= self.size:
+                self._available.wait()
+            if self._idle:
+                return self._idle.pop()
+            self._created += 1
+        tool = EmailFetchTool(replace(self.config))
+        try:
+            asyncio.run(tool.connect())
+        except Exception as e:
+            with self._available:
+                self._created -= 1
+                # Wake waiters either way: they share the remaining
+                # connections, or try (and likely fail) to open their own
+                self._available.notify_all()
+                if not self._created:
+                    raise
+                self.size = self._created
+            logger.warning(f"Extra IMAP connection refused, sharing {self.size}: {str(e)}")
+            return self.acquire()
+        return tool
+
+    def release(self, tool: EmailFetchTool, broken: bool = False):
+        with self._available:
+            if broken:
+                self._created -= 1
+            else:
+                self._idle.append(tool)
+            self._available.notify()
+        if broken:
+            asyncio.run(tool.disconnect())
+
+    def close(self):
+        with self._available:
+            idle, self._idle = self._idle, []
+        for tool in idle:
+            asyncio.run(tool.disconnect())
+
+
+class AccountFetcher:
+    """Fetch every relevant mailbox of one account concurrently.
+
+    Mailboxes come from ``LIST``. A mailbox is fetched if it matches an
+    ``include`` pattern and no ``exclude`` pattern (``*``/``%`` wildcards,
+    case insensitive), is selectable and carries none of
+    ``exclude_flags`` (Trash, Junk, Drafts, All, Flagged, Important by
+    default). Each mailbox is searched with the same ``EmailFetchInputs``
+    (``max_emails`` applies per mailbox) on one of ``max_connections``
+    pooled connections. Mailboxes that could not be fetched are listed in
+    ``failed`` (name -> error) after ``fetch``; an empty ``failed`` means
+    the result is complete.
+
+    Mail filed in several folders is returned once: duplicates are
+    detected by Gmail's X-GM-MSGID where available, else Message-ID, and
+    the copy from the earliest mailbox in ``include`` order (INBOX first
+    by default) wins; ``duplicates`` counts the copies dropped by the
+    last ``fetch``. UIDs are only unique within a mailbox, so messages
+    outside INBOX get ``<mailbox>:<uid>`` as their uid.
+    """
+
+    def __init__(self, config: EmailFetchConfig, include: Sequence[str] = ('*',),
+                 exclude: Sequence[str] = DEFAULT_EXCLUDE,
+                 max_connections: int = DEFAULT_MAX_CONNECTIONS,
+                 exclude_flags: Sequence[str] = DEFAULT_EXCLUDED_FLAGS):
+        self.config = config
+        self.include = list(include)
+        self.exclude = list(exclude)
+        self.max_connections = max(1, max_connections)
+        self.exclude_flags = {flag.lower() for flag in exclude_flags} | UNSELECTABLE_FLAGS
+        self.duplicates = 0
+        self.failed: Dict[str, str] = {}
+
+    async def list_mailboxes(self) -> List[str]:
+        """Selectable mailboxes matching the include/exclude patterns, INBOX first"""
+        tool = EmailFetchTool(replace(self.config))
+        try:
+            await tool.connect()
+            with metrics.track_imap(self.config.imap_server, 'list'):
+                status, data = tool.imap.list()
+            if status != 'OK':
+                raise Exception(f"IMAP list failed: {data}")
+        finally:
+            await tool.disconnect()
+
+        selected = []
+        for name, flags in parse_list_response(data):
+            if self.exclude_flags.intersection(flags):
+                continue
+            if _matches(name, self.include) and not _matches(name, self.exclude):
+                selected.append(name)
+        return sorted(selected, key=self._mailbox_rank)
+
+    async def fetch(self, inputs: EmailFetchInputs,
+                    mailboxes: Optional[List[str]] = None) -> List[EmailMessage]:
+        """Fetch all selected mailboxes in parallel and return deduplicated messages"""
+        self.failed = {}
+        self.duplicates = 0
+        mailboxes = mailboxes if mailboxes is not None else await self.list_mailboxes()
+        if not mailboxes:
+            return []
+
+        pool = IMAPConnectionPool(self.config, min(self.max_connections, len(mailboxes)))
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=pool.size, thread_name_prefix='imap-fetch') as executor:
+            try:
+                results = await asyncio.gather(*(
+                    loop.run_in_executor(executor, self._fetch_mailbox, pool, mailbox, inputs)
+                    for mailbox in mailboxes
+                ))
+            finally:
+                # Pool methods drive the tools with asyncio.run; keep them off this loop
+                await loop.run_in_executor(executor, pool.close)
+        self.failed = {mailbox: error for mailbox, (_, error) in zip(mailboxes, results) if error}
+        return self.dedupe(message for batch, _ in results for message in batch)
+
+    def dedupe(self, messages: Iterable[EmailMessage]) -> List[EmailMessage]:
+        """Drop later copies of the same message; counts them in ``duplicates``"""
+        seen = set()
+        unique = []
+        for message in messages:
+            key = dedupe_key(message)
+            if key is not None and key in seen:
+                self.duplicates += 1
+                continue
+            seen.add(key)
+            unique.append(message)
+        return unique
+
+    def _fetch_mailbox(self, pool: IMAPConnectionPool, mailbox: str,
+                       inputs: EmailFetchInputs) -> Tuple[List[EmailMessage], Optional[str]]:
+        """(messages, None), or ([], error) if the mailbox could not be fetched"""
+        tool = None
+        broken = False
+        try:
+            tool = pool.acquire()
+            messages = asyncio.run(self._select_and_fetch(tool, mailbox, inputs))
+        except Exception as e:
+            broken = True
+            logger.warning(f"Error fetching mailbox {mailbox}: {str(e)}")
+            return [], str(e) or e.__class__.__name__
+        finally:
+            if tool is not None:
+                pool.release(tool, broken=broken)
+
+        if mailbox.upper() != 'INBOX':
+            for message in messages:
+                message.uid = f"{mailbox}:{message.uid}"
+        return messages, None
+
+    async def _select_and_fetch(self, tool: EmailFetchTool, mailbox: str,
+                                inputs: EmailFetchInputs) -> List[EmailMessage]:
+        if tool.config.mailbox != mailbox:
+            await tool.select(mailbox)
+        return await tool.fetch_emails(inputs)
+
+    def _mailbox_rank(self, name: str) -> Tuple[int, int, str]:
+        """INBOX first, then by the first include pattern that matches"""
+        position = next(
+            (index for index, pattern in enumerate(self.include) if _matches(name, [pattern])),
+            len(self.include),
+        )
+        return (name.upper() != 'INBOX', position, name)
+
+
+def dedupe_key(message: EmailMessage) -> Optional[str]:
+    if message.gm_msgid:
+        return f"gm:{message.gm_msgid}"
+    for name, value in message.headers.items():
+        if name.lower() == 'message-id' and str(value).strip():
+            return f"mid:{str(value).strip()}"
+    return None
@@ -5,16 +5,25 @@ Contains: Email fetching tool for IMAP servers with enhanced error handling and
 """
 
 # backend/api/tools/email_fetcher.py
-from typing import Any, Optional, List, Dict
+from typing import Any, Optional, List, Dict, Iterable, Tuple
 import imaplib
 import email
 from datetime import datetime
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import logging
+import re
 from django.conf import settings
 
+from ..services import metrics
+from .header_parser import NormalizedHeaders, codec_for, normalize_batch, normalize_headers, parse_date
+from .html_text import html_to_text
+from .search_filters import GMAIL_CAPABILITY, compile_search, split_literals
+
 logger = logging.getLogger(__name__)
 
+_FETCH_UID = re.compile(rb'\bUID (\d+)')
+_FETCH_GM_MSGID = re.compile(rb'\bX-GM-MSGID (\d+)')
+
 @dataclass
 class EmailFetchConfig:
     imap_server: str
@@ -23,6 +32,9 @@ class EmailFetchConfig:
     port: int = 993  # Default IMAPS port
     ssl: bool = True
     mailbox: str = "INBOX"
+    # Socket timeout (seconds) for every IMAP operation, so a stalled
+    # server cannot block the calling thread indefinitely
+    timeout: float = 60.0
 
 @dataclass
 class EmailFetchInputs:
@@ -30,41 +42,108 @@ class EmailFetchInputs:
     to_date: Optional[str] = None
     max_emails: int = 10  # Added for safety
     mark_as_read: bool = False  # Added as config option
+    # Server-side filters, see search_filters.py. A message is kept if it
+    # matches any include filter (from_domains OR subject_keywords) and
+    # none of the exclude filters.
+    from_domains: List[str] = field(default_factory=list)
+    subject_keywords: List[str] = field(default_factory=list)
+    exclude_from_domains: List[str] = field(default_factory=list)
+    exclude_subject_keywords: List[str] = field(default_factory=list)
+    unseen_only: bool = False
+    min_size: Optional[int] = None  # bytes, inclusive
+    max_size: Optional[int] = None
+
+    def field_errors(self) -> Dict[str, str]:
+        """Problems the JSON schema cannot express, by field name"""
+        errors = {}
+        for name in ('from_date', 'to_date'):
+            value = getattr(self, name)
+            if value:
+                try:
+                    datetime.strptime(value, '%d-%b-%Y')
+                except ValueError:
+                    errors[name] = 'expected DD-Mon-YYYY, e.g. 10-Jan-2025'
+        if self.max_emails < 1:
+            errors['max_emails'] = 'must be at least 1'
+        for name in ('min_size', 'max_size'):
+            if getattr(self, name) is not None and getattr(self, name) < 0:
+                errors[name] = 'must not be negative'
+        return errors
 
 @dataclass
 class EmailMessage:
-    subject: str
-    date: datetime
-    sender: str
+    subject: str  # RFC 2047 decoded
+    date: Optional[datetime]  # aware, UTC
+    sender: str  # decoded "Name <address>"
     text: str
     uid: str  # Added for tracking
-    headers: Dict[str, str]  # Added for full headers
+    headers: Dict[str, str]  # Added for full headers (raw values)
+    from_name: str = ''
+    from_address: str = ''
+    mailbox: str = ''
+    gm_msgid: Optional[str] = None  # Gmail's account-wide message id
+
+class _LiteralSequence:
+    """Rest of a command after its first ``{n}``: each literal plus the text up to the next"""
+
+    def __init__(self, segments: List[str], literals: List[bytes]):
+        self.segments = segments
+        self.literals = literals
+        self.index = 0
+
+    def next(self, continuation: bytes) -> bytes:
+        index = self.index
+        self.index += 1
+        chunk = self.literals[index] + self.segments[index + 1].encode('ascii')
+        if index + 1 < len(self.literals):
+            chunk += b'{%d}' % len(self.literals[index + 1])
+        return chunk
 
 class EmailFetchTool:
-    def __init__(self, config: EmailFetchConfig):
+    def __init__(self, config: EmailFetchConfig, parse_pool=None):
         self.config = config
         self.imap = None
+        # Optional services.parse_pool.ParsePool: parse in worker processes
+        # while this thread keeps fetching
+        self.parse_pool = parse_pool
 
     async def connect(self):
         """Establish IMAP connection"""
+        server = self.config.imap_server
         try:
-            if self.config.ssl:
-                self.imap = imaplib.IMAP4_SSL(
-                    self.config.imap_server, 
-                    self.config.port
-                )
-            else:
-                self.imap = imaplib.IMAP4(
-                    self.config.imap_server, 
-                    self.config.port
-                )
-            self.imap.login(self.config.username, self.config.password)
-            self.imap.select(self.config.mailbox)
+            with metrics.track_imap(server, 'connect'):
+                if self.config.ssl:
+                    self.imap = imaplib.IMAP4_SSL(
+                        self.config.imap_server, 
+                        self.config.port,
+                        timeout=self.config.timeout
+                    )
+                else:
+                    self.imap = imaplib.IMAP4(
+                        self.config.imap_server, 
+                        self.config.port,
+                        timeout=self.config.timeout
+                    )
+            with metrics.track_imap(server, 'login'):
+                self.imap.login(self.config.username, self.config.password)
+            await self.select(self.config.mailbox)
             return True
         except Exception as e:
             logger.error(f"IMAP connection failed: {str(e)}")
             raise
 
+    async def select(self, mailbox: str):
+        """Switch the open connection to another mailbox"""
+        with metrics.track_imap(self.config.imap_server, 'select'):
+            status, data = self.imap.select(quote_mailbox(mailbox))
+        if status != 'OK':
+            raise Exception(f"IMAP select {mailbox} failed: {data}")
+        self.config.mailbox = mailbox
+
+    @property
+    def gmail(self) -> bool:
+        return bool(self.imap) and GMAIL_CAPABILITY in self.imap.capabilities
+
     async def disconnect(self):
         """Close IMAP connection"""
         try:
@@ -85,15 +164,13 @@ class EmailFetchTool:
             )
 
     def build_search_criteria(self, inputs: EmailFetchInputs) -> str:
-        """Construct IMAP search query"""
-        criteria = []
+        """Construct IMAP search query, as X-GM-RAW when the server is Gmail"""
         if inputs.from_date:
             self.validate_date_format(inputs.from_date)
-            criteria.append(f'SINCE "{inputs.from_date}"')
         if inputs.to_date:
             self.validate_date_format(inputs.to_date)
-            criteria.append(f'BEFORE "{inputs.to_date}"')
-        return ' '.join(criteria) if criteria else 'ALL'
+        capabilities = getattr(self.imap, 'capabilities', ()) if self.imap else ()
+        return compile_search(inputs, capabilities)
 
     async def fetch_emails(self, inputs: EmailFetchInputs) -> List[EmailMessage]:
         """Main method to fetch emails"""
@@ -103,11 +180,14 @@ class EmailFetchTool:
         try:
             # Build and execute search
             criteria = self.build_search_criteria(inputs)
-            status, data = self.imap.search(None, criteria)
+            with metrics.track_imap(self.config.imap_server, 'search'):
+                status, data = self._search(criteria)
             if status != 'OK':
                 raise Exception(f"IMAP search failed: {data}")
 
             mail_ids = data[0].split()[:inputs.max_emails]
+            if self.parse_pool is not None:
+                return self._fetch_with_pool(mail_ids, inputs)
             emails = []
 
             for mail_id in mail_ids:
@@ -115,7 +195,8 @@ class EmailFetchTool:
                 if email_data:
                     emails.append(email_data)
                     if inputs.mark_as_read:
-                        self.imap.store(mail_id, '+FLAGS', '\\Seen')
+                        with metrics.track_imap(self.config.imap_server, 'store'):
+                            self.imap.store(mail_id, '+FLAGS', '\\Seen')
 
             return emails
 
@@ -123,70 +204,158 @@ class EmailFetchTool:
             logger.error(f"Error fetching emails: {str(e)}")
             raise
 
+    def _search(self, criteria: str):
+        """SEARCH, sending non-ASCII values as literals with CHARSET UTF-8"""
+        if criteria.isascii():
+            return self.imap.search(None, criteria)
+        segments, literals = split_literals(criteria)
+        # imaplib sends one literal per continuation request from the
+        # server when ``literal`` is a bound method
+        self.imap.literal = _LiteralSequence(segments, literals).next
+        return self.imap.search('UTF-8', f"{segments[0]}{{{len(literals[0])}}}")
+
+    def _fetch_with_pool(self, mail_ids: List[bytes], inputs: EmailFetchInputs) -> List[EmailMessage]:
+        """Fetch raw messages here and parse them in the pool as they arrive"""
+        gm_msgids: Dict[str, Optional[str]] = {}
+
+        def raw_emails():
+            for mail_id in mail_ids:
+                fetched = self._fetch_raw(mail_id)
+                if fetched is None:
+                    continue
+                raw_email, uid, gm_msgid = fetched
+                gm_msgids[uid] = gm_msgid
+                if inputs.mark_as_read:
+                    with metrics.track_imap(self.config.imap_server, 'store'):
+                        self.imap.store(mail_id, '+FLAGS', '\\Seen')
+                yield raw_email, uid
+
+        emails = []
+        for message in self.parse_pool.map(raw_emails()):
+            message.mailbox = self.config.mailbox
+            message.gm_msgid = gm_msgids.get(message.uid)
+            emails.append(message)
+        return emails
+
     async def _fetch_single_email(self, mail_id: str) -> Optional[EmailMessage]:
         """Fetch and parse a single email"""
+        fetched = self._fetch_raw(mail_id)
+        if fetched is None:
+            return None
+        raw_email, uid, gm_msgid = fetched
         try:
-            status, data = self.imap.fetch(mail_id, '(RFC822 UID)')
-            if status != 'OK':
-                return None
-
-            raw_email = data[0][1]
-            email_message = email.message_from_bytes(raw_email)
-            
-            # Extract UID from response
-            uid = data[0][0].split()[2].decode('utf-8')  # Adjust based on your IMAP server response
-
-            return EmailMessage(
-                subject=email_message.get('Subject', ''),
-                sender=email_message.get('From', ''),
-                date=self._parse_email_date(email_message),
-                text=self._extract_email_body(email_message),
-                uid=uid,
-                headers=dict(email_message.items())
-            )
+            message = self.parse_message(raw_email, uid)
         except Exception as e:
             logger.warning(f"Error processing email {mail_id}: {str(e)}")
             return None
+        message.mailbox = self.config.mailbox
+        message.gm_msgid = gm_msgid
+        return message
 
-    def _parse_email_date(self, email_message) -> Optional[datetime]:
-        """Parse email date with fallback"""
-        date_str = email_message.get('Date')
-        if not date_str:
+    def _fetch_raw(self, mail_id: bytes) -> Optional[Tuple[bytes, str, Optional[str]]]:
+        """(raw RFC822 bytes, UID, X-GM-MSGID) for one message.
+
+        A dropped or timed-out connection propagates so the whole mailbox
+        is reported as failed; only a malformed response skips the message.
+        """
+        items = '(RFC822 UID X-GM-MSGID)' if self.gmail else '(RFC822 UID)'
+        with metrics.track_imap(self.config.imap_server, 'fetch'):
+            status, data = self.imap.fetch(mail_id, items)
+        if status != 'OK':
             return None
-            
+
         try:
-            # Try common email date formats
-            for fmt in (
-                '%a, %d %b %Y %H:%M:%S %z',
-                '%d %b %Y %H:%M:%S %z',
-                '%a, %d %b %Y %H:%M:%S',
-                '%d %b %Y %H:%M:%S'
-            ):
-                try:
-                    return datetime.strptime(date_str, fmt)
-                except ValueError:
-                    continue
-            return None
-        except Exception:
+            raw_email = data[0][1]
+            # Servers may order the data items differently
+            uid = _FETCH_UID.search(data[0][0]).group(1).decode('utf-8')
+            gm_msgid = _FETCH_GM_MSGID.search(data[0][0])
+        except (TypeError, IndexError, AttributeError) as e:
+            logger.warning(f"Error processing email {mail_id}: {str(e)}")
             return None
+        metrics.record_imap_message(self.config.imap_server, len(raw_email))
+        return raw_email, uid, gm_msgid.group(1).decode('utf-8') if gm_msgid else None
+
+    def parse_message(self, raw_email: bytes, uid: str) -> EmailMessage:
+        """Parse raw RFC822 bytes into an EmailMessage"""
+        return parse_email(raw_email, uid)
+
+    def parse_messages(self, raw_emails: Iterable[Tuple[bytes, str]]) -> List[EmailMessage]:
+        """Parse (raw bytes, uid) pairs, normalising their headers as one batch"""
+        return parse_emails(raw_emails)
+
+    def _parse_email_date(self, email_message) -> Optional[datetime]:
+        """Parse the Date header, normalised to UTC"""
+        return parse_date(email_message.get('Date'))
 
     def _extract_email_body(self, email_message) -> str:
         """Extract text body from email"""
-        body = ""
-        if email_message.is_multipart():
-            for part in email_message.walk():
-                content_type = part.get_content_type()
-                content_disposition = str(part.get("Content-Disposition", ""))
-                
-                if content_type == "text/plain" and "attachment" not in content_disposition:
-                    try:
-                        body += part.get_payload(decode=True).decode(errors='replace')
-                    except Exception as e:
-                        logger.debug(f"Error decoding part: {str(e)}")
-        else:
-            try:
-                body = email_message.get_payload(decode=True).decode(errors='replace')
-            except Exception as e:
-                logger.debug(f"Error decoding payload: {str(e)}")
-        
-        return body
\ No newline at end of file
+        return extract_body(email_message)
+
+
+# Parsing is kept at module level so worker processes (services/parse_pool.py)
+# can run it without an EmailFetchTool or an IMAP connection.
+
+def parse_email(raw_email: bytes, uid: str) -> EmailMessage:
+    """Parse raw RFC822 bytes into an EmailMessage"""
+    email_message = email.message_from_bytes(raw_email)
+    return _build_message(email_message, uid, normalize_headers(email_message))
+
+
+def parse_emails(raw_emails: Iterable[Tuple[bytes, str]]) -> List[EmailMessage]:
+    """Parse (raw bytes, uid) pairs, normalising their headers as one batch"""
+    parsed = [(email.message_from_bytes(raw), uid) for raw, uid in raw_emails]
+    normalized = normalize_batch(email_message for email_message, _ in parsed)
+    return [
+        _build_message(email_message, uid, headers)
+        for (email_message, uid), headers in zip(parsed, normalized)
+    ]
+
+
+def _build_message(email_message, uid: str, normalized: NormalizedHeaders) -> EmailMessage:
+    return EmailMessage(
+        subject=normalized.subject,
+        sender=normalized.sender,
+        date=normalized.date,
+        text=extract_body(email_message),
+        uid=uid,
+        headers=dict(email_message.items()),
+        from_name=normalized.from_name,
+        from_address=normalized.from_address,
+    )
+
+
+def _decode_part(part) -> str:
+    payload = part.get_payload(decode=True)
+    if payload is None:
+        return ''
+    return payload.decode(codec_for(part.get_content_charset() or 'utf-8'), errors='replace')
+
+
+def extract_body(email_message) -> str:
+    """Text body of a message: its text/plain parts, else its text/html parts as text"""
+    plain, html = [], []
+    for part in email_message.walk():
+        if part.is_multipart():
+            continue
+        content_type = part.get_content_type()
+        if content_type not in ('text/plain', 'text/html'):
+            continue
+        if 'attachment' in str(part.get('Content-Disposition', '')):
+            continue
+        try:
+            text = _decode_part(part)
+        except Exception as e:
+            logger.debug(f"Error decoding part: {str(e)}")
+            continue
+        (plain if content_type == 'text/plain' else html).append(text)
+
+    if plain:
+        return ''.join(plain)
+    return '\n\n'.join(html_to_text(markup) for markup in html)
+
+
+def quote_mailbox(name: str) -> str:
+    """Quote a mailbox name for SELECT/EXAMINE when it needs it (spaces, brackets)"""
+    if name.startswith('"') or re.fullmatch(r'[A-Za-z0-9_./&+-]+', name):
+        return name
+    return '"' + name.replace('\\', '\\\\').replace('"', '\\"') + '"'
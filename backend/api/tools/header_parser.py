@@ -0,0 +1,221 @@
+"""
+Author: Akshay NS
+Contains: Fast header normalisation for fetched mail (RFC 2047 subjects/senders, dates normalised to UTC)
+
+"""
+
+# backend/api/tools/header_parser.py
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from email.utils import parseaddr, parsedate_to_datetime
+from functools import lru_cache
+from typing import Iterable, List, Mapping, Optional, Tuple
+import binascii
+import codecs
+import re
+
+# =?charset?encoding?text?= ; charset may carry an RFC 2231 language (*en)
+_ENCODED_WORD = re.compile(r'=\?([^?\s*]+)(?:\*[^?]*)?\?([bBqQ])\?([^?\s]*)\?=')
+# Whitespace between two adjacent encoded words is not part of the text
+_BETWEEN_WORDS = re.compile(r'(\?=)\s+(=\?)')
+_FOLDING = re.compile(r'\r?\n[ \t]+')
+_WHITESPACE = re.compile(r'\s+')
+
+# "Name <addr>", "<addr>" or a bare address; anything else goes to parseaddr
+_NAME_ADDR = re.compile(r'^\s*(?:"((?:[^"\\]|\\.)*)"|([^"<>,;@]*?))\s*<([^<>\s]+@[^<>\s]+)>\s*$')
+_BARE_ADDR = re.compile(r'^\s*<?([^\s<>"(),;:]+@[^\s<>"(),;:]+)>?\s*$')
+
+# [Day,] DD Mon YYYY HH:MM[:SS] [zone] [(comment)] in one match
+_DATE = re.compile(
+    r'^\s*(?:[A-Za-z]{3,9},?\s*)?'
+    r'(\d{1,2})[\s-]+([A-Za-z]{3})[A-Za-z]*\.?[\s-]+(\d{2,4}),?\s+'
+    r'(\d{1,2}):(\d{2})(?::(\d{2}))?(?:\.\d+)?'
+    r'\s*(?:([+-]\d{2}:?\d{2})|([A-Za-z]{1,5}))?'
+)
+
+_MONTHS = {
+    name: number for number, name in enumerate(
+        ('jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'),
+        start=1,
+    )
+}
+
+# RFC 5322 obsolete zones; unknown and military zones count as UTC
+_ZONE_MINUTES = {
+    'UT': 0, 'UTC': 0, 'GMT': 0, 'Z': 0,
+    'EST': -300, 'EDT': -240, 'CST': -360, 'CDT': -300,
+    'MST': -420, 'MDT': -360, 'PST': -480, 'PDT': -420,
+    'BST': 60, 'CET': 60, 'CEST': 120, 'IST': 330, 'JST': 540,
+}
+
+# Labels that codecs.lookup does not know but mail clients emit
+_CHARSET_ALIASES = {
+    'unknown-8bit': 'latin-1',
+    'x-unknown': 'latin-1',
+    'iso-8859-8-i': 'iso-8859-8',
+    'ks_c_5601-1987': 'cp949',
+    'x-user-defined': 'latin-1',
+}
+
+
+@dataclass
+class NormalizedHeaders:
+    subject: str
+    sender: str  # decoded "Name <address>" form
+    from_name: str
+    from_address: str
+    date: Optional[datetime]  # aware, UTC
+
+
+@lru_cache(maxsize=256)
+def codec_for(charset: str) -> str:
+    """Resolve a MIME charset label to a Python codec name (cached)"""
+    label = charset.strip().lower()
+    label = _CHARSET_ALIASES.get(label, label)
+    try:
+        return codecs.lookup(label).name
+    except LookupError:
+        return 'utf-8'
+
+
+@lru_cache(maxsize=64)
+def _timezone(minutes: int) -> timezone:
+    return timezone(timedelta(minutes=minutes)) if minutes else timezone.utc
+
+
+def _from_raw(value: str) -> str:
+    """Undo surrogateescape from 8-bit headers parsed by the compat32 policy"""
+    try:
+        value.encode('utf-8')
+        return value
+    except UnicodeEncodeError:
+        return value.encode('utf-8', 'surrogateescape').decode('utf-8', 'replace')
+
+
+def _decode_word(match: re.Match) -> str:
+    charset, encoding, text = match.groups()
+    try:
+        if encoding in 'bB':
+            data = binascii.a2b_base64(text + '=' * (-len(text) % 4))
+        else:
+            data = binascii.a2b_qp(text.encode('ascii', 'replace'), header=True)
+    except (binascii.Error, ValueError):
+        return match.group(0)
+    return data.decode(codec_for(charset), 'replace')
+
+
+def decode_header_value(value) -> str:
+    """Decode RFC 2047 encoded words and unfold the value onto one line"""
+    if value is None:
+        return ''
+    value = _from_raw(str(value))
+    if '=?' in value:
+        value = _ENCODED_WORD.sub(_decode_word, _BETWEEN_WORDS.sub(r'\1\2', _FOLDING.sub(' ', value)))
+    return _WHITESPACE.sub(' ', value).strip()
+
+
+@lru_cache(maxsize=4096)
+def split_address(value: str) -> Tuple[str, str]:
+    """Return (display name, address) for a From header, names decoded.
+
+    Names are decoded after splitting so that decoded commas or angle
+    brackets cannot be mistaken for address syntax.
+    """
+    match = _NAME_ADDR.match(value)
+    if match:
+        quoted, plain, address = match.groups()
+        name = quoted.replace('\\"', '"').replace('\\\\', '\\') if quoted is not None else plain
+        return decode_header_value(name), address
+    match = _BARE_ADDR.match(value)
+    if match:
+        return '', match.group(1)
+    name, address = parseaddr(_FOLDING.sub(' ', value))
+    return decode_header_value(name), address
+
+
+def parse_date(value) -> Optional[datetime]:
+    """Parse a Date header in a single pass and normalise it to UTC.
+
+    Accepts the usual RFC 5322 shapes plus variants seen in the wild:
+    missing weekday, trailing "(UTC)"-style comments, named zones,
+    two-digit years and missing seconds. Unparseable values give None.
+    """
+    if not value:
+        return None
+    value = str(value)
+    match = _DATE.match(value)
+    if match is None:
+        return _parse_date_fallback(value)
+
+    day, month, year, hour, minute, second, offset, zone = match.groups()
+    month_number = _MONTHS.get(month.lower())
+    if month_number is None:
+        return _parse_date_fallback(value)
+    year = int(year)
+    if year < 100:
+        year += 2000 if year < 50 else 1900
+
+    if offset:
+        offset = offset.replace(':', '')
+        minutes = int(offset[1:3]) * 60 + int(offset[3:5])
+        minutes = -minutes if offset[0] == '-' else minutes
+    else:
+        minutes = _ZONE_MINUTES.get(zone.upper(), 0) if zone else 0
+
+    try:
+        parsed = datetime(year, month_number, int(day), int(hour), int(minute),
+                          int(second or 0), tzinfo=_timezone(minutes))
+    except ValueError:
+        return None
+    return parsed.astimezone(timezone.utc) if minutes else parsed
+
+
+def _parse_date_fallback(value: str) -> Optional[datetime]:
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        try:
+            parsed = datetime.fromisoformat(value.strip())
+        except ValueError:
+            return None
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+def normalize_headers(headers: Mapping) -> NormalizedHeaders:
+    """Decoded subject, sender parts and UTC date for one message.
+
+    ``headers`` is anything with ``.get`` — an ``email.message.Message``
+    or a plain dict of raw header values.
+    """
+    return _normalize(headers, parse_date(headers.get('Date')))
+
+
+def normalize_batch(messages: Iterable[Mapping]) -> List[NormalizedHeaders]:
+    """Normalise many messages; identical Date values are parsed once per batch"""
+    dates = {}
+    results = []
+    for headers in messages:
+        raw_date = headers.get('Date')
+        key = None if raw_date is None else str(raw_date)
+        if key not in dates:
+            dates[key] = parse_date(key)
+        results.append(_normalize(headers, dates[key]))
+    return results
+
+
+def _normalize(headers: Mapping, date: Optional[datetime]) -> NormalizedHeaders:
+    raw_from = _from_raw(str(headers.get('From') or ''))
+    from_name, from_address = split_address(raw_from)
+    if from_name and from_address:
+        sender = f"{from_name} <{from_address}>"
+    else:
+        sender = from_address or decode_header_value(raw_from)
+    return NormalizedHeaders(
+        subject=decode_header_value(headers.get('Subject')),
+        sender=sender,
+        from_name=from_name,
+        from_address=from_address,
+        date=date,
+    )
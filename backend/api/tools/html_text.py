@@ -0,0 +1,115 @@
+"""
+Author: Akshay NS
+Contains: Fast regex-based HTML to plain text conversion for text/html-only email bodies
+
+"""
+
+# backend/api/tools/html_text.py
+import html
+import re
+
+# Every pattern is bounded by the next "<" or ">" (or is a plain literal),
+# so unclosed tags in hostile markup cost linear time, not quadratic.
+
+# Openers of content that is never visible text, and how each one ends
+_INVISIBLE_START = re.compile(
+    r'<!--|<!\[CDATA\[|<(script|style|head|title|template|noscript)\b[^<>]*>',
+    re.IGNORECASE,
+)
+_INVISIBLE_END = {'<!--': re.compile(r'-->'), '<![CDATA[': re.compile(r'\]\]>')}
+# Tags that end a line or a block
+_LINE_BREAK = re.compile(r'<br\b[^<>]*>', re.IGNORECASE)
+_BLOCK_END = re.compile(
+    r'</?(p|div|tr|table|h[1-6]|ul|ol|blockquote|pre|section|article|header|footer|hr)\b[^<>]*>',
+    re.IGNORECASE,
+)
+_LIST_ITEM = re.compile(r'<li\b[^<>]*>', re.IGNORECASE)
+_CELL = re.compile(r'</t[dh]\s*>', re.IGNORECASE)
+# Links keep their target when it differs from the text: "Apply (https://...)"
+_LINK_START = re.compile(r'<a\b[^<>]*>', re.IGNORECASE)
+_LINK_END = re.compile(r'</a\s*>', re.IGNORECASE)
+_HREF = re.compile(r'href\s*=\s*["\']([^"\']+)["\']', re.IGNORECASE)
+# A "<" only starts a tag when a name, "/", "!" or "?" follows, so text
+# like "a < b and c > d" survives
+_TAG = re.compile(r'<[A-Za-z/!?][^<>]*>')
+_SPACES = re.compile(r'[ \t\r\f\v\xa0]+')
+_BLANK_LINES = re.compile(r'\n{3,}')
+
+
+def _strip_invisible(markup: str) -> str:
+    """Drop comments, CDATA and script/style-like elements.
+
+    An element that is never closed hides the rest of the document, as it
+    would in a browser; stopping there keeps this a single pass.
+    """
+    parts = []
+    position = 0
+    while True:
+        start = _INVISIBLE_START.search(markup, position)
+        if start is None:
+            parts.append(markup[position:])
+            break
+        parts.append(markup[position:start.start()])
+        end_pattern = _INVISIBLE_END.get(start.group(0)) or _closing_tag(start.group(1))
+        end = end_pattern.search(markup, start.end())
+        if end is None:
+            break
+        position = end.end()
+    return ''.join(parts)
+
+
+_CLOSING_TAGS = {}
+
+
+def _closing_tag(name: str) -> re.Pattern:
+    name = name.lower()
+    if name not in _CLOSING_TAGS:
+        _CLOSING_TAGS[name] = re.compile(rf'</{name}\s*>', re.IGNORECASE)
+    return _CLOSING_TAGS[name]
+
+
+def _replace_links(markup: str) -> str:
+    parts = []
+    position = 0
+    for start in _LINK_START.finditer(markup):
+        if start.start() < position:
+            continue
+        end = _LINK_END.search(markup, start.end())
+        if end is None:
+            # No closing tag anywhere after this one, so none for later links either
+            break
+        href = _HREF.search(start.group(0))
+        parts.append(markup[position:start.start()])
+        text = markup[start.end():end.start()]
+        parts.append(_link(href.group(1), text) if href else text)
+        position = end.end()
+    parts.append(markup[position:])
+    return ''.join(parts)
+
+
+def _link(href: str, text: str) -> str:
+    text = _TAG.sub('', text).strip()
+    if not text or href.startswith(('mailto:', '#')) or href == text:
+        return text or ''
+    return f"{text} ({href})"
+
+
+def html_to_text(markup: str) -> str:
+    """Readable text for an HTML email body.
+
+    Not a full HTML parser: it drops invisible elements, turns block
+    tags into line breaks, keeps link targets and unescapes entities,
+    which is enough for classification prompts without building a DOM.
+    """
+    if not markup:
+        return ''
+    text = _strip_invisible(markup)
+    text = _replace_links(text)
+    text = _LINE_BREAK.sub('\n', text)
+    text = _BLOCK_END.sub('\n', text)
+    text = _LIST_ITEM.sub('\n- ', text)
+    text = _CELL.sub(' ', text)
+    text = html.unescape(_TAG.sub('', text))
+    lines = (_SPACES.sub(' ', line).strip() for line in text.split('\n'))
+    text = '\n'.join(lines)
+    return _BLANK_LINES.sub('\n\n', text).strip()
@@ -0,0 +1,131 @@
+"""
+Author: Akshay NS
+Contains: Compiles EmailFetchInputs filters into IMAP SEARCH keys or Gmail X-GM-RAW queries
+
+"""
+
+# backend/api/tools/search_filters.py
+from datetime import datetime
+from typing import List, Tuple
+import re
+
+# Advertised by Gmail; enables X-GM-RAW (Gmail web search syntax) in SEARCH
+GMAIL_CAPABILITY = 'X-GM-EXT-1'
+
+_QUOTED = re.compile(r'"((?:[^"\\]|\\.)*)"')
+
+
+def _imap_quote(value: str) -> str:
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def _imap_or(keys: List[str]) -> str:
+    """IMAP OR is binary: OR a OR b c"""
+    if len(keys) == 1:
+        return keys[0]
+    return f"OR {keys[0]} {_imap_or(keys[1:])}"
+
+
+def _domain(value: str) -> str:
+    return value.strip().lstrip('@').lower()
+
+
+def _include_terms(inputs) -> bool:
+    return bool(inputs.from_domains or inputs.subject_keywords)
+
+
+def compile_imap_search(inputs) -> str:
+    """Standard IMAP4rev1 SEARCH keys for ``inputs`` (space separated, ANDed).
+
+    Include filters (``from_domains``, ``subject_keywords``) form one OR
+    group: a message is kept if it matches any of them. Excludes, flags
+    and size limits narrow that further.
+    """
+    keys = []
+    if inputs.from_date:
+        keys.append(f'SINCE "{inputs.from_date}"')
+    if inputs.to_date:
+        keys.append(f'BEFORE "{inputs.to_date}"')
+    if inputs.unseen_only:
+        keys.append('UNSEEN')
+    if _include_terms(inputs):
+        include = [f"FROM {_imap_quote('@' + _domain(domain))}" for domain in inputs.from_domains]
+        include += [f"SUBJECT {_imap_quote(keyword)}" for keyword in inputs.subject_keywords]
+        keys.append(_imap_or(include))
+    keys += [f"NOT FROM {_imap_quote('@' + _domain(domain))}" for domain in inputs.exclude_from_domains]
+    keys += [f"NOT SUBJECT {_imap_quote(keyword)}" for keyword in inputs.exclude_subject_keywords]
+    # LARGER/SMALLER are strict; the inputs are inclusive. A min_size of 0
+    # matches everything (and LARGER -1 is not valid), but max_size=0 is a
+    # real limit.
+    if inputs.min_size:
+        keys.append(f"LARGER {inputs.min_size - 1}")
+    if inputs.max_size is not None:
+        keys.append(f"SMALLER {inputs.max_size + 1}")
+    return ' '.join(keys) if keys else 'ALL'
+
+
+def _gmail_term(operator: str, value: str) -> str:
+    value = value.strip()
+    if any(char in value for char in ' (){}"'):
+        value = '"' + value.replace('"', '') + '"'
+    return f"{operator}:{value}"
+
+
+def _gmail_date(value: str) -> str:
+    return datetime.strptime(value, '%d-%b-%Y').strftime('%Y/%m/%d')
+
+
+def compile_gmail_raw(inputs) -> str:
+    """Gmail search query for ``inputs``, with the same semantics as the IMAP form.
+
+    Gmail evaluates ``{a b}`` as "a OR b", which keeps the include group
+    to a single term however many domains and keywords it has.
+    """
+    terms = []
+    if inputs.from_date:
+        terms.append(f"after:{_gmail_date(inputs.from_date)}")
+    if inputs.to_date:
+        terms.append(f"before:{_gmail_date(inputs.to_date)}")
+    if inputs.unseen_only:
+        terms.append('is:unread')
+    if _include_terms(inputs):
+        include = [_gmail_term('from', _domain(domain)) for domain in inputs.from_domains]
+        include += [_gmail_term('subject', keyword) for keyword in inputs.subject_keywords]
+        terms.append(include[0] if len(include) == 1 else '{' + ' '.join(include) + '}')
+    terms += ['-' + _gmail_term('from', _domain(domain)) for domain in inputs.exclude_from_domains]
+    terms += ['-' + _gmail_term('subject', keyword) for keyword in inputs.exclude_subject_keywords]
+    if inputs.min_size:
+        terms.append(f"larger:{inputs.min_size - 1}")
+    if inputs.max_size is not None:
+        terms.append(f"smaller:{inputs.max_size + 1}")
+    return ' '.join(terms)
+
+
+def compile_search(inputs, capabilities) -> str:
+    """SEARCH criteria for a server, preferring X-GM-RAW where Gmail offers it"""
+    if GMAIL_CAPABILITY in capabilities:
+        query = compile_gmail_raw(inputs)
+        if query:
+            return f"X-GM-RAW {_imap_quote(query)}"
+        return 'ALL'
+    return compile_imap_search(inputs)
+
+
+def split_literals(criteria: str) -> Tuple[List[str], List[bytes]]:
+    """Split criteria around quoted strings that are not 7-bit.
+
+    IMAP quoted strings must be ASCII, so those values have to be sent as
+    literals (``{n}`` then the UTF-8 bytes). Returns ``(segments,
+    literals)`` with ``len(segments) == len(literals) + 1``: the command is
+    segments[0], literals[0], segments[1], ... in order.
+    """
+    segments, literals = [], []
+    position = 0
+    for match in _QUOTED.finditer(criteria):
+        if match.group(1).isascii():
+            continue
+        segments.append(criteria[position:match.start()])
+        literals.append(re.sub(r'\\(.)', r'\1', match.group(1)).encode('utf-8'))
+        position = match.end()
+    segments.append(criteria[position:])
+    return segments, literals
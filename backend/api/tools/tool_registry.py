@@ -4,9 +4,21 @@ Contains: Tool registry for managing and registering tools in the application
 
 """
 # backend/api/tools/tool_registry.py
-from typing import Dict, Type, Any
+from typing import Dict, List, Type, Any, Union
 from .email_fetcher import EmailFetchTool, EmailFetchConfig, EmailFetchInputs
+import dataclasses
+import functools
 import inspect
+import typing
+
+
+class ToolInputError(ValueError):
+    """Tool config or inputs do not match the registered schema"""
+
+    def __init__(self, errors: Dict[str, str]):
+        self.errors = errors
+        super().__init__('; '.join(f"{name}: {error}" for name, error in errors.items()))
+
 
 class ToolRegistry:
     _instance = None
@@ -15,7 +27,6 @@ class ToolRegistry:
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
-            cls._register_default_tools()
         return cls._instance
 
     @classmethod
@@ -26,48 +37,73 @@ class ToolRegistry:
             description="Fetch emails from an IMAP server",
             tool_class=EmailFetchTool,
             config_class=EmailFetchConfig,
-            input_class=EmailFetchInputs
+            input_class=EmailFetchInputs,
+            method='fetch_emails',
+            # Providers cap simultaneous IMAP sessions per account
+            max_concurrency=4,
+            timeout=120.0
         )
 
     @classmethod
     def register_tool(cls, name: str, description: str, tool_class: Type, 
-                    config_class: Type, input_class: Type):
-        """Register a new tool"""
+                    config_class: Type, input_class: Type, method: str = 'run',
+                    max_concurrency: int = 4, timeout: float = 60.0):
+        """Register a new tool.
+
+        ``method`` is called on a ``tool_class(config)`` instance with the
+        input dataclass; ``max_concurrency`` and ``timeout`` (seconds) are
+        enforced per tool by tool_runtime.ToolRuntime.
+        """
         cls._tools[name] = {
             'class': tool_class,
             'config_class': config_class,
             'input_class': input_class,
             'description': description,
+            'method': method,
+            'max_concurrency': max_concurrency,
+            'timeout': timeout,
             'config_schema': cls._generate_schema(config_class),
             'input_schema': cls._generate_schema(input_class)
         }
 
     @classmethod
+    @functools.lru_cache(maxsize=None)
     def _generate_schema(cls, class_obj: Type) -> Dict[str, Any]:
-        """Generate JSON schema from dataclass"""
+        """Generate JSON schema from dataclass (once per class; treat as read-only)"""
         schema = {
             'type': 'object',
             'properties': {},
             'required': []
         }
+        hints = typing.get_type_hints(class_obj)
         
-        for field_name, field_type in class_obj.__annotations__.items():
-            field_info = {
-                'type': cls._map_type(field_type)
-            }
+        for field in dataclasses.fields(class_obj):
+            field_info = cls._field_schema(hints.get(field.name, str))
             
             # Check for default value
-            if hasattr(class_obj, field_name):
-                field_info['default'] = getattr(class_obj, field_name)
-            
-            schema['properties'][field_name] = field_info
+            if field.default is not dataclasses.MISSING:
+                field_info['default'] = field.default
+            elif field.default_factory is not dataclasses.MISSING:
+                field_info['default'] = field.default_factory()
+            else:
+                schema['required'].append(field.name)
             
-            # Check if required (no default value)
-            if not hasattr(class_obj, field_name):
-                schema['required'].append(field_name)
+            schema['properties'][field.name] = field_info
         
         return schema
 
+    @classmethod
+    def _field_schema(cls, python_type) -> Dict[str, Any]:
+        field_info = {'type': cls._map_type(python_type)}
+        if typing.get_origin(python_type) is Union:
+            args = [t for t in python_type.__args__ if t is not type(None)]
+            python_type = args[0] if len(args) == 1 else python_type
+            field_info['nullable'] = True
+        if typing.get_origin(python_type) in (list, List):
+            item_type = (typing.get_args(python_type) or (str,))[0]
+            field_info['items'] = {'type': cls._map_type(item_type)}
+        return field_info
+
     @staticmethod
     def _map_type(python_type) -> str:
         """Map Python types to JSON schema types"""
@@ -84,10 +120,58 @@ class ToolRegistry:
         if hasattr(python_type, '__origin__') and python_type.__origin__ is Union:
             if type(None) in python_type.__args__:
                 actual_type = next(t for t in python_type.__args__ if t is not type(None))
-                return type_map.get(actual_type, 'string')
+                return ToolRegistry._map_type(actual_type)
+        
+        # List[str], Dict[str, Any], ...
+        origin = typing.get_origin(python_type)
+        if origin is not None:
+            return type_map.get(origin, 'string')
         
         return type_map.get(python_type, 'string')
 
+    @staticmethod
+    def validate(schema: Dict[str, Any], payload: Any) -> Dict[str, Any]:
+        """Check ``payload`` against a generated schema; returns it with defaults filled"""
+        if not isinstance(payload, dict):
+            raise ToolInputError({'__all__': 'expected an object'})
+        errors = {}
+        for name in payload:
+            if name not in schema['properties']:
+                errors[name] = 'unknown field'
+        for name in schema['required']:
+            if name not in payload:
+                errors[name] = 'this field is required'
+
+        checks = {
+            'string': lambda v: isinstance(v, str),
+            'integer': lambda v: isinstance(v, int) and not isinstance(v, bool),
+            'number': lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+            'boolean': lambda v: isinstance(v, bool),
+            'array': lambda v: isinstance(v, list),
+            'object': lambda v: isinstance(v, dict),
+        }
+        for name, value in payload.items():
+            field_info = schema['properties'].get(name)
+            if field_info is None:
+                continue
+            if value is None:
+                if not field_info.get('nullable'):
+                    errors[name] = 'may not be null'
+                continue
+            if not checks[field_info['type']](value):
+                errors[name] = f"expected {field_info['type']}"
+            elif 'items' in field_info and not all(checks[field_info['items']['type']](v) for v in value):
+                errors[name] = f"expected array of {field_info['items']['type']}"
+        if errors:
+            raise ToolInputError(errors)
+
+        values = {
+            name: list(info['default']) if isinstance(info.get('default'), list) else info['default']
+            for name, info in schema['properties'].items() if 'default' in info
+        }
+        values.update(payload)
+        return values
+
     def get_tool(self, name: str):
         """Get tool class by name"""
         return self._tools.get(name)
@@ -97,8 +181,15 @@ class ToolRegistry:
         return {
             name: {
                 'description': info['description'],
+                'max_concurrency': info['max_concurrency'],
+                'timeout': info['timeout'],
                 'config_schema': info['config_schema'],
                 'input_schema': info['input_schema']
             }
             for name, info in self._tools.items()
-        }
\ No newline at end of file
+        }
+
+
+# Default tools and their schemas are built once at import (ASGI boot preloads
+# the URLconf, which imports this) rather than by the first request to ask.
+ToolRegistry._register_default_tools()
@@ -0,0 +1,336 @@
+"""
+Author: Akshay NS
+Contains: Async execution runtime for registered tools (validation, pooled instances, per-tool limits, jobs)
+
+"""
+
+# backend/api/tools/tool_runtime.py
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field, is_dataclass
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import imaplib
+import inspect
+import logging
+import threading
+import time
+import uuid
+
+from .tool_registry import ToolInputError, ToolRegistry
+
+logger = logging.getLogger(__name__)
+
+# Idle tool instances (and their open connections) are closed after this
+INSTANCE_IDLE_SECONDS = 60.0
+# Finished jobs stay pollable for this long
+JOB_TTL_SECONDS = 60 * 60
+
+
+class UnknownToolError(LookupError):
+    pass
+
+
+@dataclass
+class ToolJob:
+    id: str
+    tool: str
+    owner_id: Optional[int] = None
+    status: str = 'pending'  # pending, running, succeeded, failed, timeout
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Any = None
+    error: Optional[str] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ('succeeded', 'failed', 'timeout')
+
+    def as_dict(self) -> Dict[str, Any]:
+        data = {
+            'job_id': self.id,
+            'tool': self.tool,
+            'status': self.status,
+            'created_at': datetime.fromtimestamp(self.created_at).isoformat(),
+            'started_at': datetime.fromtimestamp(self.started_at).isoformat() if self.started_at else None,
+            'finished_at': datetime.fromtimestamp(self.finished_at).isoformat() if self.finished_at else None,
+        }
+        if self.status == 'succeeded':
+            data['result'] = self.result
+        if self.error:
+            data['error'] = self.error
+        return data
+
+
+def to_jsonable(value: Any) -> Any:
+    """Tool results (dataclasses, datetimes, lists) as JSON-ready values"""
+    if is_dataclass(value) and not isinstance(value, type):
+        return to_jsonable(asdict(value))
+    if isinstance(value, dict):
+        return {str(key): to_jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(item) for item in value]
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return value.decode('utf-8', 'replace')
+    return value
+
+
+class ToolRuntime:
+    """Runs registered tools without tying up the caller.
+
+    All tool calls are scheduled on one event loop in a background thread:
+    per-tool ``asyncio.Semaphore`` limits (``max_concurrency``) and
+    ``timeout`` from the registry are enforced there. Tool methods wrap
+    blocking clients (imaplib), so each call body runs on a small thread
+    pool with its own loop; the runtime loop only coordinates.
+
+    Tool instances are pooled per (tool, config): an EmailFetchTool keeps
+    its logged-in IMAP session between calls and is closed after
+    ``INSTANCE_IDLE_SECONDS`` unused. An instance whose call failed or
+    timed out is discarded, never reused; a failed call on a pooled
+    instance is retried once on a fresh one if the session had broken.
+
+    Jobs live in this process only; poll them on the process that
+    accepted them.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, registry: Optional[ToolRegistry] = None, max_threads: int = 16):
+        self.registry = registry or ToolRegistry()
+        self._executor = ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix='tool')
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_lock = threading.Lock()
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._idle: Dict[Tuple[str, tuple], List[Tuple[Any, float]]] = defaultdict(list)
+        self._jobs: Dict[str, ToolJob] = {}
+
+    @classmethod
+    def instance(cls) -> 'ToolRuntime':
+        """Process-wide runtime shared by views and the agent loop"""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    # Entry points
+
+    def validate(self, name: str, config: Dict[str, Any],
+                 inputs: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Check config and inputs against the cached schemas (raises ToolInputError)"""
+        info = self._tool(name)
+        errors = {}
+        values = []
+        for prefix, schema, payload in (('config', info['config_schema'], config),
+                                        ('inputs', info['input_schema'], inputs)):
+            try:
+                values.append(ToolRegistry.validate(schema, payload if payload is not None else {}))
+            except ToolInputError as e:
+                errors.update({f"{prefix}.{key}": error for key, error in e.errors.items()})
+        if not errors:
+            for prefix, cls, payload in (('config', info['config_class'], values[0]),
+                                         ('inputs', info['input_class'], values[1])):
+                errors.update({f"{prefix}.{key}": error
+                               for key, error in _field_errors(cls, payload).items()})
+        if errors:
+            raise ToolInputError(errors)
+        return values[0], values[1]
+
+    def call(self, name: str, config: Dict[str, Any], inputs: Dict[str, Any]) -> Any:
+        """Run a tool from synchronous code and wait for its JSON-ready result"""
+        config_values, input_values = self.validate(name, config, inputs)
+        future = asyncio.run_coroutine_threadsafe(
+            self._execute(name, config_values, input_values), self._ensure_loop()
+        )
+        return future.result()
+
+    async def acall(self, name: str, config: Dict[str, Any], inputs: Dict[str, Any]) -> Any:
+        """Run a tool from any event loop (ASGI views, the agent loop)"""
+        config_values, input_values = self.validate(name, config, inputs)
+        future = asyncio.run_coroutine_threadsafe(
+            self._execute(name, config_values, input_values), self._ensure_loop()
+        )
+        return await asyncio.wrap_future(future)
+
+    def submit(self, name: str, config: Dict[str, Any], inputs: Dict[str, Any],
+               owner_id: Optional[int] = None) -> ToolJob:
+        """Start a tool call in the background and return its job for polling"""
+        config_values, input_values = self.validate(name, config, inputs)
+        self._prune_jobs()
+        job = ToolJob(id=uuid.uuid4().hex, tool=name, owner_id=owner_id)
+        self._jobs[job.id] = job
+        asyncio.run_coroutine_threadsafe(
+            self._run_job(job, config_values, input_values), self._ensure_loop()
+        )
+        return job
+
+    def get_job(self, job_id: str) -> Optional[ToolJob]:
+        return self._jobs.get(job_id)
+
+    def close(self):
+        """Close pooled tool instances and stop the loop"""
+        loop = self._loop
+        if loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._close_idle(force=True), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        self._loop = None
+
+    # Runtime loop
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._loop_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='tool-runtime', daemon=True).start()
+                self._loop = loop
+            return self._loop
+
+    def _tool(self, name: str) -> Dict[str, Any]:
+        info = self.registry.get_tool(name)
+        if info is None:
+            raise UnknownToolError(name)
+        return info
+
+    async def _run_job(self, job: ToolJob, config_values: Dict[str, Any],
+                       input_values: Dict[str, Any]):
+        job.status = 'running'
+        job.started_at = time.time()
+        try:
+            job.result = await self._execute(job.tool, config_values, input_values)
+            job.status = 'succeeded'
+        except asyncio.TimeoutError:
+            job.status = 'timeout'
+            job.error = f"{job.tool} did not finish within {self._tool(job.tool)['timeout']}s"
+        except Exception as e:
+            logger.warning(f"Tool job {job.id} ({job.tool}) failed: {str(e)}")
+            job.status = 'failed'
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+
+    async def _execute(self, name: str, config_values: Dict[str, Any],
+                       input_values: Dict[str, Any]) -> Any:
+        info = self._tool(name)
+        semaphore = self._semaphores.get(name)
+        if semaphore is None:
+            semaphore = self._semaphores[name] = asyncio.Semaphore(info['max_concurrency'])
+
+        await self._close_idle()
+        key = (name, tuple(sorted(config_values.items())))
+        tool, reused = None, False
+        for attempt in range(2):
+            await semaphore.acquire()
+            if tool is None:
+                tool, reused = self._acquire(key, info, config_values)
+            try:
+                result = await self._invoke(tool, info, input_values, semaphore)
+            except asyncio.TimeoutError:
+                raise
+            except Exception as e:
+                semaphore.release()
+                self._discard(tool)
+                # A pooled session may have been dropped by the server
+                # while idle: one retry on a fresh instance, but only for
+                # connection/protocol failures, never for the tool's own errors.
+                if attempt or not reused or not _is_connection_error(e):
+                    raise
+                tool, _ = self._acquire(None, info, config_values)
+                continue
+            semaphore.release()
+            self._idle[key].append((tool, time.monotonic()))
+            return to_jsonable(result)
+
+    async def _invoke(self, tool: Any, info: Dict[str, Any], input_values: Dict[str, Any],
+                      semaphore: asyncio.Semaphore) -> Any:
+        """Run the call on the thread pool, giving up waiting after the tool's timeout.
+
+        A thread cannot be interrupted, so on timeout it keeps running until
+        its blocking call returns (tool clients set socket timeouts for
+        this). Until then it keeps its concurrency slot, so
+        ``max_concurrency`` still bounds real sessions, and the instance is
+        closed only afterwards, never while the thread is still using it.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, _call_tool, tool, info, input_values)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), info['timeout'])
+        except asyncio.TimeoutError:
+            def finished(_):
+                self._discard(tool)
+                semaphore.release()
+            future.add_done_callback(finished)
+            raise
+
+    def _acquire(self, key: Optional[Tuple[str, tuple]], info: Dict[str, Any],
+                 config_values: Dict[str, Any]) -> Tuple[Any, bool]:
+        idle = self._idle.get(key) if key is not None else None
+        if idle:
+            tool, _ = idle.pop()
+            return tool, True
+        return info['class'](info['config_class'](**config_values)), False
+
+    def _discard(self, tool: Any):
+        # Only called once no thread is using the instance (see _invoke);
+        # imaplib sessions are not safe to touch from two threads.
+        self._executor.submit(_close_tool, tool)
+
+    async def _close_idle(self, force: bool = False):
+        cutoff = time.monotonic() - INSTANCE_IDLE_SECONDS
+        for key in list(self._idle):
+            keep = []
+            for tool, last_used in self._idle[key]:
+                if force or last_used < cutoff:
+                    self._discard(tool)
+                else:
+                    keep.append((tool, last_used))
+            if keep:
+                self._idle[key] = keep
+            else:
+                del self._idle[key]
+
+    def _prune_jobs(self):
+        cutoff = time.time() - JOB_TTL_SECONDS
+        for job_id, job in list(self._jobs.items()):
+            if job.done and job.finished_at < cutoff:
+                self._jobs.pop(job_id, None)
+
+
+def _field_errors(cls: Any, values: Dict[str, Any]) -> Dict[str, str]:
+    """Checks a config/input dataclass makes beyond its schema (``field_errors()``)"""
+    try:
+        instance = cls(**values)
+    except (TypeError, ValueError) as e:
+        return {'__all__': str(e)}
+    check = getattr(instance, 'field_errors', None)
+    return check() if check is not None else {}
+
+
+def _is_connection_error(error: BaseException) -> bool:
+    """Dropped or broken sessions, as opposed to bad inputs or tool logic errors"""
+    return isinstance(error, (OSError, EOFError, imaplib.IMAP4.abort))
+
+
+def _call_tool(tool: Any, info: Dict[str, Any], input_values: Dict[str, Any]) -> Any:
+    """Thread-pool body: build the inputs and run the tool method to completion"""
+    result = getattr(tool, info['method'])(info['input_class'](**input_values))
+    if inspect.iscoroutine(result):
+        result = asyncio.run(result)
+    return result
+
+
+def _close_tool(tool: Any):
+    disconnect = getattr(tool, 'disconnect', None) or getattr(tool, 'close', None)
+    if disconnect is None:
+        return
+    try:
+        result = disconnect()
+        if inspect.iscoroutine(result):
+            asyncio.run(result)
+    except Exception as e:
+        logger.debug(f"Error closing tool instance: {str(e)}")
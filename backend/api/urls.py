@@ -1,8 +1,17 @@
-from django.urls import path
-from .views import OllamaTestView, LandingView
+from django.urls import path, re_path
+from .views import (
+    OllamaTestView, LandingView, MetricsView, EmailDetailView, FollowUpSendView,
+    ToolListView, ToolInvokeView, ToolJobView
+)
 
 urlpatterns = [
     path('test-ollama/', OllamaTestView.as_view(), name='test-ollama'),
+    path('emails/<int:pk>/', EmailDetailView.as_view(), name='email-detail'),
+    path('followups/<int:pk>/send/', FollowUpSendView.as_view(), name='followup-send'),
+    path('tools/', ToolListView.as_view(), name='tool-list'),
+    path('tools/jobs/<str:job_id>/', ToolJobView.as_view(), name='tool-job'),
+    path('tools/<str:name>/invoke/', ToolInvokeView.as_view(), name='tool-invoke'),
+    re_path(r'^metrics/?$', MetricsView.as_view(), name='metrics'),
     path('', LandingView.as_view(), name='landing'),
     # ... your existing URLs ...
 ]
\ No newline at end of file
@@ -1,11 +1,19 @@
 from django.conf import settings
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.views import View
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from .models import FollowUpEmail, ProcessedEmail
+from .serializers import FollowUpEmailSerializer, ProcessedEmailSerializer
+from .services import metrics
 from .services.ollama_service import OllamaService
+from .services.smtp_sender import stale_sending
+from .tools.tool_registry import ToolInputError, ToolRegistry
+from .tools.tool_runtime import ToolRuntime, UnknownToolError
 import logging
-from dotenv import load_dotenv
-load_dotenv()
-import os
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +25,7 @@ class OllamaTestView(APIView):
             # Test direct generation
             simple_response = ollama.generate(
                 prompt="Explain quantum computing to a 5 year old",
+                call_site='test_ollama',
                 model=getattr(settings, 'OLLAMA_DEFAULT_MODEL', 'llava:latest')
             )
             
@@ -27,7 +36,8 @@ class OllamaTestView(APIView):
                         'role': 'user',
                         'content': "Explain quantum computing to a 5 year old"
                     }
-                ]
+                ],
+                call_site='test_ollama'
             )
             
             return Response({
@@ -56,4 +66,103 @@ class LandingView(APIView):
             'message': 'Welcome to the Email AI API',
             # 'documentation': 'https://docs.emailai.example.com',
             'status': 'API is running'
-        })           
\ No newline at end of file
+        })
+
+
+class EmailDetailView(APIView):
+    """Single email with its pre-generated reply draft, if any"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        processed_email = get_object_or_404(
+            ProcessedEmail.objects.prefetch_related('followups'),
+            pk=pk,
+            account__user=request.user,
+        )
+        return Response(ProcessedEmailSerializer(processed_email).data)
+
+
+class FollowUpSendView(APIView):
+    """Queue a draft follow-up for the background SMTP sender"""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, pk):
+        followup = get_object_or_404(
+            FollowUpEmail, pk=pk, original_email__account__user=request.user
+        )
+        # A 'sending' row whose sender died can be requeued once its claim expires
+        stuck = followup.status == 'sending' and stale_sending().filter(pk=followup.pk).exists()
+        if followup.status not in ('draft', 'error') and not stuck:
+            return Response({
+                'status': 'error',
+                'message': f"Follow-up is already {followup.status}"
+            }, status=409)
+        if 'content' in request.data:
+            followup.content = request.data['content']
+        followup.status = 'queued'
+        followup.error_message = None
+        followup.claimed_at = None
+        followup.save(update_fields=['content', 'status', 'error_message', 'claimed_at'])
+        return Response(FollowUpEmailSerializer(followup).data, status=202)
+
+
+class ToolListView(APIView):
+    """Registered tools with their config/input JSON schemas and limits"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response(ToolRegistry().list_tools())
+
+
+class ToolInvokeView(APIView):
+    """Run a tool: {"config": {...}, "inputs": {...}, "async": false}.
+
+    With ``"async": true`` the call runs in the background and a job id is
+    returned (202); poll GET /api/tools/jobs/<job_id>/ for the result.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, name):
+        runtime = ToolRuntime.instance()
+        config = request.data.get('config', {})
+        inputs = request.data.get('inputs', {})
+        try:
+            if request.data.get('async'):
+                job = runtime.submit(name, config, inputs, owner_id=request.user.pk)
+                data = job.as_dict()
+                data['status_url'] = request.build_absolute_uri(reverse('tool-job', args=[job.id]))
+                return Response(data, status=202)
+            result = runtime.call(name, config, inputs)
+        except UnknownToolError:
+            return Response({'status': 'error', 'message': f"Unknown tool {name}"}, status=404)
+        except ToolInputError as e:
+            return Response({'status': 'error', 'errors': e.errors}, status=400)
+        except TimeoutError:
+            return Response({'status': 'error', 'message': f"{name} timed out"}, status=504)
+        except Exception as e:
+            logger.error(f"Tool {name} failed: {str(e)}")
+            return Response({'status': 'error', 'message': str(e)}, status=502)
+        return Response({'status': 'success', 'result': result})
+
+
+class ToolJobView(APIView):
+    """Status (and result, once finished) of an async tool call"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, job_id):
+        job = ToolRuntime.instance().get_job(job_id)
+        if job is None or job.owner_id != request.user.pk:
+            return Response({'status': 'error', 'message': 'Unknown job'}, status=404)
+        return Response(job.as_dict())
+
+
+class MetricsView(View):
+    """Prometheus scrape endpoint for LLM and IMAP metrics.
+
+    A plain Django view: DRF content negotiation would reject the
+    ``text/plain;version=0.0.4`` Accept header Prometheus sends.
+    """
+
+    def get(self, request):
+        body, content_type = metrics.render_latest()
+        return HttpResponse(body, content_type=content_type)
@@ -0,0 +1,6 @@
+"""
+Author: Akshay NS
+Contains: End-to-end benchmark suite (fetch -> parse -> persist -> classify) with local IMAP and Ollama stand-ins
+
+Run from backend/:  python -m benchmarks --help
+"""
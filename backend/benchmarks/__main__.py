@@ -0,0 +1,124 @@
+"""
+Author: Akshay NS
+Contains: Command line runner that writes benchmark results as JSON
+
+Usage (from backend/):
+    python -m benchmarks --sizes 50,500 --scenarios fetch,parse --output results.json
+"""
+
+# backend/benchmarks/__main__.py
+from datetime import datetime, timezone
+from pathlib import Path
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+
+import django
+
+RESULTS_DIR = Path(__file__).resolve().parent / 'results'
+
+
+def _git(*args: str) -> str:
+    try:
+        return subprocess.run(
+            ['git', *args], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).resolve().parent,
+        ).stdout.strip()
+    except Exception:
+        return ''
+
+
+def _parse_args(argv, scenario_names):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', default=','.join(scenario_names),
+                        help=f"comma separated subset of: {', '.join(scenario_names)}")
+    parser.add_argument('--sizes', default='50,200', help='mailbox sizes, comma separated')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3, help='runs per scenario; fastest is reported')
+    parser.add_argument('--imap-latency', type=float, default=0.0,
+                        help='seconds added to every IMAP command')
+    parser.add_argument('--ollama-latency', type=float, default=0.0,
+                        help='fixed seconds added to every Ollama request')
+    parser.add_argument('--ollama-load', type=float, default=0.0,
+                        help='one-off model load time in seconds')
+    parser.add_argument('--prompt-tokens-per-sec', type=float, default=0.0,
+                        help='simulated prompt eval rate (0 = instant)')
+    parser.add_argument('--tokens-per-sec', type=float, default=0.0,
+                        help='simulated generation rate (0 = instant)')
+    parser.add_argument('--ollama-parallel', type=int, default=1)
+    parser.add_argument('--classify-limit', type=int, default=50)
+    parser.add_argument('--output', help='JSON file to write (default: benchmarks/results/<time>-<commit>.json)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+    django.setup()
+
+    from django.conf import settings
+    from django.core.management import call_command
+
+    from .fake_ollama import OllamaProfile
+    from .scenarios import SCENARIOS, BenchmarkConfig, run_scenarios
+
+    args = _parse_args(argv, list(SCENARIOS))
+    names = [name for name in args.scenarios.split(',') if name]
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        sys.exit(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    database = Path(settings.DATABASES['default']['NAME'])
+    if database.exists():
+        database.unlink()
+    call_command('migrate', verbosity=0)
+
+    profile = OllamaProfile(
+        latency=args.ollama_latency,
+        load_duration=args.ollama_load,
+        prompt_tokens_per_sec=args.prompt_tokens_per_sec,
+        tokens_per_sec=args.tokens_per_sec,
+        parallel=args.ollama_parallel,
+    )
+    results = []
+    for size in [int(size) for size in args.sizes.split(',') if size]:
+        config = BenchmarkConfig(
+            size=size,
+            seed=args.seed,
+            imap_latency=args.imap_latency,
+            ollama=profile,
+            classify_limit=args.classify_limit,
+        )
+        for result in run_scenarios(config, names, repeat=args.repeat):
+            results.append(result)
+            rate = result['items_per_sec']
+            print(f"{result['scenario']:<14} size={size:<6} {result['seconds']:>10.4f}s "
+                  f"{rate if rate is not None else '-':>12} items/s")
+
+    commit = _git('rev-parse', 'HEAD')
+    report = {
+        'commit': commit or None,
+        'dirty': bool(_git('status', '--porcelain')),
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'config': {key: value for key, value in vars(args).items() if key != 'output'},
+        'results': results,
+    }
+
+    if args.output:
+        output = Path(args.output)
+    else:
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')
+        output = RESULTS_DIR / f"{stamp}-{commit[:10] or 'nogit'}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"Results written to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Author: Akshay NS
+Contains: Process boot timing (manage.py, ASGI) in fresh interpreters, with the slowest imports from -X importtime
+
+"""
+
+# backend/benchmarks/cold_start.py
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+ASGI_BOOT = "import sys; from emailai.asgi import application; print('ollama' in sys.modules)"
+
+
+@dataclass
+class BootTarget:
+    label: str
+    argv: List[str]
+    settings: str = 'emailai.settings'
+
+
+# What an autoscaled replica or a worker pays before doing any work
+BOOT_TARGETS = [
+    BootTarget('asgi', ['-c', ASGI_BOOT]),
+    BootTarget('manage_check', ['manage.py', 'check']),
+    BootTarget('worker', ['manage.py', 'process_emails', '--help']),
+    BootTarget('worker_slim', ['manage.py', 'process_emails', '--help'], 'emailai.settings_worker'),
+]
+
+# "import time:       self [us] |  cumulative | imported package"
+_IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+\d+ \| +(\S+)$')
+
+
+def _run(target: BootTarget, *flags: str) -> Tuple[float, subprocess.CompletedProcess]:
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=target.settings)
+    start = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, *flags, *target.argv], cwd=BACKEND_DIR, env=env,
+        capture_output=True, text=True,
+    )
+    seconds = time.perf_counter() - start
+    if process.returncode != 0:
+        raise RuntimeError(f"{target.label} failed to boot: {process.stderr.strip()[-500:]}")
+    return seconds, process
+
+
+def boot_seconds(target: BootTarget, runs: int) -> List[float]:
+    """Wall time of ``runs`` fresh interpreters booting ``target`` (bytecode already compiled)"""
+    _run(target)  # warm the OS page cache and __pycache__
+    return [_run(target)[0] for _ in range(runs)]
+
+
+def slowest_imports(target: BootTarget, limit: int = 5) -> List[Dict[str, object]]:
+    """Packages that cost the most import time in one boot (self time of all their modules)"""
+    _, process = _run(target, '-X', 'importtime')
+    totals: Dict[str, int] = {}
+    for line in process.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            package = match.group(2).split('.')[0]
+            totals[package] = totals.get(package, 0) + int(match.group(1))
+    ordered = sorted(totals.items(), key=lambda item: item[1], reverse=True)[:limit]
+    return [{'package': name, 'ms': round(us / 1000, 1)} for name, us in ordered]
+
+
+def asgi_imports_ollama() -> Optional[bool]:
+    """True if booting ASGI pulls in the ollama client (it should be lazy)"""
+    _, process = _run(BOOT_TARGETS[0])
+    output = process.stdout.strip().splitlines()
+    return output[-1] == 'True' if output else None
+
+
+def measure(runs: int = 5) -> Dict[str, Dict[str, object]]:
+    results = {}
+    for target in BOOT_TARGETS:
+        samples = boot_seconds(target, runs)
+        results[target.label] = {
+            'settings': target.settings,
+            'median_seconds': round(statistics.median(samples), 4),
+            'min_seconds': round(min(samples), 4),
+            'slowest_imports': slowest_imports(target),
+        }
+    return results
@@ -0,0 +1,535 @@
+"""
+Author: Akshay NS
+Contains: Minimal in-process IMAP4rev1 server used as a local stand-in for benchmarks
+
+"""
+
+# backend/benchmarks/fake_imap.py
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from email.header import decode_header, make_header
+from email.parser import BytesHeaderParser
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Optional, Sequence, Set, Union
+import fnmatch
+import hashlib
+import re
+import socketserver
+import threading
+import time
+
+from api.tools.email_fetcher import EmailFetchConfig
+
+_GMAIL_TOKEN = re.compile(r'\s*(-?)(?:(\{)|(\})|(?:([a-z]+):)?("[^"]*"|[^\s{}]+))')
+_TOKEN = re.compile(r'\s*(?:"((?:[^"\\]|\\.)*)"|(\()|(\))|([^\s()"]+))')
+_LITERAL = re.compile(rb'\{(\d+)\}\r?\n$')
+_HEADER_PARSER = BytesHeaderParser()
+
+
+@dataclass
+class FakeMessage:
+    uid: int
+    raw: bytes
+    flags: Set[str] = field(default_factory=set)
+    _headers: Optional[object] = None
+
+    @property
+    def headers(self):
+        if self._headers is None:
+            self._headers = _HEADER_PARSER.parsebytes(self.raw)
+        return self._headers
+
+    def header(self, name: str) -> str:
+        value = self.headers.get(name, '')
+        try:
+            return str(make_header(decode_header(value)))
+        except Exception:
+            return str(value)
+
+    @property
+    def internal_date(self) -> datetime:
+        try:
+            return parsedate_to_datetime(self.headers.get('Date', ''))
+        except Exception:
+            return datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+    @property
+    def gm_msgid(self) -> int:
+        """Stable per Message-ID, so the same mail in two folders shares it"""
+        return _gm_id(self.headers.get('Message-ID') or str(self.uid))
+
+    @property
+    def gm_thrid(self) -> int:
+        references = (self.headers.get('References') or '').split()
+        return _gm_id(references[0] if references else self.headers.get('Message-ID') or str(self.uid))
+
+
+def _gm_id(value: str) -> int:
+    return int(hashlib.sha1(value.encode()).hexdigest()[:15], 16)
+
+
+class FakeIMAPServer:
+    """Serve fixed mailboxes over plain-text IMAP on 127.0.0.1.
+
+    Supports what ``imaplib`` needs for EmailFetchTool: LOGIN, CAPABILITY,
+    LIST, SELECT/EXAMINE, SEARCH, FETCH, STORE (plus their UID forms),
+    NOOP, CLOSE and LOGOUT. With ``gmail=True`` it advertises X-GM-EXT-1,
+    answers X-GM-MSGID/X-GM-THRID and evaluates X-GM-RAW searches. ``latency`` is added to every command to model
+    the round trip to a remote provider. ``max_connections`` refuses
+    LOGIN beyond that many open sessions, as Gmail does past 15, and a
+    FETCH in one of ``drop_mailboxes`` closes the connection mid-mailbox.
+    """
+
+    def __init__(self, mailboxes: Union[Dict[str, List[bytes]], List[bytes]],
+                 username: str = 'bench', password: str = 'bench',
+                 latency: float = 0.0, gmail: bool = False,
+                 special_use: Optional[Dict[str, str]] = None,
+                 max_connections: Optional[int] = None,
+                 drop_mailboxes: Sequence[str] = ()):
+        if not isinstance(mailboxes, dict):
+            mailboxes = {'INBOX': mailboxes}
+        self.mailboxes: Dict[str, List[FakeMessage]] = {
+            name: [FakeMessage(uid=index + 1, raw=raw) for index, raw in enumerate(raws)]
+            for name, raws in mailboxes.items()
+        }
+        self.username = username
+        self.password = password
+        self.latency = latency
+        self.gmail = gmail
+        # RFC 6154 flags advertised in LIST, e.g. {'[Gmail]/All Mail': '\\All'}
+        self.special_use = special_use or {}
+        self.max_connections = max_connections
+        self.drop_mailboxes = set(drop_mailboxes)
+        self.sessions = 0
+        self.lock = threading.Lock()
+        self.commands: Dict[str, int] = {}
+        self.bytes_sent = 0
+        self._server = None
+        self._thread = None
+
+    @property
+    def capabilities(self) -> List[str]:
+        capabilities = ['IMAP4rev1', 'UIDPLUS', 'AUTH=PLAIN']
+        if self.gmail:
+            capabilities.append('X-GM-EXT-1')
+        return capabilities
+
+    def start(self) -> 'FakeIMAPServer':
+        self._server = _ThreadingServer(('127.0.0.1', 0), _IMAPHandler)
+        self._server.fake = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @property
+    def address(self):
+        return self._server.server_address
+
+    def config(self, mailbox: str = 'INBOX') -> EmailFetchConfig:
+        host, port = self.address
+        return EmailFetchConfig(
+            imap_server=host,
+            username=self.username,
+            password=self.password,
+            port=port,
+            ssl=False,
+            mailbox=mailbox,
+        )
+
+    def count(self, command: str):
+        with self.lock:
+            self.commands[command] = self.commands.get(command, 0) + 1
+
+
+class _ThreadingServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _IMAPError(Exception):
+    pass
+
+
+class _Disconnect(Exception):
+    """Drop the connection without a tagged response"""
+
+
+class _IMAPHandler(socketserver.StreamRequestHandler):
+    # Responses go out in several small writes; without this every
+    # command pays a delayed-ACK stall that no real server has.
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.fake: FakeIMAPServer = self.server.fake
+        self.authenticated = False
+        self.selected: Optional[List[FakeMessage]] = None
+        self.selected_name: Optional[str] = None
+        self.read_only = False
+
+    def finish(self):
+        if self.authenticated:
+            with self.fake.lock:
+                self.fake.sessions -= 1
+        super().finish()
+
+    def handle(self):
+        self._send(f"* OK [CAPABILITY {' '.join(self.fake.capabilities)}] FakeIMAP ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            if not line.isascii():
+                # Quoted strings must be 7-bit; 8-bit text needs a literal
+                tag = line.split(b' ', 1)[0].decode('ascii', 'replace')
+                self._send(f"{tag} BAD 8-bit data outside a literal")
+                continue
+            line = self._read_literals(line)
+            line = line.rstrip(b'\r\n').decode('utf-8', 'replace')
+            tag, _, rest = line.partition(' ')
+            command, _, args = rest.partition(' ')
+            command = command.upper()
+            use_uid = False
+            if command == 'UID':
+                command, _, args = args.partition(' ')
+                command = command.upper()
+                use_uid = True
+
+            self.fake.count(command)
+            if self.fake.latency:
+                time.sleep(self.fake.latency)
+
+            handler = getattr(self, f"_cmd_{command.lower()}", None)
+            try:
+                if handler is None:
+                    raise _IMAPError(f"BAD unknown command {command}")
+                if command not in ('CAPABILITY', 'LOGIN', 'LOGOUT', 'NOOP') and not self.authenticated:
+                    raise _IMAPError('NO not authenticated')
+                handler(_tokenize(args), use_uid)
+                self._send(f"{tag} OK {command} completed")
+            except _Disconnect:
+                return
+            except _IMAPError as e:
+                self._send(f"{tag} {e}")
+            except Exception as e:
+                self._send(f"{tag} BAD {e}")
+            if command == 'LOGOUT':
+                return
+
+    def _read_literals(self, line: bytes) -> bytes:
+        """Inline {n} literals as quoted strings so _tokenize sees one line"""
+        while True:
+            match = _LITERAL.search(line)
+            if match is None:
+                return line
+            self._send('+ Ready for literal data')
+            data = self.rfile.read(int(match.group(1)))
+            quoted = _quote(data.decode('utf-8', 'replace')).encode('utf-8')
+            line = line[:match.start()] + quoted + self.rfile.readline()
+
+    def _send(self, line: Union[str, bytes]):
+        if isinstance(line, str):
+            line = line.encode('utf-8')
+        data = line + b'\r\n'
+        self.fake.bytes_sent += len(data)
+        self.wfile.write(data)
+
+    # Commands
+
+    def _cmd_capability(self, args, use_uid):
+        self._send(f"* CAPABILITY {' '.join(self.fake.capabilities)}")
+
+    def _cmd_noop(self, args, use_uid):
+        pass
+
+    def _cmd_logout(self, args, use_uid):
+        self._send('* BYE logging out')
+
+    def _cmd_login(self, args, use_uid):
+        if args[:2] != [self.fake.username, self.fake.password]:
+            raise _IMAPError('NO [AUTHENTICATIONFAILED] invalid credentials')
+        with self.fake.lock:
+            limit = self.fake.max_connections
+            if not self.authenticated and limit is not None and self.fake.sessions >= limit:
+                raise _IMAPError('NO [LIMIT] Too many simultaneous connections')
+            if not self.authenticated:
+                self.fake.sessions += 1
+        self.authenticated = True
+
+    def _cmd_list(self, args, use_uid):
+        pattern = args[1] if len(args) > 1 else '*'
+        glob = pattern.replace('%', '*')
+        parents = set()
+        for name in self.fake.mailboxes:
+            parts = name.split('/')
+            parents.update('/'.join(parts[:i]) for i in range(1, len(parts)))
+        for name in sorted(parents - set(self.fake.mailboxes)):
+            if fnmatch.fnmatchcase(name, glob):
+                self._send(f'* LIST (\\Noselect \\HasChildren) "/" {_quote(name)}')
+        for name in sorted(self.fake.mailboxes):
+            if fnmatch.fnmatchcase(name, glob):
+                flags = '\\HasChildren' if name in parents else '\\HasNoChildren'
+                if name in self.fake.special_use:
+                    flags += ' ' + self.fake.special_use[name]
+                self._send(f'* LIST ({flags}) "/" {_quote(name)}')
+
+    def _cmd_select(self, args, use_uid, read_only=False):
+        name = args[0] if args else ''
+        if name.upper() == 'INBOX':
+            name = next((n for n in self.fake.mailboxes if n.upper() == 'INBOX'), name)
+        if name not in self.fake.mailboxes:
+            raise _IMAPError(f'NO [NONEXISTENT] unknown mailbox {name}')
+        self.selected = self.fake.mailboxes[name]
+        self.selected_name = name
+        self.read_only = read_only
+        unseen = sum(1 for m in self.selected if '\\Seen' not in m.flags)
+        uid_next = self.selected[-1].uid + 1 if self.selected else 1
+        self._send(f"* {len(self.selected)} EXISTS")
+        self._send('* 0 RECENT')
+        self._send(f"* OK [UNSEEN {unseen}]")
+        self._send('* OK [UIDVALIDITY 1]')
+        self._send(f"* OK [UIDNEXT {uid_next}]")
+        self._send('* FLAGS (\\Answered \\Flagged \\Deleted \\Seen \\Draft)')
+
+    def _cmd_examine(self, args, use_uid):
+        self._cmd_select(args, use_uid, read_only=True)
+
+    def _cmd_close(self, args, use_uid):
+        self.selected = None
+        self.selected_name = None
+
+    def _cmd_search(self, args, use_uid):
+        messages = self._require_selected()
+        if args and str(args[0]).upper() == 'CHARSET':
+            args = args[2:]
+        matches = []
+        for seq, message in enumerate(messages, start=1):
+            if _matches_all(list(args), message, seq, messages, self.fake):
+                matches.append(message.uid if use_uid else seq)
+        self._send('* SEARCH' + ''.join(f" {n}" for n in matches))
+
+    def _cmd_fetch(self, args, use_uid):
+        messages = self._require_selected()
+        if self.selected_name in self.fake.drop_mailboxes:
+            raise _Disconnect()
+        items = args[1] if isinstance(args[1], list) else [args[1]]
+        items = [str(item).upper() for item in items]
+        for seq, message in self._resolve(args[0], messages, use_uid):
+            self._send_fetch(seq, message, items, use_uid)
+
+    def _cmd_store(self, args, use_uid):
+        messages = self._require_selected()
+        action = args[1].upper()
+        flags = args[2] if isinstance(args[2], list) else args[2:]
+        for seq, message in self._resolve(args[0], messages, use_uid):
+            with self.fake.lock:
+                if action.startswith('+'):
+                    message.flags.update(flags)
+                elif action.startswith('-'):
+                    message.flags.difference_update(flags)
+                else:
+                    message.flags = set(flags)
+            if not action.endswith('.SILENT'):
+                uid = f"UID {message.uid} " if use_uid else ''
+                self._send(f"* {seq} FETCH ({uid}FLAGS ({' '.join(sorted(message.flags))}))")
+
+    # Helpers
+
+    def _require_selected(self) -> List[FakeMessage]:
+        if self.selected is None:
+            raise _IMAPError('NO no mailbox selected')
+        return self.selected
+
+    def _resolve(self, sequence_set: str, messages: List[FakeMessage], use_uid: bool):
+        numbers = _parse_set(sequence_set, messages[-1].uid if use_uid and messages else len(messages))
+        for seq, message in enumerate(messages, start=1):
+            if (message.uid if use_uid else seq) in numbers:
+                yield seq, message
+
+    def _send_fetch(self, seq: int, message: FakeMessage, items: List[str], use_uid: bool):
+        if 'ALL' in items or 'FAST' in items:
+            items = items + ['FLAGS', 'RFC822.SIZE']
+        simple = []
+        if use_uid or 'UID' in items:
+            simple.append(f"UID {message.uid}")
+        if 'FLAGS' in items:
+            simple.append(f"FLAGS ({' '.join(sorted(message.flags))})")
+        if 'RFC822.SIZE' in items:
+            simple.append(f"RFC822.SIZE {len(message.raw)}")
+        if self.fake.gmail and 'X-GM-MSGID' in items:
+            simple.append(f"X-GM-MSGID {message.gm_msgid}")
+        if self.fake.gmail and 'X-GM-THRID' in items:
+            simple.append(f"X-GM-THRID {message.gm_thrid}")
+
+        literals = []
+        for item in items:
+            name, payload = _fetch_literal(item, message.raw)
+            if name is None:
+                continue
+            literals.append((name, payload))
+            if not self.read_only and '.PEEK' not in item and item != 'RFC822.HEADER':
+                with self.fake.lock:
+                    message.flags.add('\\Seen')
+
+        if not literals:
+            self._send(f"* {seq} FETCH ({' '.join(simple)})")
+            return
+
+        prefix = f"* {seq} FETCH (" + ''.join(f"{part} " for part in simple)
+        chunks = []
+        for index, (name, payload) in enumerate(literals):
+            lead = prefix if index == 0 else ' '
+            chunks.append(f"{lead}{name} {{{len(payload)}}}\r\n".encode() + payload)
+        self._send(b''.join(chunks) + b')')
+
+
+def _fetch_literal(item: str, raw: bytes):
+    header_end = raw.find(b'\r\n\r\n')
+    header_end = len(raw) if header_end < 0 else header_end + 4
+    if item in ('RFC822', 'BODY[]', 'BODY.PEEK[]'):
+        return ('RFC822' if item == 'RFC822' else 'BODY[]'), raw
+    if item in ('RFC822.HEADER', 'BODY[HEADER]', 'BODY.PEEK[HEADER]'):
+        return ('RFC822.HEADER' if item == 'RFC822.HEADER' else 'BODY[HEADER]'), raw[:header_end]
+    if item in ('RFC822.TEXT', 'BODY[TEXT]', 'BODY.PEEK[TEXT]'):
+        return ('RFC822.TEXT' if item == 'RFC822.TEXT' else 'BODY[TEXT]'), raw[header_end:]
+    return None, None
+
+
+def _tokenize(text: str) -> list:
+    """Split IMAP arguments into atoms, strings and nested lists"""
+    stack = [[]]
+    for quoted, open_paren, close_paren, atom in _TOKEN.findall(text):
+        if open_paren:
+            stack.append([])
+        elif close_paren:
+            group = stack.pop()
+            stack[-1].append(group)
+        elif atom:
+            stack[-1].append(atom)
+        else:
+            stack[-1].append(re.sub(r'\\(.)', r'\1', quoted))
+    return stack[0]
+
+
+def _quote(value: str) -> str:
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def _parse_set(sequence_set: str, maximum: int) -> Set[int]:
+    numbers = set()
+    for part in str(sequence_set).split(','):
+        start, _, end = part.partition(':')
+        start = maximum if start == '*' else int(start)
+        end = start if not end else (maximum if end == '*' else int(end))
+        numbers.update(range(min(start, end), max(start, end) + 1))
+    return numbers
+
+
+def _imap_date(value: str) -> datetime:
+    return datetime.strptime(value, '%d-%b-%Y').replace(tzinfo=timezone.utc)
+
+
+def _matches_all(keys: list, message: FakeMessage, seq: int,
+                 messages: List[FakeMessage], fake: FakeIMAPServer) -> bool:
+    while keys:
+        if not _matches_one(keys, message, seq, messages, fake):
+            return False
+    return True
+
+
+def _matches_one(keys: list, message: FakeMessage, seq: int,
+                 messages: List[FakeMessage], fake: FakeIMAPServer) -> bool:
+    """Consume one search key (with its arguments) from ``keys``"""
+    key = keys.pop(0)
+    if isinstance(key, list):
+        return _matches_all(list(key), message, seq, messages, fake)
+
+    upper = key.upper()
+    if upper == 'ALL':
+        return True
+    if upper in ('SEEN', 'UNSEEN', 'ANSWERED', 'UNANSWERED', 'FLAGGED', 'UNFLAGGED', 'DELETED', 'UNDELETED'):
+        negate = upper.startswith('UN')
+        flag = '\\' + (upper[2:] if negate else upper).capitalize()
+        return (flag in message.flags) != negate
+    if upper == 'NOT':
+        return not _matches_one(keys, message, seq, messages, fake)
+    if upper == 'OR':
+        left = _matches_one(keys, message, seq, messages, fake)
+        right = _matches_one(keys, message, seq, messages, fake)
+        return left or right
+    if upper in ('SINCE', 'BEFORE', 'ON'):
+        day = message.internal_date.astimezone(timezone.utc).date()
+        target = _imap_date(keys.pop(0)).date()
+        return {'SINCE': day >= target, 'BEFORE': day < target, 'ON': day == target}[upper]
+    if upper in ('FROM', 'TO', 'CC', 'SUBJECT'):
+        return keys.pop(0).lower() in message.header(upper.capitalize()).lower()
+    if upper == 'HEADER':
+        name = keys.pop(0)
+        return keys.pop(0).lower() in message.header(name).lower()
+    if upper in ('BODY', 'TEXT'):
+        return keys.pop(0).lower().encode() in message.raw.lower()
+    if upper == 'LARGER':
+        return len(message.raw) > int(keys.pop(0))
+    if upper == 'SMALLER':
+        return len(message.raw) < int(keys.pop(0))
+    if upper == 'X-GM-RAW' and fake.gmail:
+        return _gmail_matches(keys.pop(0), message)
+    if upper == 'UID':
+        return message.uid in _parse_set(keys.pop(0), messages[-1].uid if messages else 0)
+    if re.fullmatch(r'[\d:,*]+', key):
+        return seq in _parse_set(key, len(messages))
+    raise _IMAPError(f"BAD unsupported search key {key}")
+
+
+def _gmail_matches(query: str, message: FakeMessage) -> bool:
+    """Evaluate the subset of Gmail search syntax that search_filters emits.
+
+    Terms are ANDed, ``{a b}`` is an OR group and ``-term`` negates.
+    """
+    stack = [('and', False, [])]
+    for negate, open_brace, close_brace, operator, value in _GMAIL_TOKEN.findall(query):
+        if open_brace:
+            stack.append(('or', bool(negate), []))
+            continue
+        if close_brace:
+            _, group_negate, results = stack.pop()
+            stack[-1][2].append(any(results) != group_negate)
+            continue
+        result = _gmail_term(operator, value.strip('"').lower(), message)
+        stack[-1][2].append(result != bool(negate))
+    return all(stack[0][2])
+
+
+def _gmail_size(value: str) -> int:
+    units = {'k': 1024, 'm': 1024 * 1024}
+    if value[-1:] in units:
+        return int(value[:-1]) * units[value[-1]]
+    return int(value)
+
+
+def _gmail_term(operator: str, value: str, message: FakeMessage) -> bool:
+    if operator in ('after', 'before'):
+        target = datetime.strptime(value, '%Y/%m/%d').date()
+        day = message.internal_date.astimezone(timezone.utc).date()
+        return day >= target if operator == 'after' else day < target
+    if operator == 'is':
+        return ('\\Seen' in message.flags) == (value == 'read')
+    if operator in ('from', 'to', 'subject'):
+        return value in message.header(operator.capitalize()).lower()
+    if operator == 'larger':
+        return len(message.raw) > _gmail_size(value)
+    if operator == 'smaller':
+        return len(message.raw) < _gmail_size(value)
+    return value.encode() in message.raw.lower()
@@ -0,0 +1,202 @@
+"""
+Author: Akshay NS
+Contains: Deterministic fake Ollama HTTP server with configurable latency and token rates
+
+"""
+
+# backend/benchmarks/fake_ollama.py
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+import hashlib
+import json
+import threading
+import time
+
+# Keyword -> (category, priority, needs_reply) used to fake classification
+# answers so downstream stages see a realistic mix.
+_CLASSIFY_RULES = [
+    ('offer', ('offer', 9, True)),
+    ('interview', ('interview', 8, True)),
+    ('next steps', ('follow_up', 6, True)),
+    ('unfortunately', ('rejection', 3, False)),
+    ('thanks for applying', ('other', 2, False)),
+    ('newsletter', ('newsletter', 0, False)),
+    ('digest', ('newsletter', 0, False)),
+    ('% off', ('spam', 0, False)),
+]
+_WORDS = (
+    'thank you for reaching out I am available next week and happy to '
+    'discuss the role further please let me know what works best'
+).split()
+
+
+@dataclass
+class OllamaProfile:
+    """Timing model for the fake server; defaults resemble a 7B model on a laptop GPU"""
+    latency: float = 0.0  # fixed per-request overhead, seconds
+    load_duration: float = 0.0  # paid once per model, like a cold load
+    prompt_tokens_per_sec: float = 2000.0
+    tokens_per_sec: float = 40.0
+    response_tokens: int = 48
+    # Concurrent requests served at full speed (OLLAMA_NUM_PARALLEL);
+    # further requests queue behind them.
+    parallel: int = 1
+    embedding_size: int = 64
+
+
+class FakeOllamaServer:
+    """Serve /api/generate, /api/chat, /api/embeddings and /api/tags on 127.0.0.1.
+
+    Responses are a pure function of the request, and durations in the
+    response body follow ``profile`` so OllamaService metrics look real.
+    Set every rate in ``profile`` to 0 to turn simulated time off.
+    """
+
+    def __init__(self, profile: Optional[OllamaProfile] = None):
+        self.profile = profile or OllamaProfile()
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._loaded = set()
+        self._lock = threading.Lock()
+        self._slots = threading.Semaphore(self.profile.parallel)
+        self._server = None
+        self._thread = None
+
+    def start(self) -> 'FakeOllamaServer':
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), _OllamaHandler)
+        self._server.daemon_threads = True
+        self._server.fake = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def complete(self, model: str, prompt: str, json_format: bool) -> Dict[str, Any]:
+        """Produce a response body and sleep for the simulated duration"""
+        profile = self.profile
+        prompt_tokens = max(1, len(prompt.split()))
+        text = _classification(prompt) if json_format else _reply(prompt, profile.response_tokens)
+        completion_tokens = max(1, len(text.split()))
+
+        with self._lock:
+            cold = model not in self._loaded
+            self._loaded.add(model)
+            self.requests += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+
+        load = profile.load_duration if cold else 0.0
+        prompt_eval = prompt_tokens / profile.prompt_tokens_per_sec if profile.prompt_tokens_per_sec else 0.0
+        eval_time = completion_tokens / profile.tokens_per_sec if profile.tokens_per_sec else 0.0
+
+        start = time.perf_counter()
+        with self._slots:
+            time.sleep(profile.latency + load + prompt_eval + eval_time)
+        total = time.perf_counter() - start
+
+        return {
+            'model': model,
+            'created_at': '2025-01-01T00:00:00Z',
+            'done': True,
+            'done_reason': 'stop',
+            'text': text,
+            'total_duration': int(total * 1e9),
+            'load_duration': int(load * 1e9),
+            'prompt_eval_count': prompt_tokens,
+            'prompt_eval_duration': int(prompt_eval * 1e9),
+            'eval_count': completion_tokens,
+            'eval_duration': int(eval_time * 1e9),
+        }
+
+    def embed(self, text: str):
+        digest = hashlib.sha256(text.encode()).digest()
+        size = self.profile.embedding_size
+        return [(digest[i % len(digest)] - 128) / 128 for i in range(size)]
+
+
+class _OllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == '/api/tags':
+            self._json({'models': [{'name': name} for name in sorted(self.server.fake._loaded)]})
+        elif self.path == '/api/version':
+            self._json({'version': '0.0.0-fake'})
+        else:
+            self._json({'error': 'not found'}, status=404)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        request = json.loads(self.rfile.read(length) or b'{}')
+        fake: FakeOllamaServer = self.server.fake
+        model = request.get('model', 'fake')
+        json_format = request.get('format') == 'json'
+
+        if self.path == '/api/generate':
+            result = fake.complete(model, request.get('prompt', ''), json_format)
+            result['response'] = result.pop('text')
+            self._json(result)
+        elif self.path == '/api/chat':
+            prompt = '\n'.join(m.get('content', '') for m in request.get('messages', []))
+            result = fake.complete(model, prompt, json_format)
+            result['message'] = {'role': 'assistant', 'content': result.pop('text')}
+            self._json(result)
+        elif self.path == '/api/embeddings':
+            self._json({'embedding': fake.embed(request.get('prompt', ''))})
+        elif self.path == '/api/embed':
+            inputs = request.get('input', '')
+            inputs = inputs if isinstance(inputs, list) else [inputs]
+            self._json({'model': model, 'embeddings': [fake.embed(text) for text in inputs]})
+        else:
+            self._json({'error': 'not found'}, status=404)
+
+    def _json(self, payload: Dict[str, Any], status: int = 200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def _classification(prompt: str) -> str:
+    # Only look at the email itself, not the instructions around it
+    lowered = prompt[prompt.find('Subject:'):].lower()
+    category, priority, needs_reply = 'other', 1, False
+    for keyword, rule in _CLASSIFY_RULES:
+        if keyword in lowered:
+            category, priority, needs_reply = rule
+            break
+    return json.dumps({
+        'category': category,
+        'priority': priority,
+        'needs_reply': needs_reply,
+        'summary': f"Synthetic {category} email.",
+    })
+
+
+def _reply(prompt: str, tokens: int) -> str:
+    seed = int(hashlib.sha256(prompt.encode()).hexdigest()[:8], 16)
+    return ' '.join(_WORDS[(seed + i * 7) % len(_WORDS)] for i in range(tokens))
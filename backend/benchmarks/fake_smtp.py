@@ -0,0 +1,117 @@
+"""
+Author: Akshay NS
+Contains: Local aiosmtpd stand-in for exercising the follow-up SMTP sender
+
+"""
+
+# backend/benchmarks/fake_smtp.py
+from typing import List, Optional
+import asyncio
+import logging
+import socket
+import threading
+import warnings
+
+from aiosmtpd.controller import Controller
+from aiosmtpd.smtp import AuthResult, LoginPassword
+
+# Plain-text AUTH on loopback is the point of the stand-in; keep it quiet
+warnings.filterwarnings('ignore', message='Requiring AUTH while not requiring TLS')
+logging.getLogger('mail.log').setLevel(logging.ERROR)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class _Handler:
+    def __init__(self, fake: 'FakeSMTPServer'):
+        self.fake = fake
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        with self.fake.lock:
+            self.fake.sessions += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        fake = self.fake
+        if fake.latency:
+            await asyncio.sleep(fake.latency)
+        with fake.lock:
+            fake.attempts += 1
+            if fake.fail_every and fake.attempts % fake.fail_every == 0:
+                return fake.fail_reply
+            fake.messages.append(envelope.content)
+        return '250 Message accepted for delivery'
+
+
+class _Authenticator:
+    def __init__(self, fake: 'FakeSMTPServer'):
+        self.fake = fake
+
+    def __call__(self, server, session, envelope, mechanism, auth_data):
+        if isinstance(auth_data, LoginPassword) and (
+            auth_data.login.decode() == self.fake.username
+            and auth_data.password.decode() == self.fake.password
+        ):
+            return AuthResult(success=True)
+        return AuthResult(success=False, handled=False)
+
+
+class FakeSMTPServer:
+    """aiosmtpd server on 127.0.0.1 that records accepted messages.
+
+    ``fail_every=N`` answers every Nth DATA with ``fail_reply`` (a 4xx by
+    default) to exercise retries; ``sessions`` counts EHLOs, i.e. how
+    many connections the sender opened.
+    """
+
+    def __init__(self, username: Optional[str] = 'candidate@bench.local',
+                 password: Optional[str] = 'bench', latency: float = 0.0,
+                 fail_every: int = 0, fail_reply: str = '451 4.3.0 Try again later'):
+        self.username = username
+        self.password = password
+        self.latency = latency
+        self.fail_every = fail_every
+        self.fail_reply = fail_reply
+        self.messages: List[bytes] = []
+        self.sessions = 0
+        self.attempts = 0
+        self.lock = threading.Lock()
+        self.port = None
+        self._controller = None
+
+    def start(self) -> 'FakeSMTPServer':
+        self.port = _free_port()
+        options = {}
+        if self.username is not None:
+            options = {
+                'authenticator': _Authenticator(self),
+                'auth_required': True,
+                'auth_require_tls': False,
+            }
+        self._controller = Controller(
+            _Handler(self), hostname='127.0.0.1', port=self.port, **options
+        )
+        self._controller.start()
+        return self
+
+    def stop(self):
+        if self._controller:
+            self._controller.stop()
+            self._controller = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def configure(self, account):
+        """Point an EmailAccount at this server"""
+        account.smtp_server = '127.0.0.1'
+        account.smtp_port = self.port
+        account.save(update_fields=['smtp_server', 'smtp_port'])
@@ -0,0 +1,267 @@
+"""
+Author: Akshay NS
+Contains: Deterministic synthetic mailbox generator for benchmarks
+
+"""
+
+# backend/benchmarks/mailbox.py
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from email.header import Header
+from email.message import EmailMessage
+from email.policy import SMTP
+from email.utils import format_datetime
+from typing import Dict, List
+import base64
+import random
+import unicodedata
+
+# Relative frequency of each MIME shape in a generated mailbox
+DEFAULT_SHAPES = {
+    'plain': 4,
+    'alternative': 3,  # multipart/alternative text + html
+    'html': 2,  # text/html only, common for ATS notifications
+    'attachment': 1,  # text body plus a PDF attachment
+}
+
+JOB_SUBJECTS = [
+    'Interview invitation: {role} at {company}',
+    'Your application to {company}',
+    'Next steps for the {role} position',
+    'Offer letter - {role}',
+    'Unfortunately, we will not be moving forward',
+    'Thanks for applying to {company}',
+    'Scheduling your technical interview with {company}',
+]
+OTHER_SUBJECTS = [
+    'Weekly digest: {count} new posts',
+    'Your order has shipped',
+    '{company} newsletter - {month} edition',
+    'Lunch on Friday?',
+    'Security alert for your account',
+    'Limited time offer: {count}% off',
+]
+ROLES = ['Backend Engineer', 'Data Scientist', 'ML Engineer', 'Product Designer', 'SRE']
+COMPANIES = ['Acme', 'Globex', 'Initech', 'Umbrella', 'Hooli', 'Zürich Réassurance', 'Søren & Co']
+FIRST_NAMES = ['Alex', 'Sam', 'Priya', 'Jürgen', 'Mei', 'Olu', 'Zoë', 'Rahul']
+WORDS = (
+    'thank you for your interest in the role we would like to invite you '
+    'to discuss your experience with our team please let us know your '
+    'availability next week regards the hiring committee reviewed every '
+    'application carefully and the schedule includes a coding exercise'
+).split()
+
+# Date header shapes seen in the wild; the fetcher must cope with all of them
+DATE_STYLES = ['rfc2822', 'no_weekday', 'utc_comment', 'gmt', 'single_digit_day']
+
+
+@dataclass
+class MailboxSpec:
+    size: int = 100
+    seed: int = 0
+    job_ratio: float = 0.4
+    # Probability that a message replies to an earlier one, and how deep
+    # a reply chain may grow before a new thread is started.
+    reply_ratio: float = 0.3
+    max_thread_depth: int = 4
+    body_words: int = 120
+    encoded_header_ratio: float = 0.2
+    shapes: Dict[str, int] = field(default_factory=lambda: dict(DEFAULT_SHAPES))
+    start: datetime = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+@dataclass
+class _Thread:
+    subject: str
+    message_ids: List[str]
+
+
+def generate_mailbox(spec: MailboxSpec) -> List[bytes]:
+    """Generate ``spec.size`` raw RFC822 messages, identical for the same spec"""
+    rng = random.Random(spec.seed)
+    shape_names = list(spec.shapes)
+    shape_weights = [spec.shapes[name] for name in shape_names]
+    threads: List[_Thread] = []
+    messages = []
+
+    for index in range(spec.size):
+        sent_at = spec.start + timedelta(minutes=37 * index + rng.randint(0, 30))
+        is_job = rng.random() < spec.job_ratio
+        open_threads = [t for t in threads if len(t.message_ids) < spec.max_thread_depth]
+
+        if open_threads and rng.random() < spec.reply_ratio:
+            thread = rng.choice(open_threads)
+            subject = f"Re: {thread.subject}"
+        else:
+            thread = _Thread(subject=_subject(rng, is_job), message_ids=[])
+            threads.append(thread)
+            subject = thread.subject
+
+        message_id = f"<{spec.seed}.{index}@bench.local>"
+        sender_name = rng.choice(FIRST_NAMES)
+        company = rng.choice(COMPANIES)
+        address = f"{_ascii(sender_name)}@{_ascii(company.split()[0])}.com"
+        encode_words = rng.random() < spec.encoded_header_ratio
+
+        headers = [
+            ('Message-ID', message_id),
+            ('Date', _date_header(rng, sent_at)),
+            ('From', f"{_word(sender_name + ' at ' + company, encode_words)} <{address}>"),
+            ('To', 'candidate@bench.local'),
+            ('Subject', _word(subject, encode_words)),
+        ]
+        if thread.message_ids:
+            headers.append(('In-Reply-To', thread.message_ids[-1]))
+            headers.append(('References', ' '.join(thread.message_ids)))
+        thread.message_ids.append(message_id)
+
+        # Build the MIME body with the email package, but write the
+        # envelope headers by hand so their encoding is under our control.
+        body = EmailMessage()
+        text = _body(rng, spec.body_words, sender_name)
+        shape = rng.choices(shape_names, shape_weights)[0]
+        _set_body(body, shape, text, rng)
+        if body.is_multipart():
+            # The generator would otherwise pick a random boundary
+            body.set_boundary(f"==bench.{spec.seed}.{index}==")
+        raw_headers = ''.join(f"{name}: {value}\r\n" for name, value in headers)
+        messages.append(raw_headers.encode('ascii') + body.as_bytes(policy=SMTP))
+
+    return messages
+
+
+def _subject(rng: random.Random, is_job: bool) -> str:
+    template = rng.choice(JOB_SUBJECTS if is_job else OTHER_SUBJECTS)
+    return template.format(
+        role=rng.choice(ROLES),
+        company=rng.choice(COMPANIES),
+        count=rng.randint(2, 60),
+        month=rng.choice(['January', 'February', 'March']),
+    )
+
+
+def _ascii(value: str) -> str:
+    folded = unicodedata.normalize('NFKD', value).encode('ascii', 'ignore')
+    return folded.decode().lower()
+
+
+def _word(value: str, force: bool) -> str:
+    """RFC 2047-encode non-ASCII values, or any value when forced"""
+    if force or not value.isascii():
+        return Header(value, 'utf-8').encode(linesep='\r\n')
+    return value
+
+
+def _date_header(rng: random.Random, sent_at: datetime) -> str:
+    style = rng.choice(DATE_STYLES)
+    if style == 'no_weekday':
+        return sent_at.strftime('%d %b %Y %H:%M:%S +0000')
+    if style == 'utc_comment':
+        return format_datetime(sent_at) + ' (UTC)'
+    if style == 'gmt':
+        return format_datetime(sent_at, usegmt=True)
+    if style == 'single_digit_day':
+        return sent_at.strftime('%a, ') + str(sent_at.day) + sent_at.strftime(' %b %Y %H:%M:%S -0000')
+    return format_datetime(sent_at)
+
+
+def _body(rng: random.Random, words: int, sender_name: str) -> str:
+    count = max(10, int(rng.gauss(words, words / 3)))
+    lines = []
+    for start in range(0, count, 12):
+        lines.append(' '.join(rng.choice(WORDS) for _ in range(min(12, count - start))))
+    return 'Hi,\n\n' + '\n'.join(lines) + f'\n\nBest,\n{sender_name}\n'
+
+
+# Header shapes for the header-normalisation benchmark, as seen from
+# real providers, ATS platforms and older mail clients.
+SUBJECT_SHAPES = ['ascii', 'q_utf8', 'b_utf8', 'latin1', 'split_words', 'folded', 'raw_8bit']
+FROM_SHAPES = ['name_addr', 'quoted_comma', 'encoded_name', 'bare', 'angle_only', 'comment']
+DATE_CORPUS_STYLES = DATE_STYLES + ['named_zone', 'two_digit_year', 'no_seconds', 'offset_comment']
+
+
+def generate_header_corpus(size: int, seed: int = 0) -> List[Dict[str, str]]:
+    """Raw Subject/From/Date values covering ``*_SHAPES``, identical for the same seed"""
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    corpus = []
+    for index in range(size):
+        sent_at = start + timedelta(minutes=37 * index + rng.randint(0, 30))
+        subject = _subject(rng, rng.random() < 0.5)
+        name = f"{rng.choice(FIRST_NAMES)} at {rng.choice(COMPANIES)}"
+        address = f"{_ascii(name.split()[0])}@{_ascii(name.split()[-1])}.com"
+        corpus.append({
+            'Subject': _corpus_subject(rng.choice(SUBJECT_SHAPES), subject),
+            'From': _corpus_from(rng.choice(FROM_SHAPES), name, address),
+            'Date': _corpus_date(rng.choice(DATE_CORPUS_STYLES), rng, sent_at),
+        })
+    return corpus
+
+
+def _corpus_subject(shape: str, subject: str) -> str:
+    if shape == 'q_utf8':
+        return Header(subject, 'utf-8').encode()
+    if shape == 'b_utf8':
+        encoded = base64.b64encode(subject.encode('utf-8')).decode('ascii')
+        return f"=?UTF-8?B?{encoded}?="
+    if shape == 'latin1':
+        return Header(subject + ' café', 'iso-8859-1').encode()
+    if shape == 'split_words':
+        half = len(subject) // 2
+        return Header(subject[:half], 'utf-8').encode() + '\r\n ' + Header(subject[half:], 'utf-8').encode()
+    if shape == 'folded':
+        words = subject.split()
+        return ' '.join(words[:3]) + '\r\n\t' + ' '.join(words[3:])
+    if shape == 'raw_8bit':
+        # Undeclared UTF-8, as the compat32 parser hands it back
+        return (subject + ' – Zoë').encode('utf-8').decode('ascii', 'surrogateescape')
+    return _ascii(subject) if not subject.isascii() else subject
+
+
+def _corpus_from(shape: str, name: str, address: str) -> str:
+    if shape == 'quoted_comma':
+        last, first = name.split(' at ')[::-1]
+        return f'"{_ascii(last)}, {_ascii(first)}" <{address}>'
+    if shape == 'encoded_name':
+        return f"{Header(name, 'utf-8').encode()} <{address}>"
+    if shape == 'bare':
+        return address
+    if shape == 'angle_only':
+        return f"<{address}>"
+    if shape == 'comment':
+        return f"{address} ({_ascii(name)})"
+    return f"{_ascii(name)} <{address}>"
+
+
+def _corpus_date(style: str, rng: random.Random, sent_at: datetime) -> str:
+    if style == 'named_zone':
+        local = sent_at - timedelta(hours=5)
+        return local.strftime('%a, %d %b %Y %H:%M:%S EST')
+    if style == 'two_digit_year':
+        return sent_at.strftime('%a, %d %b %y %H:%M:%S +0000')
+    if style == 'no_seconds':
+        return sent_at.strftime('%a, %d %b %Y %H:%M +0000')
+    if style == 'offset_comment':
+        local = sent_at.astimezone(timezone(timedelta(hours=1)))
+        return format_datetime(local) + ' (CET)'
+    return _date_header(rng, sent_at)
+
+
+def _set_body(message: EmailMessage, shape: str, text: str, rng: random.Random):
+    html = '<html><body>' + ''.join(
+        f'<p>{line}</p>' for line in text.splitlines() if line
+    ) + '</body></html>'
+
+    if shape == 'html':
+        message.set_content(html, subtype='html')
+    elif shape == 'alternative':
+        message.set_content(text)
+        message.add_alternative(html, subtype='html')
+    elif shape == 'attachment':
+        message.set_content(text)
+        message.add_attachment(
+            rng.randbytes(rng.randint(2_000, 20_000)),
+            maintype='application', subtype='pdf', filename='resume.pdf'
+        )
+    else:
+        message.set_content(text)
@@ -0,0 +1,20 @@
+"""
+Author: Akshay NS
+Contains: Django settings for benchmark runs, backed by a throwaway SQLite database
+
+"""
+
+# backend/benchmarks/settings.py
+import os
+import tempfile
+
+from emailai.settings import *  # noqa: F401,F403
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.getenv(
+            'BENCHMARK_DB', os.path.join(tempfile.gettempdir(), 'emailai-benchmark.sqlite3')
+        ),
+    }
+}
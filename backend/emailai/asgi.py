@@ -10,7 +10,12 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 import os
 
 from django.core.asgi import get_asgi_application
+from django.urls import get_resolver
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'emailai.settings')
 
 application = get_asgi_application()
+
+# Import the URLconf (views, serializers, tool registry) while the process
+# boots instead of during the first request a new replica receives.
+get_resolver().urlconf_module
@@ -0,0 +1,24 @@
+"""
+Slim settings for worker-only processes (process_emails, draft_replies,
+send_followups): the same database and environment as emailai.settings,
+without admin, sessions, messages, static files, DRF or templates.
+
+Use with DJANGO_SETTINGS_MODULE=emailai.settings_worker; these processes
+never serve HTTP, so the URLconf is empty.
+"""
+
+from .settings import *  # noqa: F401,F403
+
+INSTALLED_APPS = [
+    'django.contrib.auth',  # EmailAccount.user
+    'django.contrib.contenttypes',
+    'api',
+]
+
+MIDDLEWARE = []
+
+ROOT_URLCONF = 'emailai.urls_worker'
+
+TEMPLATES = []
+
+WSGI_APPLICATION = None
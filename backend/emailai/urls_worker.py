@@ -0,0 +1,7 @@
+"""
+URL configuration for worker-only processes (emailai.settings_worker).
+
+Workers serve no HTTP; this exists so Django's URL checks have something to load.
+"""
+
+urlpatterns = []